@@ -16,16 +16,26 @@ class ImageAPI:
         dataset_id가 None이면 모든 이미지를 가져옴
         dataset_id가 단일 str이면 해당 데이터셋,
         dataset_id가 list면 여러 데이터셋
+        서버는 페이지 단위로 응답하므로 nextCursor 를 따라가며 전체 목록을 모아 반환
         """
         if dataset_id is None:
-            return self.client.request("GET", "/api/images")
+            params = []
         elif isinstance(dataset_id, str):
-            return self.client.request("GET", "/api/images", params={"dataset_ids": dataset_id})
+            params = [("dataset_ids", dataset_id)]
         elif isinstance(dataset_id, list):
             # 여러 데이터셋이면 Query 파라미터를 여러 번 붙이거나, requests에 튜플로 전달
-            return self.client.request("GET", "/api/images", params=[("dataset_ids", ds) for ds in dataset_id])
+            params = [("dataset_ids", ds) for ds in dataset_id]
         else:
             raise ValueError("dataset_id must be None, a string, or a list of strings.")
+
+        images, cursor = [], None
+        while True:
+            page_params = params + [("limit", 1000)] + ([("cursor", cursor)] if cursor else [])
+            page = self.client.request("GET", "/api/images", params=page_params)
+            images.extend(page["items"])
+            cursor = page.get("nextCursor")
+            if not cursor:
+                return images
     
     def upload(self, dataset_id, file_path=None, file_paths=None):
         """
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
 from typing import List
-from ..core.auth import get_current_user
+from ..core.auth import get_current_user, kratos_pool_stats
+from ..core.request_log import latency_snapshot
+from ..core.profiler import profile_store, collapsed_stacks
 from ..db.database import get_db
 from sqlalchemy.orm import Session
 from ..db.models import User
@@ -47,4 +50,73 @@ async def get_users(
             "is_active": True,
         }
         for u in db_users
-    ] 
\ No newline at end of file
+    ] 
+
+@router.get("/kratos-pool")
+async def get_kratos_pool_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Kratos HTTP connection pool utilization (admin only)
+    """
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to access admin features"
+        )
+    return kratos_pool_stats()
+
+@router.get("/request-latency")
+async def get_request_latency(current_user: dict = Depends(get_current_user)):
+    """
+    Per-route request latency histograms since process start (admin only)
+    """
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to access admin features"
+        )
+    return latency_snapshot()
+
+@router.get("/profiles")
+def list_profiles(current_user: dict = Depends(get_current_user)):
+    """
+    Stored request profiles, newest first (admin only)
+    """
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to access admin features"
+        )
+    return profile_store.list()
+
+@router.get("/profiles/{capture_id}")
+def download_profile(capture_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Download a full profile capture as JSON: stacks and SQL statements (admin only)
+    """
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to access admin features"
+        )
+    path = profile_store.path(capture_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=f"{capture_id}.json")
+
+@router.get("/profiles/{capture_id}/stacks")
+def download_profile_stacks(capture_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Download collapsed stacks for flamegraph.pl / speedscope (admin only)
+    """
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to access admin features"
+        )
+    capture = profile_store.load(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        collapsed_stacks(capture),
+        headers={"Content-Disposition": f'attachment; filename="{capture_id}.folded"'},
+    )
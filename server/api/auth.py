@@ -3,7 +3,6 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr, Field, ValidationError, TypeAdapter, ConfigDict
 from typing import Optional
 from datetime import datetime
-import requests
 import logging
 from ..core.config import settings, ADMIN_EMAILS
 from ..core.auth import get_current_user, get_kratos_client, test_kratos_connection
@@ -49,14 +48,13 @@ async def register(email: str, password: str):
     try:
         logging.info(f"Starting registration process for email: {email}")
         
+        client = get_kratos_client()
+
         # 1. Registration flow 초기화
         flow_url = f"{settings.KRATOS_PUBLIC_URL}/self-service/registration/api"
         logging.info(f"Requesting registration flow from: {flow_url}")
         
-        flow_response = requests.get(
-            flow_url,
-            headers={"Accept": "application/json"}
-        )
+        flow_response = await client.get(flow_url)
         flow_response.raise_for_status()
         flow = flow_response.json()
         
@@ -64,12 +62,8 @@ async def register(email: str, password: str):
         register_url = flow["ui"]["action"]
         logging.info(f"Submitting registration to: {register_url}")
         
-        register_response = requests.post(
+        register_response = await client.post(
             register_url,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json"
-            },
             json={
                 "traits": {
                     "email": email
@@ -81,7 +75,7 @@ async def register(email: str, password: str):
         register_response.raise_for_status()
         return register_response.json()
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_detail = {
             "error": str(e),
             "response": None
@@ -104,14 +98,13 @@ async def login(email: str, password: str):
     try:
         logging.info(f"Starting login process for email: {email}")
         
+        client = get_kratos_client()
+
         # 1. Login flow 초기화
         flow_url = f"{settings.KRATOS_PUBLIC_URL}/self-service/login/api"
         logging.info(f"Requesting login flow from: {flow_url}")
         
-        flow_response = requests.get(
-            flow_url,
-            headers={"Accept": "application/json"}
-        )
+        flow_response = await client.get(flow_url)
         flow_response.raise_for_status()
         flow = flow_response.json()
         
@@ -119,12 +112,8 @@ async def login(email: str, password: str):
         login_url = flow["ui"]["action"]
         logging.info(f"Submitting login to: {login_url}")
         
-        login_response = requests.post(
+        login_response = await client.post(
             login_url,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json"
-            },
             json={
                 "identifier": email,
                 "password": password,
@@ -134,7 +123,7 @@ async def login(email: str, password: str):
         login_response.raise_for_status()
         return login_response.json()
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_detail = {
             "error": str(e),
             "response": None
@@ -153,17 +142,13 @@ async def login(email: str, password: str):
 async def get_session(session_token: str):
     """Get session information via Kratos public whoami endpoint (using session token)."""
     try:
-        response = requests.get(
-            f"{settings.KRATOS_PUBLIC_URL}/sessions/whoami",
-            headers={
-                "Accept": "application/json",
-                "Authorization": f"Bearer {session_token}",
-            },
-            timeout=10,
+        response = await get_kratos_client().get(
+            "/sessions/whoami",
+            headers={"Authorization": f"Bearer {session_token}"},
         )
         response.raise_for_status()
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Session error: {str(e)}")
         if hasattr(e, "response") and e.response is not None:
             logger.error(f"Response content: {e.response.text}")
@@ -172,7 +157,7 @@ async def get_session(session_token: str):
             detail={
                 "message": "Session retrieval failed",
                 "error": str(e),
-                "response": e.response.text if hasattr(e, "response") else None,
+                "response": e.response.text if getattr(e, "response", None) is not None else None,
             },
         )
 
@@ -228,68 +213,68 @@ async def register(request: Request):
                 content={"detail": "Password must be at least 8 characters long"}
             )
 
-        async with get_kratos_client() as client:
-            try:
-                # Get registration flow
-                flow_response = await client.get("/self-service/registration/api")
-                if flow_response.status_code != 200:
-                    logger.error(f"Failed to get registration flow: {flow_response.text}")
-                    return JSONResponse(
-                        status_code=flow_response.status_code,
-                        content={"detail": "Failed to initialize registration flow"}
-                    )
-
-                flow_data = flow_response.json()
-                flow_id = flow_data.get("id")
-                if not flow_id:
-                    logger.error("No flow ID in Kratos registration response")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"detail": "Invalid flow response"}
-                    )
-
-                # Get CSRF token from flow data
-                csrf_token = None
-                for node in flow_data.get("ui", {}).get("nodes", []):
-                    if node.get("attributes", {}).get("name") == "csrf_token":
-                        csrf_token = node.get("attributes", {}).get("value")
-                        break
-
-                # Submit registration
-                submit_url = flow_data["ui"]["action"]
-                submit_data = {
-                    "method": "password",
-                    "password": password,
-                    "traits": {
-                        "email": email
-                    }
-                }
-                if csrf_token:
-                    submit_data["csrf_token"] = csrf_token
+        client = get_kratos_client()
+        try:
+            # Get registration flow
+            flow_response = await client.get("/self-service/registration/api")
+            if flow_response.status_code != 200:
+                logger.error(f"Failed to get registration flow: {flow_response.text}")
+                return JSONResponse(
+                    status_code=flow_response.status_code,
+                    content={"detail": "Failed to initialize registration flow"}
+                )
 
-                submit_response = await client.post(
-                    submit_url.replace("http://0.0.0.0:4433", ""),
-                    json=submit_data
+            flow_data = flow_response.json()
+            flow_id = flow_data.get("id")
+            if not flow_id:
+                logger.error("No flow ID in Kratos registration response")
+                return JSONResponse(
+                    status_code=500,
+                    content={"detail": "Invalid flow response"}
                 )
 
-                if submit_response.status_code != 200:
-                    error_data = submit_response.json()
-                    logger.error(f"Kratos registration failed: {error_data}")
-                    return JSONResponse(
-                        status_code=submit_response.status_code,
-                        content={"detail": error_data}
-                    )
+            # Get CSRF token from flow data
+            csrf_token = None
+            for node in flow_data.get("ui", {}).get("nodes", []):
+                if node.get("attributes", {}).get("name") == "csrf_token":
+                    csrf_token = node.get("attributes", {}).get("value")
+                    break
 
-                logger.info(f"User {email} registered successfully.")
-                return submit_response.json()
+            # Submit registration
+            submit_url = flow_data["ui"]["action"]
+            submit_data = {
+                "method": "password",
+                "password": password,
+                "traits": {
+                    "email": email
+                }
+            }
+            if csrf_token:
+                submit_data["csrf_token"] = csrf_token
+
+            submit_response = await client.post(
+                submit_url.replace("http://0.0.0.0:4433", ""),
+                json=submit_data
+            )
 
-            except Exception as e:
-                logger.error(f"Error during registration process: {str(e)}", exc_info=True)
+            if submit_response.status_code != 200:
+                error_data = submit_response.json()
+                logger.error(f"Kratos registration failed: {error_data}")
                 return JSONResponse(
-                    status_code=500,
-                    content={"detail": f"Registration error: {str(e)}"}
+                    status_code=submit_response.status_code,
+                    content={"detail": error_data}
                 )
 
+            logger.info(f"User {email} registered successfully.")
+            return submit_response.json()
+
+        except Exception as e:
+            logger.error(f"Error during registration process: {str(e)}", exc_info=True)
+            return JSONResponse(
+                status_code=500,
+                content={"detail": f"Registration error: {str(e)}"}
+            )
+
     except Exception as e:
         logger.error(f"Unexpected error in /auth/register endpoint: {str(e)}", exc_info=True)
         return JSONResponse(
@@ -302,11 +287,9 @@ async def register(request: Request):
 async def login(user_data: UserLogin):
     """Login using Kratos API mode (async)"""
     try:
+        client = get_kratos_client()
         flow_url = f"{settings.KRATOS_PUBLIC_URL}/self-service/login/api"
-        flow_response = requests.get(
-            flow_url,
-            headers={"Accept": "application/json"}
-        )
+        flow_response = await client.get(flow_url)
         flow_response.raise_for_status()
         flow = flow_response.json()
 
@@ -317,12 +300,8 @@ async def login(user_data: UserLogin):
             "password": user_data.password,
             "method": "password"
         }
-        login_response = requests.post(
+        login_response = await client.post(
             login_url,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json"
-            },
             json=login_data
         )
         login_response.raise_for_status()
@@ -330,7 +309,7 @@ async def login(user_data: UserLogin):
         logger.info(f"User {user_data.email} logged in successfully.")
         return response_data
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_detail = {"error": str(e), "response": None}
         if hasattr(e, 'response') and e.response is not None:
             try:
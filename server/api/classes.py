@@ -2,15 +2,20 @@
 from fastapi import APIRouter, Depends, Body
 from sqlalchemy.orm import Session
 from typing import List
+import logging
 
-from server.db.database import get_db
+from server.db.database import get_db, get_read_db
 from server.db.models import Class, Dataset, Image
 from server.utils.string_utils import to_camel_case, to_snake_case
+from server.db.association_tables import dataset_classes, class_images
+from server.db.queries import fetch_by_ids, column_values
+from server.core.request_log import debug_dump
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/")
-def list_classes(db: Session = Depends(get_db)):
+def list_classes(db: Session = Depends(get_read_db)):
     classes_list = db.query(Class).all()
     result = []
     for cls_obj in classes_list:
@@ -51,21 +56,13 @@ def upsert_class(
     
     # 클래스와 연결된 Dataset 관계 업데이트
     if new_dataset_ids is not None:
-        cls_obj.datasets = []  # 기존 관계 초기화
-        for ds_id in new_dataset_ids:
-            dataset = db.query(Dataset).filter(Dataset.id == ds_id).first()
-            if dataset:
-                cls_obj.datasets.append(dataset)
+        cls_obj.datasets = fetch_by_ids(db, Dataset, new_dataset_ids)  # 기존 관계를 새 목록으로 교체
         db.commit()
         db.refresh(cls_obj)
     
     # 클래스와 연결된 Image 관계 업데이트
     if new_image_ids is not None:
-        cls_obj.images = []  # 기존 관계 초기화
-        for img_id in new_image_ids:
-            image = db.query(Image).filter(Image.id == img_id).first()
-            if image:
-                cls_obj.images.append(image)
+        cls_obj.images = fetch_by_ids(db, Image, new_image_ids)  # 기존 관계를 새 목록으로 교체
         db.commit()
         db.refresh(cls_obj)
     
@@ -76,8 +73,8 @@ def upsert_class(
         for k, v in cls_dict.items()
         if not k.startswith("_")
     }
-    response_data["datasetIds"] = [ds.id for ds in cls_obj.datasets]
-    response_data["imageIds"] = [img.id for img in cls_obj.images]
+    response_data["datasetIds"] = column_values(db, dataset_classes.c.dataset_id, dataset_classes.c.class_id, cls_obj.id)
+    response_data["imageIds"] = column_values(db, class_images.c.image_id, class_images.c.class_id, cls_obj.id)
     
     return response_data
 
@@ -90,7 +87,7 @@ def get_class(class_id: str, db: Session = Depends(get_db)):
 
 @router.put("/{class_id}")
 def update_class(class_id: str, updated_data: dict, db: Session = Depends(get_db)):
-    print("Updated Class Data", updated_data)
+    debug_dump(logger, "update_class payload", updated_data)
     cls_ = db.query(Class).filter(Class.id == class_id).first()
     if not cls_:
         return {"error": "Class not found"}
@@ -1,18 +1,33 @@
 import os 
-from fastapi import APIRouter, Depends, Body
-from sqlalchemy.orm import Session
-from typing import List
+import shutil
+import uuid
+from fastapi import APIRouter, Depends, Body, Query, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 
-from server.db.database import get_db
+from server.db.database import get_db, get_read_db
 from server.db.models import Dataset, Class, Image
 from server.db.crud import DatasetCreate
+from server.db.association_tables import dataset_classes, dataset_images
+from server.db.queries import fetch_by_ids, group_ids, column_values
 from server.utils.string_utils import to_camel_case, to_snake_case
+from server.core.vector_store import remove_image_features
+from server.core.blob_store import release_images_files
+from server.utils.thumbnails import delete_renditions
+from server.core.exporters import EXPORT_FORMATS, ARCHIVE_TYPES, export_dataset
+from server.core.importers import IMPORT_FORMATS, run_import_job
+from server.core.jobs import job_runner, job_to_dict
+from server.core.config import TMP_FOLDER
+from server.core.metrics import UPLOAD_BYTES
 
 router = APIRouter()
 
 @router.get("/")
-def list_datasets(db: Session = Depends(get_db)):
+def list_datasets(db: Session = Depends(get_read_db)):
     datasets = db.query(Dataset).all()
+    class_ids = group_ids(db, dataset_classes.c.dataset_id, dataset_classes.c.class_id)
     results = []
     for ds in datasets:
         results.append({
@@ -21,7 +36,7 @@ def list_datasets(db: Session = Depends(get_db)):
             "description": ds.description,
             "uploadedAt": ds.uploaded_at.isoformat() if ds.uploaded_at else None,
             "updatedAt": ds.updated_at.isoformat() if ds.updated_at else None,
-            "classIds": [cls.id for cls in ds.classes],
+            "classIds": class_ids.get(ds.id, []),
         })
     return results
 
@@ -71,21 +86,13 @@ def upsert_dataset(
 
     # 클래스 관계 업데이트 (있으면 새로 설정)
     if new_class_ids is not None:
-        ds.classes = []  # 기존 연결 초기화
-        for class_id in new_class_ids:
-            cls_obj = db.query(Class).filter(Class.id == class_id).first()
-            if cls_obj:
-                ds.classes.append(cls_obj)
+        ds.classes = fetch_by_ids(db, Class, new_class_ids)  # 기존 연결을 새 목록으로 교체
         db.commit()
         db.refresh(ds)
 
     # 이미지 관계 업데이트 (있으면 새로 설정)
     if new_image_ids is not None:
-        ds.images = []  # 기존 연결 초기화
-        for image_id in new_image_ids:
-            img = db.query(Image).filter(Image.id == image_id).first()
-            if img:
-                ds.images.append(img)
+        ds.images = fetch_by_ids(db, Image, new_image_ids)  # 기존 연결을 새 목록으로 교체
         db.commit()
         db.refresh(ds)
 
@@ -96,8 +103,8 @@ def upsert_dataset(
         for k, v in ds_dict.items()
         if not k.startswith("_")  # SQLAlchemy 내부 필드 제외
     }
-    response_data["classIds"] = [cls.id for cls in ds.classes]
-    response_data["imageIds"] = [img.id for img in ds.images]
+    response_data["classIds"] = column_values(db, dataset_classes.c.class_id, dataset_classes.c.dataset_id, ds.id)
+    response_data["imageIds"] = column_values(db, dataset_images.c.image_id, dataset_images.c.dataset_id, ds.id)
 
     return response_data
 
@@ -107,8 +114,8 @@ def get_dataset(dataset_id: str, db: Session = Depends(get_db)):
     if not ds:
         return {"error": "Dataset not found"}
 
-    image_ids = [img.id for img in ds.images]
-    class_ids = [cls.id for cls in ds.classes]
+    image_ids = column_values(db, dataset_images.c.image_id, dataset_images.c.dataset_id, ds.id)
+    class_ids = column_values(db, dataset_classes.c.class_id, dataset_classes.c.dataset_id, ds.id)
 
     return {
         "id": ds.id,
@@ -120,6 +127,86 @@ def get_dataset(dataset_id: str, db: Session = Depends(get_db)):
         "classIds": class_ids
     }
 
+@router.get("/{dataset_id}/export")
+def export_dataset_labels(
+    dataset_id: str,
+    format: str = Query("coco"),
+    include_images: bool = Query(False),
+    archive: str = Query("zip"),
+    db: Session = Depends(get_db)
+):
+    """
+    데이터셋 라벨을 COCO JSON / YOLO txt / Pascal VOC XML 로 스트리밍 내보내기.
+    - include_images=true 이면 이미지 파일도 함께 아카이브(archive=zip|tar)에 포함
+    - COCO 이고 이미지를 포함하지 않으면 JSON 파일 하나로 반환
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(EXPORT_FORMATS)}")
+    if archive not in ARCHIVE_TYPES:
+        raise HTTPException(status_code=400, detail=f"archive must be one of {list(ARCHIVE_TYPES)}")
+    if not db.query(Dataset.id).filter(Dataset.id == dataset_id).first():
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    chunks, media_type, filename = export_dataset(dataset_id, format, include_images, archive)
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+job_runner.register("import_dataset", run_import_job)
+
+def _save_upload(upload: UploadFile, folder: str) -> str:
+    path = os.path.join(folder, os.path.basename(upload.filename or uuid.uuid4().hex))
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
+        UPLOAD_BYTES.inc(f.tell(), endpoint="dataset-import")
+    return path
+
+@router.post("/{dataset_id}/import")
+def import_dataset(
+    dataset_id: str,
+    format: str = Form("coco"),
+    annotations: Optional[UploadFile] = File(None),
+    images_archive: Optional[UploadFile] = File(None),
+    annotations_path: Optional[str] = Form(None),
+    source_path: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """
+    COCO JSON / YOLO 데이터셋 가져오기 작업을 생성합니다.
+    - 이미지: images_archive(zip|tar) 업로드 또는 서버 경로 source_path (원본은 복사)
+    - COCO 라벨: annotations 업로드 또는 서버 경로 annotations_path
+    - YOLO 는 이미지 트리 안의 labels/*.txt 와 data.yaml / classes.txt 를 사용
+    진행률은 작업 websocket 으로 전달되며 중단되어도 마지막 배치 이후부터 이어서 실행됩니다.
+    """
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(IMPORT_FORMATS)}")
+    if not db.query(Dataset.id).filter(Dataset.id == dataset_id).first():
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if (images_archive is None) == (source_path is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of images_archive or source_path")
+    if source_path is not None and not os.path.isdir(source_path):
+        raise HTTPException(status_code=400, detail="source_path is not a directory")
+    if format == "coco" and annotations is None and not (annotations_path and os.path.isfile(annotations_path)):
+        raise HTTPException(status_code=400, detail="COCO import requires annotations")
+
+    work_dir = os.path.join(TMP_FOLDER, f"import_{uuid.uuid4().hex}")
+    os.makedirs(work_dir, exist_ok=True)
+    params = {"dataset_id": dataset_id, "format": format, "work_dir": work_dir}
+    if annotations is not None:
+        annotations_path = _save_upload(annotations, work_dir)
+    if annotations_path:
+        params["annotations_path"] = annotations_path
+    if images_archive is not None:
+        params["archive_path"] = _save_upload(images_archive, work_dir)
+    else:
+        params["images_root"] = source_path
+
+    job = job_runner.create(db, "import_dataset", params)
+    job_runner.submit(job.id)
+    return job_to_dict(job)
+
 @router.put("/{dataset_id}")
 def update_dataset(dataset_id: str, updated_data: dict, db: Session = Depends(get_db)):
     ds = db.query(Dataset).filter(Dataset.id == dataset_id).first()
@@ -131,21 +218,13 @@ def update_dataset(dataset_id: str, updated_data: dict, db: Session = Depends(ge
     db.refresh(ds)
     return ds
 
-def _delete_image_files(img: Image):
-    """(이미지 파일 삭제 로직 분리)"""
-    if img.file_location and os.path.exists(img.file_location):
-        try:
-            print(f"Deleting file: {img.file_location}") # 로그 추가
-            os.remove(img.file_location)
-        except Exception as e:
-            print(f"Failed to delete file: {img.file_location}, Error: {e}")
-
-    if img.thumbnail_location and os.path.exists(img.thumbnail_location):
-        try:
-            print(f"Deleting thumbnail: {img.thumbnail_location}") # 로그 추가
-            os.remove(img.thumbnail_location)
-        except Exception as e:
-            print(f"Failed to delete thumbnail: {img.thumbnail_location}, Error: {e}")
+def _delete_image_files(db: Session, images: List[Image]):
+    """(이미지 파일 및 Faiss 벡터 삭제 로직 분리)"""
+    remove_image_features([feature for img in images for feature in img.image_features])
+    for img in images:
+        delete_renditions(img.id)
+    # 원본/썸네일은 삭제 대상 밖의 이미지가 같은 blob 을 참조하지 않을 때만 삭제 (한 번의 조회)
+    release_images_files(db, images)
 
 @router.delete("/{dataset_id}")
 def delete_dataset(dataset_id: str, db: Session = Depends(get_db)):
@@ -156,35 +235,40 @@ def delete_dataset(dataset_id: str, db: Session = Depends(get_db)):
     images_to_delete = []
     images_to_unlink = []
 
-    # 1) 삭제/연결 해제할 이미지 결정
-    for img in list(ds.images):
-        print(f"Processing Image ID: {img.id}, Dataset Count: {len(img.datasets)}") # 로그 추가
-        if len(img.datasets) == 1:
+    # 1) 삭제/연결 해제할 이미지 결정 (이미지별 연결 데이터셋 수를 한 번에 조회)
+    ds_image_ids = select(dataset_images.c.image_id).where(dataset_images.c.dataset_id == ds.id)
+    image_dataset_ids = group_ids(db, dataset_images.c.image_id, dataset_images.c.dataset_id, ds_image_ids)
+    images = db.query(Image).filter(Image.id.in_(ds_image_ids)).options(
+        selectinload(Image.datasets),
+        selectinload(Image.classes),
+        selectinload(Image.image_features),
+        selectinload(Image.bounding_boxes),
+        selectinload(Image.keypoints),
+        selectinload(Image.segmentations),
+    ).all()
+    for img in images:
+        if len(image_dataset_ids.get(img.id, [])) <= 1:
             images_to_delete.append(img)
         else:
             images_to_unlink.append(img)
+    print(f"Dataset {ds.id}: deleting {len(images_to_delete)} images, unlinking {len(images_to_unlink)}") # 로그 추가
 
-    # 2) 연결 해제할 이미지 처리
-    for img in images_to_unlink:
-        print(f"Unlinking Image ID: {img.id} from Dataset {ds.id}") # 로그 추가
-        ds.images.remove(img)
+    # 2) 연결 해제할 이미지는 5) 에서 데이터셋을 삭제할 때 연결 테이블 행과 함께 정리됨
 
     # 3) 삭제할 이미지 처리 (파일 삭제 + DB 삭제 마킹)
+    _delete_image_files(db, images_to_delete)  # 파일 삭제 먼저 수행
     for img in images_to_delete:
-        print(f"Deleting Image ID: {img.id}") # 로그 추가
-        _delete_image_files(img) # 파일 삭제 먼저 수행
         db.delete(img)           # DB 삭제 마킹
 
     # 4) 클래스 처리 (동일한 로직)
+    ds_class_ids = select(dataset_classes.c.class_id).where(dataset_classes.c.dataset_id == ds.id)
+    class_dataset_ids = group_ids(db, dataset_classes.c.class_id, dataset_classes.c.dataset_id, ds_class_ids)
     classes_to_delete = []
-    classes_to_unlink = []
-    for cls_obj in list(ds.classes):
-        if len(cls_obj.datasets) == 1:
+    for cls_obj in db.query(Class).filter(Class.id.in_(ds_class_ids)).options(
+        selectinload(Class.datasets), selectinload(Class.images)
+    ).all():
+        if len(class_dataset_ids.get(cls_obj.id, [])) <= 1:
             classes_to_delete.append(cls_obj)
-        else:
-             classes_to_unlink.append(cls_obj)
-    for cls_obj in classes_to_unlink:
-        ds.classes.remove(cls_obj)
     for cls_obj in classes_to_delete:
         db.delete(cls_obj)
 
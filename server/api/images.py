@@ -1,48 +1,239 @@
 # my_app/api/images.py
-from fastapi import APIRouter, Depends, Body, Query
+from fastapi import APIRouter, Depends, Body, Query, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session
 from typing import Optional, List
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import base64
+import json
+import logging
 import os
 import shutil
 
-from server.db.database import get_db
-from server.db.models import Image, Dataset, Class
+from server.db.database import get_db, get_read_db
+from server.db.models import Image, Dataset, Class, Job, ImageFeature
+from server.db.association_tables import dataset_images, class_images
+from server.db.queries import id_filters, fetch_by_ids, group_ids
 from server.utils.string_utils import to_camel_case, to_snake_case
+from server.core.config import settings
+from server.core.jobs import JobContext, job_runner, job_to_dict
+from server.core.request_log import debug_dump
+from server.core.vector_store import remove_image_features
+from server.core.blob_store import release_image_files
+from server.utils.thumbnails import RENDITIONS, get_rendition, delete_renditions, read_image_metadata
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# 응답 필드(camelCase) → images 컬럼
+_IMAGE_FIELDS = {
+    "id": Image.id,
+    "filename": Image.filename,
+    "fileLocation": Image.file_location,
+    "thumbnailLocation": Image.thumbnail_location,
+    "width": Image.width,
+    "height": Image.height,
+    "type": Image.type,
+    "size": Image.size,
+    "contentHash": Image.content_hash,
+    "approval": Image.approval,
+    "comment": Image.comment,
+    "properties": Image.properties,
+    "uploadAt": Image.upload_at,
+    "updatedAt": Image.updated_at,
+}
+# 관계 테이블에서 한 번에 모아 채우는 필드
+_DERIVED_FIELDS = ("classIds", "model")
+
+def _encode_cursor(upload_at, image_id: str) -> str:
+    raw = json.dumps([upload_at.isoformat() if upload_at else None, image_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str):
+    try:
+        upload_at, image_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(upload_at) if upload_at else None), image_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _features_by_image(db: Session, image_ids) -> dict:
+    result = defaultdict(dict)
+    for condition in id_filters(ImageFeature.image_id, image_ids):
+        rows = db.query(ImageFeature.image_id, ImageFeature.model_id, ImageFeature.feature_id).filter(condition)
+        for image_id, model_id, feature_id in rows:
+            result[image_id][model_id] = feature_id
+    return result
 
 @router.get("/")
-def list_images(dataset_ids: Optional[List[str]] = Query(None), db: Session = Depends(get_db)):
+def list_images(
+    dataset_ids: Optional[List[str]] = Query(None),
+    class_ids: Optional[List[str]] = Query(None),
+    approval: Optional[List[str]] = Query(None),
+    labeled: Optional[bool] = Query(None),
+    fields: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    all_rows: bool = Query(False, alias="all"),
+    db: Session = Depends(get_read_db)
+):
     """
-    - dataset_ids가 제공되면, 해당 데이터셋과 연결된 이미지 목록만 반환 (중복 제거)
-    - dataset_ids가 없으면 전체 이미지를 반환
-    - 각 이미지에는 연결된 클래스 목록(classIds)도 포함
+    - dataset_ids / class_ids / approval / labeled(라벨 존재 여부) 로 서버에서 필터링
+    - fields=id,filename,classIds 처럼 필요한 필드만 선택 (기본값: 전체)
+    - (upload_at, id) 역순 keyset 페이지네이션: { items: [...], nextCursor } 를 반환하며
+      nextCursor 를 다음 요청의 cursor 로 사용 (limit 생략 시 IMAGE_PAGE_SIZE)
+    - all=true 일 때만 조건에 맞는 전체 목록(list)을 한 번에 반환
+    classIds/model 은 행마다 관계를 읽지 않고 페이지 단위로 한 번에 조회합니다.
     """
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(_IMAGE_FIELDS) + list(_DERIVED_FIELDS)
+    unknown = [f for f in requested if f not in _IMAGE_FIELDS and f not in _DERIVED_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}")
+
+    columns = [_IMAGE_FIELDS[f].label(f) for f in requested if f in _IMAGE_FIELDS]
+    for key in ("id", "uploadAt"):
+        if key not in requested:
+            columns.append(_IMAGE_FIELDS[key].label(key))
+    query = db.query(*columns)
+
     if dataset_ids:
-        images = db.query(Image).join(Image.datasets).filter(Dataset.id.in_(dataset_ids)).distinct().all()
+        query = query.filter(Image.id.in_(
+            select(dataset_images.c.image_id).where(dataset_images.c.dataset_id.in_(dataset_ids))
+        ))
+    if class_ids:
+        query = query.filter(Image.id.in_(
+            select(class_images.c.image_id).where(class_images.c.class_id.in_(class_ids))
+        ))
+    if approval:
+        query = query.filter(Image.approval.in_(approval))
+    if labeled is not None:
+        has_labels = or_(Image.bounding_boxes.any(), Image.keypoints.any(), Image.segmentations.any())
+        query = query.filter(has_labels if labeled else ~has_labels)
+
+    paginate = not all_rows
+    if paginate:
+        if cursor:
+            cursor_upload_at, cursor_id = _decode_cursor(cursor)
+            # 저장된 값 그대로 비교하도록 커서 행의 upload_at 을 DB 에서 읽음 (행이 삭제된 경우에만 커서 값 사용)
+            last_upload_at = func.coalesce(
+                select(Image.upload_at).where(Image.id == cursor_id).scalar_subquery(), cursor_upload_at
+            )
+            query = query.filter(or_(
+                Image.upload_at < last_upload_at,
+                and_(Image.upload_at == last_upload_at, Image.id < cursor_id)
+            ))
+        page_size = limit or settings.IMAGE_PAGE_SIZE
+        rows = query.order_by(Image.upload_at.desc(), Image.id.desc()).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        image_ids = [row.id for row in rows]
     else:
-        images = db.query(Image).all()
-    
+        rows = query.all()
+        image_ids = query.with_entities(Image.id).statement
+
+    class_map = group_ids(db, class_images.c.image_id, class_images.c.class_id, image_ids) if "classIds" in requested else {}
+    feature_map = _features_by_image(db, image_ids) if "model" in requested else {}
+
     results = []
-    for img in images:
-        print("img.extracted_features", img.extracted_features)
-        results.append({
-            "id": img.id,
-            "filename": img.filename,
-            "fileLocation": img.file_location,
-            "thumbnailLocation": img.thumbnail_location,
-            "width": img.width,
-            "height": img.height,
-            "approval": img.approval,
-            "comment": img.comment,
-            "classIds": [cls.id for cls in img.classes],
-            "properties": img.properties,
-            "model": img.extracted_features,
-            "uploadAt": img.upload_at,
-            "updatedAt": img.updated_at,
-        })
-    
-    return results
+    for row in rows:
+        item = {f: getattr(row, f) for f in requested if f in _IMAGE_FIELDS}
+        if "classIds" in requested:
+            item["classIds"] = class_map.get(row.id, [])
+        if "model" in requested:
+            item["model"] = feature_map.get(row.id, {})
+        results.append(item)
+
+    if not paginate:
+        return results
+    next_cursor = _encode_cursor(rows[-1].uploadAt, rows[-1].id) if has_more else None
+    return {"items": results, "nextCursor": next_cursor}
+
+_METADATA_MISSING = or_(
+    Image.content_hash.is_(None),
+    Image.width.is_(None),
+    Image.height.is_(None),
+    Image.type.is_(None),
+    Image.size.is_(None),
+)
+
+def run_metadata_backfill_job(ctx: JobContext) -> dict:
+    """
+    width/height/type/size/content_hash 가 비어 있는 이미지의 메타데이터를 채우는 작업.
+    id 순서로 배치를 처리하고 마지막 id 를 params.cursor 에 기록하므로 재시작 후 이어서 실행됩니다.
+    """
+    db = ctx.db
+    batch_size = max(1, int(ctx.params.get("batch_size", 500)))
+    cursor = ctx.params.get("cursor")
+    processed = (ctx.job.processed or 0) if cursor else 0
+    failed = list(ctx.job.failed_image_ids or []) if cursor else []
+    target = _METADATA_MISSING
+    if ctx.params.get("image_ids"):
+        # 재시도 작업: 실패했던 이미지만 대상으로 함
+        target = Image.id.in_(ctx.params["image_ids"]) & _METADATA_MISSING
+
+    remaining = db.query(Image.id).filter(target)
+    if cursor:
+        remaining = remaining.filter(Image.id > cursor)
+    total = processed + remaining.count()
+    ctx.progress(processed, total, failed)
+
+    with ThreadPoolExecutor(max_workers=settings.FEATURE_DECODE_WORKERS) as executor:
+        while True:
+            ctx.check_cancelled()
+            query = db.query(Image.id, Image.file_location).filter(target)
+            if cursor:
+                query = query.filter(Image.id > cursor)
+            rows = query.order_by(Image.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            def read(row):
+                try:
+                    return row.id, read_image_metadata(row.file_location)
+                except Exception as e:
+                    print(f"Metadata read failed for image {row.id}: {e}")
+                    return row.id, None
+
+            updates = []
+            for image_id, metadata in executor.map(read, rows):
+                if metadata is None:
+                    failed.append(image_id)
+                else:
+                    updates.append({"id": image_id, **metadata})
+            if updates:
+                db.bulk_update_mappings(Image, updates)
+
+            cursor = rows[-1].id
+            processed += len(rows)
+            ctx.job.params = {**ctx.params, "cursor": cursor}
+            ctx.progress(processed, total, failed)
+
+    print(f"Image metadata backfill finished: {processed - len(failed)} updated, {len(failed)} failed")
+    return {"updated": processed - len(failed), "failedImageIds": failed}
+
+job_runner.register("backfill_image_metadata", run_metadata_backfill_job)
+
+@router.post("/metadata/backfill")
+def backfill_image_metadata(batch_size: int = Body(500, embed=True), db: Session = Depends(get_db)):
+    """
+    메타데이터(크기/형식/용량/해시)가 없는 기존 이미지를 채우는 작업을 생성합니다.
+    이미 대기/실행 중인 작업이 있으면 그 작업을 반환합니다.
+    """
+    active = db.query(Job).filter(
+        Job.type == "backfill_image_metadata", Job.status.in_(["queued", "running"])
+    ).first()
+    if active:
+        return job_to_dict(active)
+
+    total = db.query(Image.id).filter(_METADATA_MISSING).count()
+    if not total:
+        return {"status": "nothing_to_do", "total": 0}
+
+    job = job_runner.create(db, "backfill_image_metadata", {"batch_size": max(1, batch_size)}, total=total)
+    job_runner.submit(job.id)
+    return job_to_dict(job)
 
 @router.get("/{image_id}")
 def get_image(image_id: str, db: Session = Depends(get_db)):
@@ -57,6 +248,9 @@ def get_image(image_id: str, db: Session = Depends(get_db)):
         "thumbnailLocation": img.thumbnail_location,
         "width": img.width,
         "height": img.height,
+        "type": img.type,
+        "size": img.size,
+        "contentHash": img.content_hash,
         "approval": img.approval,
         "comment": img.comment,
         "classIds": [cls.id for cls in img.classes],
@@ -64,11 +258,31 @@ def get_image(image_id: str, db: Session = Depends(get_db)):
         "model": img.extracted_features
     }
 
+@router.get("/{image_id}/thumbnail")
+def get_image_thumbnail(image_id: str, size: str = Query("grid"), db: Session = Depends(get_db)):
+    """
+    용도별 크기(grid/preview/canvas)의 썸네일을 반환. 처음 요청될 때 생성되어 캐시됩니다.
+    """
+    if size not in RENDITIONS:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(RENDITIONS)}")
+    img = db.query(Image).filter(Image.id == image_id).first()
+    if not img or not img.file_location or not os.path.exists(img.file_location):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path = get_rendition(img.id, img.file_location, size)
+    if path is None:
+        raise HTTPException(status_code=500, detail="Thumbnail creation failed")
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=604800"})
+
 @router.post("/{image_id}")
 def upsert_image(image_id: str, updated_data: dict = Body(...), db: Session = Depends(get_db)):
-    print("updated_data", updated_data)
+    debug_dump(logger, "upsert_image payload", updated_data)
     updated_data = {to_snake_case(k): v for k, v in updated_data.items()}
 
+    # upload_at 은 목록 페이지네이션의 정렬 키이므로 비우지 않음 (생략하면 DB 기본값)
+    if "upload_at" in updated_data and updated_data["upload_at"] is None:
+        del updated_data["upload_at"]
+
     new_dataset_ids = updated_data.pop("dataset_ids", None)
     new_class_ids = updated_data.pop("class_ids", None)
 
@@ -96,18 +310,19 @@ def upsert_image(image_id: str, updated_data: dict = Body(...), db: Session = De
 
     if new_dataset_ids is not None:
         existing_dataset_ids = {ds.id for ds in img.datasets}
-        datasets_to_add = [db.query(Dataset).filter(Dataset.id == dataset_id).first()
-                           for dataset_id in new_dataset_ids if dataset_id not in existing_dataset_ids]
-        img.datasets.extend(filter(None, datasets_to_add))
+        img.datasets.extend(fetch_by_ids(
+            db, Dataset, [dataset_id for dataset_id in new_dataset_ids if dataset_id not in existing_dataset_ids]
+        ))
         db.commit()
         db.refresh(img)
 
     if new_class_ids is not None:
         existing_class_ids = {cls.id for cls in img.classes}
-        classes_to_add = [db.query(Class).filter(Class.id == class_id).first()
-                          for class_id in new_class_ids if class_id not in existing_class_ids]
+        classes_to_add = fetch_by_ids(
+            db, Class, [class_id for class_id in new_class_ids if class_id not in existing_class_ids]
+        )
         img.classes.clear()
-        img.classes.extend(filter(None, classes_to_add))
+        img.classes.extend(classes_to_add)
         db.commit()
         db.refresh(img)
 
@@ -133,7 +348,7 @@ def delete_image(
     if not img:
         return {"error": "Image not found"}
     
-    print("selected_dataset_ids", selected_dataset_ids)
+    debug_dump(logger, "delete_image selected_dataset_ids", selected_dataset_ids)
 
     # dataset_id가 제공된 경우
     if selected_dataset_ids:
@@ -146,7 +361,7 @@ def delete_image(
 
         # 제거 후 이미지가 연결된 데이터셋이 없으면 파일 삭제 및 이미지 완전 삭제
         if len(img.datasets) == 0:
-            _delete_image_files(img)
+            _delete_image_files(db, img)
             db.delete(img)
             db.commit()
             return {"message": f"Image {image_id} fully deleted (no remaining dataset connections)."}
@@ -154,21 +369,14 @@ def delete_image(
             return {"message": f"Image {image_id} unlinked from datasets {selected_dataset_ids}."}
     else:
         # dataset_id가 제공되지 않으면, 기본적으로 파일과 DB 모두에서 완전 삭제
-        _delete_image_files(img)
+        _delete_image_files(db, img)
         db.delete(img)
         db.commit()
         return {"message": f"Image {image_id} and associated files deleted."}
 
-def _delete_image_files(img: Image):
-    """이미지 파일과 썸네일을 삭제하는 유틸 함수"""
-    if img.file_location and os.path.exists(img.file_location):
-        try:
-            os.remove(img.file_location)
-        except Exception as e:
-            print(f"Failed to delete file: {img.file_location}, Error: {e}")
-
-    if img.thumbnail_location and os.path.exists(img.thumbnail_location):
-        try:
-            os.remove(img.thumbnail_location)
-        except Exception as e:
-            print(f"Failed to delete thumbnail: {img.thumbnail_location}, Error: {e}")
\ No newline at end of file
+def _delete_image_files(db: Session, img: Image):
+    """이미지 파일과 썸네일, Faiss 벡터를 삭제하는 유틸 함수"""
+    remove_image_features(img.image_features)
+    delete_renditions(img.id)
+    # 원본/썸네일은 같은 blob 을 참조하는 다른 이미지가 없을 때만 삭제
+    release_image_files(db, img)
\ No newline at end of file
@@ -0,0 +1,74 @@
+# server/api/jobs.py
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from server.db.database import get_db, get_read_db
+from server.db.models import Job
+from server.core.jobs import job_runner, job_to_dict
+from server.core.websockets import manager
+
+router = APIRouter()
+
+@router.get("/")
+def list_jobs(
+    job_type: Optional[str] = Query(None, alias="type"),
+    status: Optional[str] = Query(None),
+    limit: int = Query(50, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """최근 작업 목록 (type/status 필터 가능)"""
+    query = db.query(Job)
+    if job_type:
+        query = query.filter(Job.type == job_type)
+    if status:
+        query = query.filter(Job.status == status)
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+    return [job_to_dict(job) for job in jobs]
+
+@router.get("/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    """대기 중인 작업은 즉시, 실행 중인 작업은 현재 배치가 끝난 뒤 중단"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in ("completed", "failed", "cancelled"):
+        return job_to_dict(job)
+    job_runner.cancel(db, job)
+    return job_to_dict(job)
+
+@router.post("/{job_id}/retry")
+def retry_job(job_id: str, db: Session = Depends(get_db)):
+    """실패한 이미지만 대상으로 같은 종류의 새 작업을 생성"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    failed = job.failed_image_ids or []
+    if not failed:
+        raise HTTPException(status_code=400, detail="Job has no failed images to retry")
+
+    # 재개 위치(cursor)는 원래 작업에만 해당하므로 새 작업에는 넘기지 않음
+    params = {k: v for k, v in (job.params or {}).items() if k != "cursor"}
+    params.update({"image_ids": failed, "retry_of": job.id})
+    new_job = job_runner.create(db, job.type, params, total=len(failed), model_id=job.model_id)
+    job_runner.submit(new_job.id)
+    return job_to_dict(new_job)
+
+@router.websocket("/ws/{job_id}")
+async def job_progress_websocket(websocket: WebSocket, job_id: str):
+    await manager.connect(websocket, job_id)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        manager.disconnect(job_id)
+    except Exception as e:
+        print(f"Error in websocket for job {job_id}: {e}")
+        manager.disconnect(job_id)
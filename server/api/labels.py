@@ -1,15 +1,124 @@
+import json
 import uuid
 from datetime import datetime
-from fastapi import APIRouter, Depends, Body, Query
+from fastapi import APIRouter, Depends, Body, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List
 
-from server.db.database import get_db
-from server.db.models import BoundingBox, Segmentation, KeyPoint, Image, Class
+from server.db.database import get_db, get_read_db, ReadSessionLocal
+from server.db.models import BoundingBox, Segmentation, KeyPoint, Image, Class, Dataset, Job
+from server.db.queries import id_filters, label_models, iter_dataset_labels
 from server.utils.string_utils import to_snake_case, to_camel_case, recursive_to_snake_case, parse_datetime
+from server.core.jobs import JobContext, job_runner, job_to_dict
+from server.utils.masks import segmentation_columns, segmentation_mask_json
 
 router = APIRouter()
 
+# 요청 키(snake_case) → 라벨 모델
+LABEL_MODELS = label_models()
+# diff 비교에서 제외하는 컬럼
+_META_COLUMNS = {"id", "created_at", "updated_at"}
+# executemany 한 번에 보낼 행 수
+_INSERT_CHUNK = 5000
+# 세그멘테이션에서 마스크 인코딩으로 채우는 컬럼
+_MASK_COLUMNS = ("mask_data", "area", "x_min", "y_min", "x_max", "y_max")
+
+
+def _encode_segmentation(row: dict, item: dict):
+    """
+    요청의 mask(JSON)를 바이너리 + 면적/외접 박스 컬럼으로 변환.
+    바이너리에서 원본이 그대로 복원되지 않거나 해석할 수 없으면 원문을 mask 에 보존
+    """
+    mask = item.get("mask")
+    row.update(dict.fromkeys(_MASK_COLUMNS))
+    columns = segmentation_columns(mask)
+    if columns:
+        row.update(columns)
+    elif mask is not None and not isinstance(mask, str):
+        row["mask"] = json.dumps(mask)
+
+
+def _normalize_rows(model, image_id: str, items: List[dict]) -> List[dict]:
+    """
+    요청 항목을 테이블 컬럼 기준의 행(dict)으로 변환.
+    executemany 는 모든 행의 키가 같아야 하므로 빠진 컬럼은 None 으로 채웁니다.
+    """
+    columns = [c.name for c in model.__table__.columns]
+    rows = []
+    for item in items:
+        row = {name: item.get(name) for name in columns}
+        row["id"] = row["id"] or str(uuid.uuid4())
+        row["image_id"] = image_id
+        row["created_at"] = parse_datetime(item.get("created_at"))
+        row["updated_at"] = parse_datetime(item.get("updated_at"))
+        if model is Segmentation:
+            _encode_segmentation(row, item)
+        rows.append(row)
+    return rows
+
+
+def _label_out(key: str, row, include_masks: bool = True) -> dict:
+    """
+    라벨 행(dict/Row 매핑)을 camelCase 응답으로 변환.
+    세그멘테이션은 mask_data 대신 복원한 mask 를 넣으며, include_masks=False 이면 생략합니다.
+    """
+    if key != "segmentations":
+        return {to_camel_case(k): v for k, v in row.items()}
+    out = {to_camel_case(k): v for k, v in row.items() if k not in ("mask", "mask_data")}
+    if include_masks:
+        out["mask"] = segmentation_mask_json(row)
+    return out
+
+
+def _insert_rows(db: Session, model, rows: List[dict]):
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        db.execute(model.__table__.insert(), rows[start:start + _INSERT_CHUNK])
+
+
+def _delete_for_images(db: Session, model, image_ids: List[str]) -> int:
+    deleted = 0
+    for condition in id_filters(model.image_id, image_ids):
+        deleted += db.query(model).filter(condition).delete(synchronize_session=False)
+    return deleted
+
+
+def _diff_rows(db: Session, model, image_ids: List[str], rows: List[dict]) -> dict:
+    """
+    이미지별 최종 상태(rows)와 기존 행을 비교해 바뀐 행만 반영.
+    새 id 는 insert, 값이 달라진 id 는 update, 요청에 없는 기존 행은 delete 합니다.
+    """
+    table = model.__table__
+    compare = [c.name for c in table.columns if c.name not in _META_COLUMNS]
+    existing = {}
+    for condition in id_filters(model.image_id, image_ids):
+        for row in db.execute(select(*table.columns).where(condition)):
+            existing[row.id] = row._mapping
+
+    to_insert, to_update = [], []
+    for row in rows:
+        current = existing.pop(row["id"], None)
+        if current is None:
+            to_insert.append(row)
+        elif any(current[name] != row[name] for name in compare):
+            to_update.append({k: v for k, v in row.items() if k != "created_at"})
+
+    _insert_rows(db, model, to_insert)
+    if to_update:
+        db.bulk_update_mappings(model, to_update)
+    stale_ids = list(existing)
+    for condition in id_filters(model.id, stale_ids):
+        db.query(model).filter(condition).delete(synchronize_session=False)
+
+    return {
+        "inserted": len(to_insert),
+        "updated": len(to_update),
+        "deleted": len(stale_ids),
+        "unchanged": len(rows) - len(to_insert) - len(to_update),
+    }
+
+
 @router.post("/")
 def update_labels(
     data: dict = Body(...),
@@ -21,84 +130,215 @@ def update_labels(
     if not image_id:
         return {"error": "image_id is required"}
 
-    bounding_boxes_data = data.get("bounding_boxes", [])
-    key_points_data = data.get("key_points", [])
-    segmentations_data = data.get("segmentations", [])
-
-    # 기존 데이터 삭제
-    db.query(BoundingBox).filter(BoundingBox.image_id == image_id).delete()
-    db.query(KeyPoint).filter(KeyPoint.image_id == image_id).delete()
-    db.query(Segmentation).filter(Segmentation.image_id == image_id).delete()
-    db.commit()
-
-    bb_results, kp_results, seg_results = [], [], []
-
-    # 🟢 Bounding Box 저장
-    for bb in bounding_boxes_data:
-        if not bb.get("id"):
-            bb["id"] = str(uuid.uuid4())
-        bb["image_id"] = image_id  
-        bb["created_at"] = parse_datetime(bb.get("created_at"))
-        bb["updated_at"] = parse_datetime(bb.get("updated_at"))
-        new_bbox = BoundingBox(**bb)
-        db.add(new_bbox)
-        bb_results.append({to_camel_case(k): v for k, v in new_bbox.__dict__.items() if not k.startswith("_")})
-
-    # 🔵 KeyPoint 저장
-    for kp in key_points_data:
-        if not kp.get("id"):
-            kp["id"] = str(uuid.uuid4())
-        kp["image_id"] = image_id
-        kp["created_at"] = parse_datetime(kp.get("created_at"))
-        kp["updated_at"] = parse_datetime(kp.get("updated_at"))
-        new_kp = KeyPoint(**kp)
-        db.add(new_kp)
-        kp_results.append({to_camel_case(k): v for k, v in new_kp.__dict__.items() if not k.startswith("_")})
-
-    # 🔶 Segmentation 저장
-    for seg in segmentations_data:
-        if not seg.get("id"):
-            seg["id"] = str(uuid.uuid4())
-        seg["image_id"] = image_id
-        seg["created_at"] = parse_datetime(seg.get("created_at"))
-        seg["updated_at"] = parse_datetime(seg.get("updated_at"))
-        new_seg = Segmentation(**seg)
-        db.add(new_seg)
-        seg_results.append({to_camel_case(k): v for k, v in new_seg.__dict__.items() if not k.startswith("_")})
-
-    # 모든 변경 사항 DB에 저장
+    # 기존 데이터 삭제 후 새 데이터 저장 (하나의 트랜잭션)
+    results = {}
+    for key, model in LABEL_MODELS.items():
+        rows = _normalize_rows(model, image_id, data.get(key, []))
+        _delete_for_images(db, model, [image_id])
+        _insert_rows(db, model, rows)
+        results[key] = [_label_out(key, row) for row in rows]
     db.commit()
 
     return {
         "imageId": image_id,
-        "boundingBoxes": bb_results,
-        "keyPoints": kp_results,
-        "segmentations": seg_results,
+        "boundingBoxes": results["bounding_boxes"],
+        "keyPoints": results["key_points"],
+        "segmentations": results["segmentations"],
     }
 
+@router.post("/bulk")
+def bulk_update_labels(
+    images: List[dict] = Body(..., embed=True),
+    mode: str = Body("replace", embed=True),
+    db: Session = Depends(get_db)
+):
+    """
+    여러 이미지의 라벨을 하나의 트랜잭션으로 저장.
+    images: [{ imageId, boundingBoxes, keyPoints, segmentations }, ...]
+    - mode="replace": 요청에 포함된 이미지의 기존 라벨을 모두 지우고 executemany 로 다시 insert
+    - mode="diff": 각 이미지의 최종 상태와 비교해 바뀐 라벨만 insert/update/delete
+      (id 가 같으면 같은 라벨로 취급하므로 기존 라벨은 id 를 유지해서 보내야 함)
+    생성된 행을 되돌려주지 않고 테이블별 처리 건수만 반환합니다.
+    """
+    if mode not in ("replace", "diff"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'diff'")
+
+    images = recursive_to_snake_case(images)
+    requested_ids = [item.get("image_id") for item in images]
+    if not all(requested_ids):
+        raise HTTPException(status_code=400, detail="image_id is required for every entry")
+
+    existing_ids = set()
+    for condition in id_filters(Image.id, list(set(requested_ids))):
+        existing_ids.update(row.id for row in db.query(Image.id).filter(condition))
+    missing_ids = sorted(set(requested_ids) - existing_ids)
+    entries = [item for item in images if item["image_id"] in existing_ids]
+    image_ids = list(dict.fromkeys(item["image_id"] for item in entries))
+
+    summary = {}
+    try:
+        for key, model in LABEL_MODELS.items():
+            rows = [
+                row
+                for item in entries
+                for row in _normalize_rows(model, item["image_id"], item.get(key) or [])
+            ]
+            if mode == "replace":
+                deleted = _delete_for_images(db, model, image_ids)
+                _insert_rows(db, model, rows)
+                summary[to_camel_case(key)] = {"inserted": len(rows), "deleted": deleted}
+            else:
+                summary[to_camel_case(key)] = _diff_rows(db, model, image_ids, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {"mode": mode, "images": len(image_ids), "missingImageIds": missing_ids, **summary}
+
 @router.get("/")
 def list_labels(
     image_id: str = Query(..., description="Retrieve all labels for a specific image"),
-    db: Session = Depends(get_db)
+    include_masks: bool = Query(False, description="Decode and include segmentation masks"),
+    db: Session = Depends(get_read_db)
 ):
     """
-    특정 image_id에 해당하는 모든 바운딩박스, 키포인트, 세그멘테이션을 조회
+    특정 image_id에 해당하는 모든 바운딩박스, 키포인트, 세그멘테이션을 조회.
+    세그멘테이션은 기본적으로 면적/외접 박스만 반환하고 마스크 컬럼은 읽지 않습니다.
+    마스크가 필요하면 include_masks=true 또는 /segmentations/{id}/mask 를 사용합니다.
     """
-    bounding_boxes = db.query(BoundingBox).filter(BoundingBox.image_id == image_id).all()
-    keypoints = db.query(KeyPoint).filter(KeyPoint.image_id == image_id).all()
-    segmentations = db.query(Segmentation).filter(Segmentation.image_id == image_id).all()
+    results = {}
+    for key, model in LABEL_MODELS.items():
+        table = model.__table__
+        columns = [
+            c for c in table.columns
+            if include_masks or key != "segmentations" or c.name not in ("mask", "mask_data")
+        ]
+        rows = db.execute(select(*columns).where(table.c.image_id == image_id))
+        results[to_camel_case(key)] = [_label_out(key, row._mapping, include_masks) for row in rows]
+    return results
 
-    return {
-        "boundingBoxes": [
-            {to_camel_case(k): v for k, v in bbox.__dict__.items() if not k.startswith("_")}
-            for bbox in bounding_boxes
-        ],
-        "keyPoints": [
-            {to_camel_case(k): v for k, v in kp.__dict__.items() if not k.startswith("_")}
-            for kp in keypoints
-        ],
-        "segmentations": [
-            {to_camel_case(k): v for k, v in seg.__dict__.items() if not k.startswith("_")}
-            for seg in segmentations
-        ],
-    }
\ No newline at end of file
+@router.get("/segmentations/{segmentation_id}/mask")
+def get_segmentation_mask(segmentation_id: str, db: Session = Depends(get_db)):
+    """세그멘테이션 하나의 마스크를 반환 (보존된 원본 JSON, 없으면 폴리곤 좌표 목록 또는 COCO 압축 RLE)"""
+    table = Segmentation.__table__
+    row = db.execute(
+        select(table.c.id, table.c.mask, table.c.mask_data).where(table.c.id == segmentation_id)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Segmentation not found")
+    return {"id": row.id, "mask": segmentation_mask_json(row._mapping)}
+
+def _legacy_mask_filter(table):
+    return table.c.mask_data.is_(None) & table.c.mask.isnot(None)
+
+def run_mask_encoding_job(ctx: JobContext) -> dict:
+    """
+    JSON 문자열(mask)로만 저장된 기존 세그멘테이션을 mask_data + 면적/외접 박스로 변환하는 작업.
+    원본은 mask_data 에서 그대로 복원되는 경우에만 비우며, 해석할 수 없는 행은 건드리지 않고
+    failedImageIds 에 세그멘테이션 id 로 남깁니다. 마지막 id 를 params.cursor 에 기록하므로
+    재시작 후 이어서 실행됩니다.
+    """
+    db = ctx.db
+    table = Segmentation.__table__
+    batch_size = max(1, int(ctx.params.get("batch_size", 1000)))
+    cursor = ctx.params.get("cursor")
+    processed = (ctx.job.processed or 0) if cursor else 0
+    failed = list(ctx.job.failed_image_ids or []) if cursor else []
+    target = _legacy_mask_filter(table)
+    if ctx.params.get("image_ids"):
+        # 재시도 작업: 실패했던 세그멘테이션만 대상으로 함
+        target = table.c.id.in_(ctx.params["image_ids"]) & target
+
+    remaining = select(func.count()).select_from(table).where(target)
+    if cursor:
+        remaining = remaining.where(table.c.id > cursor)
+    total = processed + db.execute(remaining).scalar()
+    ctx.progress(processed, total, failed)
+
+    encoded = 0
+    while True:
+        ctx.check_cancelled()
+        query = select(table.c.id, table.c.mask).where(target)
+        if cursor:
+            query = query.where(table.c.id > cursor)
+        rows = db.execute(query.order_by(table.c.id).limit(batch_size)).all()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            columns = segmentation_columns(row.mask)
+            if columns is None:
+                failed.append(row.id)
+            else:
+                updates.append({"id": row.id, **columns})
+        if updates:
+            db.bulk_update_mappings(Segmentation, updates)
+        encoded += len(updates)
+
+        cursor = rows[-1].id
+        processed += len(rows)
+        ctx.job.params = {**ctx.params, "cursor": cursor}
+        ctx.progress(processed, total, failed)
+
+    print(f"Segmentation mask encoding finished: {encoded} encoded, {len(failed)} left as JSON")
+    return {"encoded": encoded, "failedImageIds": failed}
+
+job_runner.register("encode_segmentation_masks", run_mask_encoding_job)
+
+@router.post("/segmentations/encode-masks")
+def encode_segmentation_masks(batch_size: int = Body(1000, embed=True), db: Session = Depends(get_db)):
+    """
+    기존 JSON 마스크를 바이너리로 변환하는 작업을 생성합니다.
+    이미 대기/실행 중인 작업이 있으면 그 작업을 반환합니다.
+    """
+    active = db.query(Job).filter(
+        Job.type == "encode_segmentation_masks", Job.status.in_(["queued", "running"])
+    ).first()
+    if active:
+        return job_to_dict(active)
+
+    table = Segmentation.__table__
+    total = db.execute(select(func.count()).select_from(table).where(_legacy_mask_filter(table))).scalar()
+    if not total:
+        return {"status": "nothing_to_do", "total": 0}
+
+    job = job_runner.create(db, "encode_segmentation_masks", {"batch_size": max(1, batch_size)}, total=total)
+    job_runner.submit(job.id)
+    return job_to_dict(job)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _stream_dataset_labels(dataset_id: str, include_masks: bool):
+    """이미지마다 한 줄의 JSON(NDJSON)으로 라벨을 내보냄 (세 테이블을 한 번씩 순차 조회)"""
+    db = ReadSessionLocal()
+    try:
+        for image_id, labels in iter_dataset_labels(db, dataset_id):
+            payload = {
+                to_camel_case(key): [_label_out(key, row, include_masks) for row in rows]
+                for key, rows in labels.items()
+            }
+            yield json.dumps({"imageId": image_id, **payload}, default=_json_default) + "\n"
+    finally:
+        db.close()
+
+
+@router.get("/dataset/{dataset_id}")
+def stream_dataset_labels(
+    dataset_id: str,
+    include_masks: bool = Query(False),
+    db: Session = Depends(get_db)
+):
+    """
+    데이터셋에 속한 모든 이미지의 라벨을 NDJSON 으로 스트리밍.
+    라벨이 있는 이미지마다 { imageId, boundingBoxes, keyPoints, segmentations } 한 줄.
+    세그멘테이션 마스크는 include_masks=true 일 때만 복원해 포함합니다.
+    """
+    if not db.query(Dataset.id).filter(Dataset.id == dataset_id).first():
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    return StreamingResponse(_stream_dataset_labels(dataset_id, include_masks), media_type="application/x-ndjson")
@@ -1,67 +1,29 @@
 import os
 import uuid
 import io
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from umap import UMAP
-from typing import List
+from typing import List, Optional
 
 from PIL import Image as PILImage
 from datetime import datetime
-import onnxruntime as ort
-import faiss  # pip install faiss-cpu (또는 faiss-gpu)
 from fastapi import APIRouter, Depends, UploadFile, File, Body, HTTPException, Form, Query
 from sqlalchemy.orm import Session
-from server.db.database import get_db
+from server.db.database import get_db, get_read_db
 from server.db.models import AIModel, Image, ImageFeature
-from server.core.config import MODEL_UPLOAD_DIR
+from server.db.association_tables import dataset_images, class_images
+from server.core.config import MODEL_UPLOAD_DIR, settings
+from server.core.inference import session_pool, preprocess_image, load_and_preprocess, run_batch
+from server.core.jobs import job_runner, JobContext
+from server.core.projections import projection_cache, ENGINES
+from server.core.vector_store import (
+    INDEX_TYPES, get_vector_store, drop_vector_store, benchmark_index_types
+)
 
 router = APIRouter()
 
-# 모델별 Faiss 인덱스를 메모리에 캐싱할 딕셔너리
-# 형식: { model_id: (faiss_index, feature_dim, counter) }
-FAISS_INDEXES = {}
-
-# 모델별 UUID 매핑: { model_id: { uuid_str: int64_id } }
-FAISS_UUID_MAPPING = {}
-
-def load_or_create_faiss_index(model: AIModel, feature_dim: int):
-    """
-    model_id에 해당하는 Faiss 인덱스를 메모리에 로드하거나,
-    없으면 새로 생성해서 FAISS_INDEXES에 등록합니다.
-    IndexIDMap을 사용하여, feature 벡터마다 사용자 정의 int64 id를 할당할 수 있습니다.
-    """
-    model_id = model.id
-    if model_id in FAISS_INDEXES:
-        return FAISS_INDEXES[model_id][0]
-    
-    index_path = os.path.join(MODEL_UPLOAD_DIR, f"{model_id}.index")
-    if os.path.exists(index_path):
-        print(f"Loading Faiss index for model {model_id}...")
-        index = faiss.read_index(index_path)
-        counter = index.ntotal  # 현재 저장된 벡터 수를 카운터로 사용
-        FAISS_INDEXES[model_id] = (index, feature_dim, counter)
-        # 초기화: 기존 매핑은 새로 로드 시 복원하지 않으므로 빈 dict로 시작
-        FAISS_UUID_MAPPING.setdefault(model_id, {})
-        return index
-    else:
-        print(f"Creating new Faiss index for model {model_id} with dimension {feature_dim}")
-        base_index = faiss.IndexFlatL2(feature_dim)
-        index = faiss.IndexIDMap2(base_index)
-        FAISS_INDEXES[model_id] = (index, feature_dim, 0)
-        FAISS_UUID_MAPPING[model_id] = {}
-        return index
-
-def save_faiss_index(model_id: str):
-    """
-    메모리에 있는 인덱스를 디스크에 저장합니다.
-    """
-    if model_id not in FAISS_INDEXES:
-        return
-    index, _, _ = FAISS_INDEXES[model_id]
-    index_path = os.path.join(MODEL_UPLOAD_DIR, f"{model_id}.index")
-    faiss.write_index(index, index_path)
-    print('os.getcwd()', os.getcwd())
-    print(f"Saved Faiss index to {index_path}")
+# SQLite 의 바인드 변수 개수 제한 (구버전 999) 을 넘지 않는 IN 절 크기
+_IN_CLAUSE_CHUNK = 900
 
 @router.post("/upload", tags=["model"])
 async def upload_model(
@@ -70,29 +32,53 @@ async def upload_model(
     input_width: int = Body(...),
     input_height: int = Body(...),
     purpose: str = Body(...),
+    model_id: Optional[str] = Body(None),
     db: Session = Depends(get_db)
 ):
     """
-    모델 파일 업로드 및 DB 저장
+    모델 파일 업로드 및 DB 저장.
+    model_id 가 주어지고 이미 존재하는 모델이면 파일을 교체(재업로드)하고
+    캐싱된 InferenceSession 을 무효화합니다.
     """
-    model_id = str(uuid.uuid4())
+    existing_model = None
+    if model_id:
+        existing_model = db.query(AIModel).filter(AIModel.id == model_id).first()
+    else:
+        model_id = str(uuid.uuid4())
+
     file_location = os.path.join(MODEL_UPLOAD_DIR, f"{model_id}_{model_file.filename}")
     with open(file_location, "wb") as f:
         content = await model_file.read()
         f.write(content)
-    
-    new_model = AIModel(
-        id=model_id,
-        name=model_name,
-        file_location=file_location,
-        input_width=input_width,
-        input_height=input_height,
-        purpose=purpose,
-        uploaded_at=datetime.utcnow()
-    )
-    db.add(new_model)
+
+    if existing_model:
+        # 가중치가 바뀌면 기존 feature 는 더 이상 유효하지 않으므로 함께 제거
+        db.query(ImageFeature).filter(ImageFeature.model_id == model_id).delete()
+        drop_vector_store(model_id)
+        projection_cache.drop_model(model_id)
+        if existing_model.file_location != file_location and os.path.exists(existing_model.file_location):
+            os.remove(existing_model.file_location)
+        existing_model.name = model_name
+        existing_model.file_location = file_location
+        existing_model.input_width = input_width
+        existing_model.input_height = input_height
+        existing_model.purpose = purpose
+        existing_model.uploaded_at = datetime.utcnow()
+        new_model = existing_model
+    else:
+        new_model = AIModel(
+            id=model_id,
+            name=model_name,
+            file_location=file_location,
+            input_width=input_width,
+            input_height=input_height,
+            purpose=purpose,
+            uploaded_at=datetime.utcnow()
+        )
+        db.add(new_model)
     db.commit()
     db.refresh(new_model)
+    session_pool.invalidate(model_id)
     
     return {
         "id": new_model.id,
@@ -107,7 +93,7 @@ async def upload_model(
 @router.get("/list", tags=["model"])
 def list_models(
     purpose: str = Query("", description="필터링할 모델의 purpose (빈 문자열이면 전체 조회)"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     등록된 AI 모델 목록 조회 (purpose 필터 가능)
@@ -126,12 +112,139 @@ def list_models(
             "inputHeight": m.input_height,
             "purpose": m.purpose,
             "uploadedAt": m.uploaded_at.isoformat() if m.uploaded_at else None,
+            "indexType": m.index_type,
+            "indexParams": m.index_params,
         }
         for m in models
     ]
 
+@router.post("/{model_id}/index_config", tags=["model"])
+def update_index_config(
+    model_id: str,
+    index_type: str = Body(..., embed=True, alias="indexType"),
+    index_params: Optional[dict] = Body(None, embed=True, alias="indexParams"),
+    db: Session = Depends(get_db)
+):
+    """
+    모델의 Faiss 인덱스 종류(flat, ivf_flat, ivf_pq, hnsw)와 파라미터를 설정합니다.
+    벡터 수가 train_threshold 를 넘으면 백그라운드에서 학습 후 새 인덱스로 전환되며,
+    전환 중에도 feature 추출/검색은 기존 인덱스로 계속 동작합니다.
+    """
+    if index_type not in INDEX_TYPES:
+        raise HTTPException(status_code=400, detail=f"index_type must be one of {list(INDEX_TYPES)}")
+    model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    model_record.index_type = index_type
+    model_record.index_params = index_params or {}
+    db.commit()
+
+    store = get_vector_store(model_id)
+    if store is not None:
+        store.configure(index_type, index_params or {})
+    return get_index_status(model_id, db)
+
+@router.get("/{model_id}/index_status", tags=["model"])
+def get_index_status(model_id: str, db: Session = Depends(get_db)):
+    """현재 인덱스 종류, 목표 종류, 벡터 수, 전환 진행 여부를 반환"""
+    model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="Model not found")
+    store = get_vector_store(model_id)
+    if store is None:
+        return {"modelId": model_id, "indexType": None, "targetIndexType": model_record.index_type, "vectors": 0}
+    return {
+        "modelId": model_id,
+        "indexType": store.index_type,
+        "indexParams": store.index_params,
+        "targetIndexType": store.target_type,
+        "targetIndexParams": store.target_params,
+        "vectors": len(store.int_to_uuid),
+        "migrating": store.migrating,
+        "migrationError": store.migration_error,
+        # 삭제되었지만 인덱스에 남은 벡터 수 (HNSW). 검색 결과에서는 제외되며 비율이 커지면 재구축됨
+        "tombstones": store.tombstones,
+    }
+
+def _benchmark(model_id: str, configs: List[tuple], n_queries: int, k: int, max_vectors: int) -> dict:
+    unknown = [index_type for index_type, _ in configs if index_type not in INDEX_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown index types: {unknown}")
+    store = get_vector_store(model_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Faiss index not found. Need to run extract_features first.")
+    return {"modelId": model_id, "results": benchmark_index_types(store, configs, n_queries, k, max_vectors)}
+
+@router.get("/{model_id}/index_benchmark", tags=["model"])
+def benchmark_index(
+    model_id: str,
+    index_types: List[str] = Query(list(INDEX_TYPES), description="비교할 인덱스 종류"),
+    n_queries: int = Query(100),
+    k: int = Query(10),
+    max_vectors: int = Query(50000, description="측정에 사용할 최대 벡터 수"),
+):
+    """
+    저장된 벡터 샘플로 인덱스 종류별 recall@k, 쿼리당 검색 시간, 구축 시간, 인덱스 크기를 측정합니다.
+    배포 환경별로 인덱스 종류를 고를 때 사용합니다. (기본 파라미터, 파라미터 비교는 POST 사용)
+    """
+    return _benchmark(model_id, [(index_type, {}) for index_type in index_types], n_queries, k, max_vectors)
+
+@router.post("/{model_id}/index_benchmark", tags=["model"])
+def benchmark_index_params(
+    model_id: str,
+    configs: List[dict] = Body(..., embed=True, description='[{"indexType": "hnsw", "params": {"M": 16, "efSearch": 128}}, ...]'),
+    n_queries: int = Body(100, embed=True, alias="nQueries"),
+    k: int = Body(10, embed=True),
+    max_vectors: int = Body(50000, embed=True, alias="maxVectors"),
+):
+    """
+    (인덱스 종류, 파라미터) 조합별로 측정합니다. 같은 종류를 nlist/nprobe/M/efSearch 등만 바꿔
+    여러 번 넣어 비교할 수 있으며, 생략한 파라미터는 기본값을 사용합니다.
+    """
+    if any(not isinstance(config.get("params", {}), dict) for config in configs):
+        raise HTTPException(status_code=400, detail="params must be an object")
+    return _benchmark(
+        model_id,
+        [(config.get("indexType"), dict(config.get("params") or {})) for config in configs],
+        n_queries, k, max_vectors
+    )
+
+def _add_feature_vectors(db: Session, model_record: AIModel, image_ids: List[str], vectors: np.ndarray):
+    """
+    (N, D) feature 행렬을 한 번의 add_with_ids 로 모델의 VectorStore 에 추가하고
+    (WAL 에 한 번 기록), ImageFeature 레코드도 함께 생성.
+    커밋이 실패하면 추가한 벡터를 다시 제거합니다. (그 사이에 프로세스가 죽어 WAL 에만 남은 벡터는
+    다음 로드 때 get_vector_store 가 ImageFeature 와 대조해 정리)
+    반환값: { image_id: feature_id(uuid 문자열) }
+    """
+    model_id = model_record.id
+    store = get_vector_store(model_id, vectors.shape[1])
+    added = store.add(vectors)
+    feature_uuids = [feature_uuid for feature_uuid, _ in added]
+    int_ids = [int_id for _, int_id in added]
+
+    # ImageFeature 테이블에 새로운 레코드 생성
+    try:
+        db.bulk_insert_mappings(ImageFeature, [
+            {
+                "image_id": image_id,
+                "model_id": model_id,
+                "feature_id": feature_uuid,
+                "feature_int_id": int_id,
+            }
+            for image_id, feature_uuid, int_id in zip(image_ids, feature_uuids, int_ids)
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        store.remove(int_ids)
+        raise
+
+    return dict(zip(image_ids, feature_uuids))
+
 @router.post("/extract_features", tags=["model"])
-async def extract_features(
+def extract_features(
     model_id: str = Form(...),
     image_id: str = Form(...),
     db: Session = Depends(get_db)
@@ -141,6 +254,7 @@ async def extract_features(
     추출한 feature 벡터는 Faiss 인덱스에 저장하고,
     ImageFeature 테이블에 { image_id, model_id, feature_id } 형태의 레코드를 생성합니다.
     그리고 feature_id (문자열)를 응답합니다.
+    파일 I/O, 디코딩, 추론이 이벤트 루프를 막지 않도록 동기 함수(스레드 풀)로 실행됩니다.
     """
     # 모델 조회
     model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
@@ -162,164 +276,357 @@ async def extract_features(
         raise HTTPException(status_code=500, detail="Failed to read image file")
     
     try:
-        image = PILImage.open(io.BytesIO(image_bytes)).convert("RGB")
+        image = PILImage.open(io.BytesIO(image_bytes))
+        img_np = preprocess_image(image, model_record.input_width, model_record.input_height)
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid image file")
-    
-    width, height = model_record.input_width, model_record.input_height
-    image = image.resize((width, height))
-
-    img_np = np.array(image).astype(np.float32) / 255.0
-    img_np = img_np.transpose(2, 0, 1)
-    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
-    std = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
-    img_np = (img_np - mean) / std
-    img_np = np.expand_dims(img_np, axis=0)
 
     try:
-        session = ort.InferenceSession(model_record.file_location)
+        session = session_pool.get(model_record)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to load model")
     
-    input_name = session.get_inputs()[0].name
     try:
-        outputs = session.run(None, {input_name: img_np})
+        vector = run_batch(session, np.expand_dims(img_np, axis=0))
     except Exception as e:
         print("Inference error:", e)
         raise HTTPException(status_code=500, detail="Failed during inference")
-    
-    features = outputs[0]  # 예: shape = [1, D] 또는 [1, H, W, C]
-    # 만약 feature가 3차원 이상이라면 flatten 처리 (1, -1)
-    vector = features.reshape(1, -1).astype(np.float32)
-    
-    # Faiss 인덱스 로드/생성
-    feature_dim = vector.shape[1]
-    index = load_or_create_faiss_index(model_record, feature_dim)
-    _, _, counter = FAISS_INDEXES[model_id]
-    
-    # 새로운 feature id (uuid 문자열) 생성
-    new_feature_uuid = str(uuid.uuid4())
-    new_feature_int_id = counter
-    FAISS_INDEXES[model_id] = (index, feature_dim, counter + 1)
-    FAISS_UUID_MAPPING.setdefault(model_id, {})[new_feature_uuid] = new_feature_int_id
-    
-    index.add_with_ids(vector, np.array([new_feature_int_id], dtype=np.int64))
-    save_faiss_index(model_id)
-    
-    # ImageFeature 테이블에 새로운 레코드 생성
-    image_feature = ImageFeature(
-        image_id=image_id,
-        model_id=model_id,
-        feature_id=new_feature_uuid,
-        feature_int_id=new_feature_int_id
+
+    feature_ids = _add_feature_vectors(db, model_record, [image_id], vector)
+
+    return {"featureId": feature_ids[image_id]}
+
+def _extract_batch(session, model_record: AIModel, locations: dict, chunk: List[str], executor) -> tuple:
+    """
+    이미지 묶음을 디코딩/전처리(워커 풀) 후 한 번에 추론.
+    배치 추론이 실패하면 이미지별로 한 번씩 다시 시도해 실패한 이미지만 골라냅니다.
+    반환값: (성공한 image_id 목록, (N, D) feature 행렬 또는 None, 실패한 image_id 목록)
+    """
+    width, height = model_record.input_width, model_record.input_height
+    futures = {
+        image_id: executor.submit(load_and_preprocess, locations.get(image_id), width, height)
+        for image_id in chunk
+    }
+    batch_ids, batch_arrays, failed = [], [], []
+    for image_id, future in futures.items():
+        try:
+            batch_arrays.append(future.result())
+            batch_ids.append(image_id)
+        except Exception as e:
+            print(f"Failed to preprocess image {image_id}: {e}")
+            failed.append(image_id)
+
+    if not batch_ids:
+        return [], None, failed
+
+    try:
+        return batch_ids, run_batch(session, np.stack(batch_arrays)), failed
+    except Exception as e:
+        print(f"Batch inference failed, retrying images one by one: {e}")
+
+    ok_ids, vectors = [], []
+    for image_id, array in zip(batch_ids, batch_arrays):
+        try:
+            vectors.append(run_batch(session, array[np.newaxis]))
+            ok_ids.append(image_id)
+        except Exception as e:
+            print(f"Inference failed for image {image_id}: {e}")
+            failed.append(image_id)
+    return ok_ids, (np.vstack(vectors) if vectors else None), failed
+
+def run_extraction_job(ctx: JobContext) -> dict:
+    """
+    feature 추출 작업 (작업 스레드 풀에서 실행).
+    디코딩/전처리는 워커 풀에서, 추론은 N×3×H×W 배치로 수행하고
+    배치마다 한 번씩 VectorStore 에 추가합니다. 배치 사이에 취소 요청을 확인하며,
+    이미 feature 가 있는 이미지는 건너뛰므로 재시작 후 이어서 실행할 수 있습니다.
+    """
+    db = ctx.db
+    model_id = ctx.job.model_id
+    image_ids = ctx.params.get("image_ids", [])
+    batch_size = max(1, int(ctx.params.get("batch_size", settings.FEATURE_BATCH_SIZE)))
+
+    model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
+    if not model_record:
+        raise RuntimeError("Model not found")
+    session = session_pool.get(model_record)
+
+    locations = {}
+    done = set()
+    for start in range(0, len(image_ids), _IN_CLAUSE_CHUNK):
+        chunk = image_ids[start:start + _IN_CLAUSE_CHUNK]
+        locations.update(
+            (row.id, row.file_location)
+            for row in db.query(Image.id, Image.file_location).filter(Image.id.in_(chunk)).all()
+        )
+        done.update(
+            row.image_id for row in db.query(ImageFeature.image_id)
+            .filter(ImageFeature.model_id == model_id, ImageFeature.image_id.in_(chunk)).all()
+        )
+
+    total = len(image_ids)
+    pending = [image_id for image_id in image_ids if image_id not in done]
+    processed = total - len(pending)
+    failed = []
+    extracted = 0
+    ctx.progress(processed, total, failed)
+
+    with ThreadPoolExecutor(max_workers=settings.FEATURE_DECODE_WORKERS) as executor:
+        for start in range(0, len(pending), batch_size):
+            ctx.check_cancelled()
+            chunk = pending[start:start + batch_size]
+            ok_ids, vectors, chunk_failed = _extract_batch(session, model_record, locations, chunk, executor)
+            if ok_ids:
+                _add_feature_vectors(db, model_record, ok_ids, vectors)
+                extracted += len(ok_ids)
+            failed.extend(chunk_failed)
+            processed += len(chunk)
+            ctx.progress(processed, total, failed)
+
+    print(f"[{model_id}] Feature extraction finished: {extracted} extracted, {len(failed)} failed")
+    return {"extracted": extracted, "failedImageIds": failed}
+
+job_runner.register("extract_features", run_extraction_job)
+
+@router.post("/extract_features/batch", tags=["model"])
+def extract_features_batch(
+    model_id: str = Body(...),
+    dataset_id: Optional[str] = Body(None),
+    image_ids: Optional[List[str]] = Body(None),
+    batch_size: int = Body(settings.FEATURE_BATCH_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    데이터셋 ID 또는 이미지 ID 목록에 대한 feature 추출 작업을 생성합니다.
+    이미 해당 모델의 feature 가 있는 이미지는 건너뜁니다.
+    진행률은 /api/jobs/ws/{jobId} 로 전송되며, /api/jobs 에서 조회/취소/재시도할 수 있습니다.
+    """
+    if not dataset_id and not image_ids:
+        raise HTTPException(status_code=400, detail="dataset_id or image_ids is required")
+
+    model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    query = db.query(Image.id)
+    if dataset_id:
+        query = query.join(dataset_images, dataset_images.c.image_id == Image.id) \
+                     .filter(dataset_images.c.dataset_id == dataset_id)
+    if image_ids:
+        query = query.filter(Image.id.in_(image_ids))
+    already_extracted = db.query(ImageFeature.image_id).filter(ImageFeature.model_id == model_id)
+    query = query.filter(~Image.id.in_(already_extracted)).distinct()
+    target_ids = [row.id for row in query.all()]
+
+    if not target_ids:
+        return {"status": "nothing_to_do", "total": 0}
+
+    job = job_runner.create(
+        db, "extract_features", {"image_ids": target_ids, "batch_size": max(1, batch_size)},
+        total=len(target_ids), model_id=model_id
     )
-    db.add(image_feature)
-    db.commit()
-    
-    return {"featureId": new_feature_uuid}
+    job_runner.submit(job.id)
+    return {"status": "processing_started", "jobId": job.id, "total": len(target_ids)}
 
 @router.get("/compress_features", tags=["model"])
 def compress_features(
     image_ids: List[str] = Query(..., description="조회할 image ID 목록"),
     model_id: str = Query(..., description="차원 축소할 feature를 가진 모델의 ID"),
-    method: str = Query("umap", description="차원 축소 방법 (기본: umap)"),
+    method: str = Query("umap", description="차원 축소 방법: umap, pca, pca_umap, tsne, landmark (기본: umap)"),
+    dataset_ids: Optional[List[str]] = Query(None, description="투영 캐시를 공유할 데이터셋 범위"),
+    n_neighbors: int = Query(15, description="UMAP 이웃 수 (2 ~ 샘플 수-1 로 제한)"),
+    pca_components: int = Query(0, description="UMAP 전에 PCA 로 줄일 차원 수 (0 이면 사용 안 함)"),
+    perplexity: float = Query(30.0, description="t-SNE perplexity"),
+    landmarks: int = Query(5000, description="landmark 방식에서 UMAP 을 학습할 표본 수"),
+    refresh: bool = Query(False, description="캐시를 무시하고 다시 학습"),
     db: Session = Depends(get_db)
 ):
     """
     주어진 image_ids와 model_id를 기반으로, 각 이미지에 대해 해당 모델로부터
     추출한 feature 벡터들을 UMAP 등으로 2차원으로 압축한 좌표를 반환합니다.
+    대규모 데이터에는 pca(가장 빠름), pca_umap, tsne(근사 kNN 그래프),
+    landmark(표본에 학습 후 나머지는 kNN 보간) 방식을 사용할 수 있으며,
+    단계별 소요 시간은 projection.timings 로 반환됩니다.
+    학습된 투영은 (model_id, dataset_ids, method, params) 별로 캐싱되며 (dataset_ids 가 없으면
+    요청한 이미지 집합별), 새 이미지는 전체 재학습 없이 transform 으로 배치됩니다.
     """
-    # 1. image_ids에 해당하는 이미지들을 DB에서 조회
-    images = db.query(Image).filter(Image.id.in_(image_ids)).all()
-    if not images:
-        raise HTTPException(status_code=404, detail="No images found for the provided IDs")
-    
-    # 2. Faiss 인덱스가 메모리에 없다면 디스크에서 .index 파일 로드
-    if model_id not in FAISS_INDEXES:
-        model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
-        if not model_record:
-            raise HTTPException(status_code=404, detail="Model not found in DB")
-
-        index_path = os.path.join(MODEL_UPLOAD_DIR, f"{model_id}.index")
-        if os.path.exists(index_path):
-            try:
-                index = faiss.read_index(index_path)
-                feature_dim = index.d  # index에서 차원 수 가져오기
-                counter = index.ntotal
-                FAISS_INDEXES[model_id] = (index, feature_dim, counter)
-                FAISS_UUID_MAPPING.setdefault(model_id, {})  # UUID 매핑은 다시 로드 필요 (여기선 생략)
-            except Exception as e:
-                print("Failed to load Faiss index from disk:", e)
-                raise HTTPException(status_code=500, detail="Failed to load Faiss index from disk")
-        else:
-            raise HTTPException(
-                status_code=404,
-                detail="Faiss index not in memory or disk. Need to run extract_features first."
-            )
+    method = method.lower()
+    if method not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"method must be one of {list(ENGINES)}")
+    # 0. 모델의 VectorStore 로드 (메모리에 없다면 체크포인트 + WAL 에서 복구)
+    model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="Model not found in DB")
+    try:
+        store = get_vector_store(model_id)
+    except Exception as e:
+        print("Failed to load Faiss index from disk:", e)
+        raise HTTPException(status_code=500, detail="Failed to load Faiss index from disk")
+    if store is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Faiss index not in memory or disk. Need to run extract_features first."
+        )
 
-    # 3. FAISS_INDEXES에서 해당 모델의 인덱스 정보 가져오기
-    if model_id not in FAISS_INDEXES:
-        raise HTTPException(status_code=404, detail="Faiss index not available")
-
-    index, feature_dim, _ = FAISS_INDEXES[model_id]
-
-    # 4. 각 이미지에 대해 ImageFeature 관계에서 model_id에 해당하는 feature_int_id를 찾고,
-    #    해당 ID를 이용해 Faiss 인덱스로부터 벡터 복원
-    valid_image_ids = []
-    feature_vectors = []
-    for img in images:
-        feature_record = next((f for f in img.image_features if f.model_id == model_id), None)
-        if not feature_record:
-            print(f"No feature for image {img.id} and model {model_id}")
-            continue
-        
-        int_feature_id = feature_record.feature_int_id
-        if int_feature_id is None:
-            continue
+    # 1. image_ids 에 해당하는 (image_id, feature_int_id) 를 ImageFeature 에서 한 번에 조회
+    #    (SQLite 바인드 변수 제한을 넘지 않도록 IN 절은 청크 단위)
+    feature_rows = []
+    for start in range(0, len(image_ids), _IN_CLAUSE_CHUNK):
+        chunk = image_ids[start:start + _IN_CLAUSE_CHUNK]
+        feature_rows.extend(
+            db.query(ImageFeature.image_id, ImageFeature.feature_int_id)
+              .filter(ImageFeature.model_id == model_id, ImageFeature.image_id.in_(chunk))
+              .all()
+        )
+    feature_rows = [row for row in feature_rows if row.feature_int_id in store.int_to_uuid]
 
-        try:
-            vec = index.reconstruct(int_feature_id)
-        except Exception as e:
-            print(f"Reconstruct error for image {img.id}, feature_int_id={int_feature_id}: {e}")
-            continue
+    if not feature_rows:
+        if not any(
+            db.query(Image.id).filter(Image.id.in_(image_ids[start:start + _IN_CLAUSE_CHUNK])).first()
+            for start in range(0, len(image_ids), _IN_CLAUSE_CHUNK)
+        ):
+            raise HTTPException(status_code=404, detail="No images found for the provided IDs")
+        return {"message": "No features found for the given images and model."}
 
-        feature_vectors.append(vec)
-        valid_image_ids.append(img.id)
+    valid_image_ids = [row.image_id for row in feature_rows]
+    int_id_by_image = {row.image_id: row.feature_int_id for row in feature_rows}
 
-    if not feature_vectors:
-        return {"message": "No features found for the given images and model."}
+    # 2. 캐시에 없는 이미지(재학습 시에는 캐시 항목에 있던 이미지 포함)의 벡터만 한 번에 복원
+    def fetch_vectors(ids):
+        unknown = [image_id for image_id in ids if image_id not in int_id_by_image]
+        for start in range(0, len(unknown), _IN_CLAUSE_CHUNK):
+            int_id_by_image.update(
+                db.query(ImageFeature.image_id, ImageFeature.feature_int_id)
+                  .filter(ImageFeature.model_id == model_id,
+                          ImageFeature.image_id.in_(unknown[start:start + _IN_CLAUSE_CHUNK]))
+                  .all()
+            )
+        # 캐시 이후 삭제된 이미지는 제외
+        found = [image_id for image_id in ids if int_id_by_image.get(image_id) in store.int_to_uuid]
+        return found, store.reconstruct_many([int_id_by_image[image_id] for image_id in found])
 
-    # 5. feature vector들을 numpy array로 변환
+    # 3. 차원 축소 (캐시된 좌표 재사용 / 새 이미지는 transform / 필요 시 재학습)
+    params = {"n_neighbors": n_neighbors, "pca_components": pca_components}
+    if method == "tsne":
+        params["perplexity"] = perplexity
+    elif method == "landmark":
+        params["landmarks"] = landmarks
+    scope = dataset_ids or projection_cache.image_scope(valid_image_ids)
     try:
-        feature_array = np.vstack(feature_vectors)  # shape: (n_samples, feature_dim)
+        coords, info = projection_cache.project(
+            model_id, scope, method, params, valid_image_ids, fetch_vectors, refresh
+        )
     except Exception as e:
-        print("Error during np.vstack of feature vectors:", e)
-        raise HTTPException(status_code=500, detail="Failed to stack feature vectors")
+        print(f"{method} reduction error:", e)
+        raise HTTPException(status_code=500, detail=f"{method.upper()} dimensionality reduction failed")
 
-    # 6. 차원 축소
-    if method.lower() == "umap":
-        try:
-            sample_count = len(feature_array)
-
-            if sample_count < 3:
-                compressed = np.random.rand(sample_count, 2).astype(np.float32)
-            else:
-                safe_neighbors = max(2, sample_count - 1)
-
-                reducer = UMAP(
-                    n_components=2,
-                    n_neighbors=safe_neighbors,
-                    init="random",
-                    random_state=42,
-                    force_approximation_algorithm=True
-                )
-                compressed = reducer.fit_transform(feature_array)
+    return {"featureCoordinates": coords, "projection": info}
+
+def _allowed_feature_int_ids(
+    db: Session,
+    model_id: str,
+    dataset_ids: Optional[List[str]],
+    class_ids: Optional[List[str]]
+) -> Optional[List[int]]:
+    """dataset/class 필터에 해당하는 feature_int_id 목록. 필터가 없으면 None."""
+    if not dataset_ids and not class_ids:
+        return None
+    query = db.query(ImageFeature.feature_int_id).filter(ImageFeature.model_id == model_id)
+    if dataset_ids:
+        query = query.filter(ImageFeature.image_id.in_(
+            db.query(dataset_images.c.image_id).filter(dataset_images.c.dataset_id.in_(dataset_ids))
+        ))
+    if class_ids:
+        query = query.filter(ImageFeature.image_id.in_(
+            db.query(class_images.c.image_id).filter(class_images.c.class_id.in_(class_ids))
+        ))
+    return [row.feature_int_id for row in query.all()]
+
+@router.post("/similar", tags=["model"])
+def find_similar_images(
+    model_id: str = Form(...),
+    image_ids: Optional[List[str]] = Form(None),
+    query_file: Optional[UploadFile] = File(None),
+    k: int = Form(10),
+    dataset_ids: Optional[List[str]] = Form(None),
+    class_ids: Optional[List[str]] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """
+    이미지 ID 목록(배치 쿼리) 또는 업로드한 쿼리 이미지에 대해
+    모델의 Faiss 인덱스에서 top-k 최근접 이미지를 찾습니다.
+    dataset_ids / class_ids 로 검색 대상을 제한할 수 있습니다.
+    추론/검색이 이벤트 루프를 막지 않도록 동기 함수(스레드 풀)로 실행됩니다.
+    """
+    if not image_ids and query_file is None:
+        raise HTTPException(status_code=400, detail="image_ids or query_file is required")
+    k = max(1, min(k, 1000))
+
+    model_record = db.query(AIModel).filter(AIModel.id == model_id).first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="Model not found")
+    store = get_vector_store(model_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Faiss index not found. Need to run extract_features first.")
 
+    query_keys, query_vectors, exclude_ids = [], [], []
+
+    # 1. 이미지 ID 쿼리: 저장된 벡터를 그대로 사용
+    if image_ids:
+        rows = db.query(ImageFeature.image_id, ImageFeature.feature_int_id) \
+                 .filter(ImageFeature.model_id == model_id, ImageFeature.image_id.in_(image_ids)).all()
+        int_id_by_image = {row.image_id: row.feature_int_id for row in rows}
+        missing = [image_id for image_id in image_ids if image_id not in int_id_by_image]
+        if missing:
+            raise HTTPException(status_code=404, detail={"message": "No features for images", "imageIds": missing})
+        int_ids = [int_id_by_image[image_id] for image_id in image_ids]
+        query_keys.extend(image_ids)
+        query_vectors.append(store.reconstruct_many(int_ids))
+        exclude_ids.extend(int_ids)
+
+    # 2. 업로드한 쿼리 이미지: 즉석에서 feature 추출
+    if query_file is not None:
+        try:
+            image = PILImage.open(io.BytesIO(query_file.file.read()))
+            img_np = preprocess_image(image, model_record.input_width, model_record.input_height)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        try:
+            vector = run_batch(session_pool.get(model_record), np.expand_dims(img_np, axis=0))
         except Exception as e:
-            print("UMAP reduction error:", e)
-            raise HTTPException(status_code=500, detail="UMAP dimensionality reduction failed")
+            print("Inference error:", e)
+            raise HTTPException(status_code=500, detail="Failed during inference")
+        if vector.shape[1] != store.dim:
+            raise HTTPException(status_code=400, detail="Feature dimension does not match the index")
+        query_keys.append(None)
+        query_vectors.append(vector)
+        exclude_ids.append(None)
+
+    allowed_ids = _allowed_feature_int_ids(db, model_id, dataset_ids, class_ids)
+    results = store.search(np.vstack(query_vectors), k, allowed_ids=allowed_ids, exclude_ids=exclude_ids)
 
-    # 7. 최종 결과 매핑
-    coords = {img_id: compressed[i].tolist() for i, img_id in enumerate(valid_image_ids)}
+    # 3. int id → image id 를 한 번의 쿼리로 변환
+    found_int_ids = {int_id for row in results for int_id, _ in row}
+    image_by_int_id = {}
+    if found_int_ids:
+        rows = db.query(ImageFeature.feature_int_id, ImageFeature.image_id, ImageFeature.feature_id) \
+                 .filter(ImageFeature.model_id == model_id, ImageFeature.feature_int_id.in_(found_int_ids)).all()
+        image_by_int_id = {row.feature_int_id: (row.image_id, row.feature_id) for row in rows}
 
-    return {"featureCoordinates": coords}
+    return {
+        "results": [
+            {
+                "queryImageId": query_key,
+                "neighbors": [
+                    {
+                        "imageId": image_by_int_id[int_id][0],
+                        "featureId": image_by_int_id[int_id][1],
+                        "distance": distance,
+                    }
+                    for int_id, distance in row
+                    if int_id in image_by_int_id
+                ],
+            }
+            for query_key, row in zip(query_keys, results)
+        ]
+    }
@@ -5,46 +5,41 @@ from fastapi import (
 )
 import os
 import shutil
+import threading
+import time
 import uuid
-from typing import Optional, List
-from server.utils.file_utils import create_thumbnail, delete_file
-from server.core.config import UPLOAD_DIR, TMP_FOLDER
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, List, Dict
+from server.utils.file_utils import delete_file
+from server.utils.thumbnails import ingest_image, observe_render
+from server.core.blob_store import store_file, blob_thumbnail_path
+from server.core.config import UPLOAD_DIR, TMP_FOLDER, settings
 from server.utils.string_utils import to_camel_case
 
 # ConnectionManager import (경로는 실제 프로젝트 구조에 맞게 수정하세요)
 from server.core.websockets import manager 
+from server.core.metrics import UPLOAD_BYTES
 
 router = APIRouter()
 
 @router.post("/upload-file")
-async def upload_file(file: UploadFile = File(...)):
+def upload_file(file: UploadFile = File(...)):
     file_id = str(uuid.uuid4()).replace("-", "")
-    fname = f"{file_id}_{file.filename}"
+    tmp_location = os.path.join(TMP_FOLDER, f"{file_id}_{file.filename}")
 
-    folder_path = os.path.join(UPLOAD_DIR, "images")
-    thumbnail_folder = os.path.join(UPLOAD_DIR, "thumbnails")
-
-    os.makedirs(folder_path, exist_ok=True)
-    os.makedirs(thumbnail_folder, exist_ok=True)
-    
-    file_location = os.path.join(folder_path, fname)
-    thumbnail_location = os.path.join(thumbnail_folder, fname)
-
-    with open(file_location, "wb") as f:
+    with open(tmp_location, "wb") as f:
         shutil.copyfileobj(file.file, f)
-    
-    thumbnail_location = create_thumbnail(file_location, thumbnail_location)
+        UPLOAD_BYTES.inc(f.tell(), endpoint="upload-file")
 
     response = {
         "id": file_id,
         "filename": file.filename,
-        "fileLocation": file_location,
-        "thumbnailLocation": thumbnail_location,
+        **observe_render(_commit_file(tmp_location, file.filename)),
     }
     return {to_camel_case(k): v for k, v in response.items()}
 
 @router.post("/upload-temp")
-async def upload_temp_file(file: UploadFile = File(...), session_id: str = Form(...)):
+def upload_temp_file(file: UploadFile = File(...), session_id: str = Form(...)):
     tmp_session_folder = os.path.join(TMP_FOLDER, session_id)
     os.makedirs(tmp_session_folder, exist_ok=True)
 
@@ -53,70 +48,133 @@ async def upload_temp_file(file: UploadFile = File(...), session_id: str = Form(
 
     with open(tmp_file_path, "wb") as f:
         shutil.copyfileobj(file.file, f)
+        UPLOAD_BYTES.inc(f.tell(), endpoint="upload-temp")
 
     return {"fileId": file_id, "filename": file.filename, "tempLocation": tmp_file_path}
 
+# 파일 이동 + 썸네일 생성을 위한 프로세스 풀 (처음 사용할 때 생성)
+_commit_pool: Optional[ProcessPoolExecutor] = None
+_commit_pool_lock = threading.Lock()
+
+# 진행률 메시지 최소 전송 간격 (초)
+PROGRESS_INTERVAL = 0.25
+
+
+def _get_commit_pool() -> ProcessPoolExecutor:
+    global _commit_pool
+    with _commit_pool_lock:
+        if _commit_pool is None:
+            _commit_pool = ProcessPoolExecutor(max_workers=settings.UPLOAD_COMMIT_WORKERS)
+        return _commit_pool
+
+
+def _index_session_folder(tmp_session_folder: str) -> Dict[str, str]:
+    """세션 폴더를 한 번만 읽어 { file_id: tmp_filename } 인덱스를 생성"""
+    index = {}
+    if not os.path.isdir(tmp_session_folder):
+        return index
+    with os.scandir(tmp_session_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and "_" in entry.name:
+                index.setdefault(entry.name.split("_", 1)[0], entry.name)
+    return index
+
+
+def _commit_file(tmp_file_path: str, filename: str) -> dict:
+    """
+    (워커 프로세스) 파일을 내용 해시 기반 blob 으로 옮기고 썸네일/메타데이터를 기록.
+    같은 내용이 이미 저장되어 있으면 기존 blob 과 썸네일을 그대로 재사용합니다.
+    썸네일 생성 시간은 render_seconds 로 돌려주며 부모 프로세스에서 observe_render 로 기록합니다.
+    """
+    file_location, digest, deduplicated = store_file(tmp_file_path, filename)
+    info = ingest_image(file_location, blob_thumbnail_path(digest), digest=digest)
+    info["file_location"] = file_location
+    info["deduplicated"] = deduplicated
+    return info
+
+
 def process_files_in_background(session_id: str, file_ids: List[str], loop: asyncio.AbstractEventLoop):
-    """실제 파일 처리 로직 (백그라운드에서 실행될 함수)"""
-    final_folder = os.path.join(UPLOAD_DIR, "images")
-    thumbnail_folder = os.path.join(UPLOAD_DIR, "thumbnails")
+    """
+    실제 파일 처리 로직 (백그라운드에서 실행될 함수).
+    세션 폴더는 한 번만 인덱싱하고, 이동/썸네일 생성은 프로세스 풀에서 병렬로 수행합니다.
+    진행률은 PROGRESS_INTERVAL 마다 하나로 합쳐 전송하며 워커를 기다리게 하지 않습니다.
+    파일 하나가 실패해도 나머지는 계속 처리하고, 실패한 file_id 는 failedFileIds 로 알립니다.
+    """
     tmp_session_folder = os.path.join(TMP_FOLDER, session_id)
 
-    os.makedirs(final_folder, exist_ok=True)
-    os.makedirs(thumbnail_folder, exist_ok=True)
-
     print(f"Processing files in background: {session_id} ({len(file_ids)} files)")
 
-    moved_files_info = []
     total_files = len(file_ids)
     processed_count = 0
+    failed_ids: List[str] = []
+    pending_progress = None
+    last_sent = 0.0
+
+    def send_progress(force: bool = False):
+        nonlocal pending_progress, last_sent
+        now = time.monotonic()
+        if not force and now - last_sent < PROGRESS_INTERVAL:
+            return
+        # 이전 메시지가 아직 전송 중이면 건너뜀 (다음 메시지에 합쳐짐)
+        if not force and pending_progress is not None and not pending_progress.done():
+            return
+        pending_progress = asyncio.run_coroutine_threadsafe(
+            manager.send_progress(session_id, processed_count, total_files, list(failed_ids)), loop
+        )
+        last_sent = now
 
     try:
-        for i, file_id in enumerate(file_ids):
-            # ... (파일 찾기 및 이동 로직) ...
-            matched_files = [f for f in os.listdir(tmp_session_folder) if f.startswith(f"{file_id}_")]
-            if not matched_files:
+        session_index = _index_session_folder(tmp_session_folder)
+        pool = _get_commit_pool()
+
+        futures = {}
+        for file_id in file_ids:
+            tmp_filename = session_index.get(file_id)
+            if not tmp_filename:
+                print(f"[{session_id}] Temp file not found for {file_id}")
+                failed_ids.append(file_id)
+                processed_count += 1
+                continue
+            future = pool.submit(
+                _commit_file,
+                os.path.join(tmp_session_folder, tmp_filename),
+                tmp_filename.split("_", 1)[1],
+            )
+            futures[future] = (file_id, tmp_filename)
+
+        moved_by_id = {}
+        for future in as_completed(futures):
+            file_id, tmp_filename = futures[future]
+            processed_count += 1
+            try:
+                info = future.result()
+            except Exception as e:
+                print(f"[{session_id}] Failed to commit {tmp_filename}: {e}")
+                failed_ids.append(file_id)
+                send_progress()
                 continue
-            tmp_filename = matched_files[0]
-            tmp_file_path = os.path.join(tmp_session_folder, tmp_filename)
-            final_file_path = os.path.join(final_folder, tmp_filename)
-            shutil.move(tmp_file_path, final_file_path)
-            thumbnail_path = create_thumbnail(final_file_path, os.path.join(thumbnail_folder, tmp_filename))
-            moved_files_info.append({
+            observe_render(info)
+            moved_by_id[file_id] = {
                 "id": file_id,
                 "filename": tmp_filename.split("_", 1)[1],
-                "fileLocation": final_file_path,
-                "thumbnailLocation": thumbnail_path,
-            })
-            processed_count += 1
-            # ... (파일 처리 완료) ...
-
-            # N개마다 또는 일정 시간마다 진행률 전송
-            if processed_count % 10 == 0 or processed_count == total_files:
-                print(f"[{session_id}] Progress: {processed_count}/{total_files}")
-                # 👇 전달받은 loop를 사용합니다.
-                future = asyncio.run_coroutine_threadsafe(
-                    manager.send_progress(session_id, processed_count, total_files), loop
-                )
-                future.result() # 작업이 메인 루프에서 실행되기를 기다림 (timeout 추가 고려)
-
-        # 완료 메시지 전송
-        # 👇 전달받은 loop를 사용합니다.
-        future = asyncio.run_coroutine_threadsafe(
-            manager.send_complete(session_id, moved_files_info), loop
-        )
-        future.result()
+                **{to_camel_case(k): v for k, v in info.items()},
+            }
+            send_progress()
+
+        print(f"[{session_id}] Progress: {processed_count}/{total_files} ({len(failed_ids)} failed)")
+        send_progress(force=True)
+
+        # 완료 메시지 전송 (요청한 file_ids 순서 유지)
+        moved_files_info = [moved_by_id[file_id] for file_id in file_ids if file_id in moved_by_id]
+        asyncio.run_coroutine_threadsafe(
+            manager.send_complete(session_id, moved_files_info, failed_ids), loop
+        ).result(timeout=30)
 
     except Exception as e:
         print(f"Error during background processing: {e}")
-        # 👇 전달받은 loop를 사용합니다.
-        future = asyncio.run_coroutine_threadsafe(
+        asyncio.run_coroutine_threadsafe(
             manager.send_error(session_id, str(e)), loop
         )
-        future.result()
-    finally:
-        # 백그라운드 스레드에서 루프를 닫거나 관리할 필요는 없습니다. (메인 루프이므로)
-        pass # 특별히 할 일 없음
 
 
 @router.post("/commit-uploads")
@@ -4,39 +4,184 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
 from server.core.config import settings, ADMIN_EMAILS
+from server.core.metrics import REGISTRY
 from server.db.models import User
 from sqlalchemy.orm import Session
 from server.db.database import get_db
 from passlib.context import CryptContext
-import requests
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import hashlib
+import re
+import time
 import httpx
 import logging
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-def get_kratos_client() -> httpx.AsyncClient:
-    """
-    Create and return an httpx AsyncClient configured for Kratos API calls
-    """
-    logger = logging.getLogger(__name__)
-    
-    base_url = settings.KRATOS_PUBLIC_URL
-    logger.debug(f"Creating Kratos client with base URL: {base_url}")
-    
+# ────────────────────────────────
+# Kratos HTTP 클라이언트 (앱 수명 동안 하나를 공유)
+# ────────────────────────────────
+class _PoolStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """응답 본문이 닫힐 때 in-flight 수를 줄이기 위한 래퍼"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _MeteredTransport(httpx.AsyncHTTPTransport):
+    """요청 수/오류 수/사용 중인 연결 수를 기록하는 transport"""
+
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self.stats
+        stats.requests += 1
+        stats.in_flight += 1
+
+        def _done():
+            stats.in_flight -= 1
+
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            _done()
+            raise
+        response.stream = _TrackedStream(response.stream, _done)
+        return response
+
+    def pool_connections(self) -> list:
+        return list(getattr(self._pool, "connections", []))
+
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[_MeteredTransport] = None
+_stats = _PoolStats()
+
+
+@lru_cache()
+def _http2_enabled() -> bool:
+    if not settings.KRATOS_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (httpx 의 HTTP/2 지원은 h2 패키지가 필요)
+        return True
+    except ImportError:
+        logging.getLogger(__name__).warning(
+            "KRATOS_HTTP2 is set but the 'h2' package is not installed (pip install 'ingradient[http2]'); using HTTP/1.1"
+        )
+        return False
+
+
+def _build_kratos_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    global _transport
+    if transport is None:
+        _transport = transport = _MeteredTransport(
+            _stats,
+            http2=_http2_enabled(),
+            verify=settings.KRATOS_VERIFY_TLS,
+            limits=httpx.Limits(
+                max_connections=settings.KRATOS_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.KRATOS_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.KRATOS_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    else:
+        _transport = None
     return httpx.AsyncClient(
-        base_url=base_url,
-        headers={
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "X-Session-Token": "",
-            "X-CSRF-Token": ""
-        },
+        base_url=settings.KRATOS_PUBLIC_URL,
+        headers={"Accept": "application/json"},
         follow_redirects=True,
-        timeout=30.0,
-        verify=False  # 개발 환경에서만 사용
+        timeout=httpx.Timeout(settings.KRATOS_HTTP_TIMEOUT, connect=settings.KRATOS_HTTP_CONNECT_TIMEOUT),
+        transport=transport,
     )
 
+
+def get_kratos_client() -> httpx.AsyncClient:
+    """
+    Kratos 호출용 공용 AsyncClient. 연결 풀을 재사용하므로 호출자가 닫으면 안 됩니다.
+    (async with 로 감싸지 말 것) 앱 lifespan 이전에 호출되면 이 시점에 생성합니다.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_kratos_client()
+    return _client
+
+
+async def open_kratos_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    앱 시작 시 공용 클라이언트 생성. transport 를 주면 그것을 사용합니다
+    (예: 테스트에서 httpx.MockTransport 로 만든 stub Kratos).
+    """
+    global _client
+    await close_kratos_client()
+    _client = _build_kratos_client(transport)
+    return _client
+
+
+async def close_kratos_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def kratos_pool_stats() -> dict:
+    """Kratos 연결 풀 사용 현황"""
+    connections = _transport.pool_connections() if _transport is not None else []
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "maxConnections": settings.KRATOS_HTTP_MAX_CONNECTIONS,
+        "maxKeepalive": settings.KRATOS_HTTP_MAX_KEEPALIVE,
+        "http2": _http2_enabled(),
+        "open": len(connections),
+        "idle": idle,
+        "inFlight": _stats.in_flight,
+        "utilization": _stats.in_flight / max(1, settings.KRATOS_HTTP_MAX_CONNECTIONS),
+        "requests": _stats.requests,
+        "errors": _stats.errors,
+    }
+
+
+def _kratos_pool_metrics():
+    stats = kratos_pool_stats()
+    return [
+        ("kratos_http_connections_open", "gauge", "Open connections in the Kratos HTTP pool", stats["open"]),
+        ("kratos_http_connections_idle", "gauge", "Idle keep-alive connections in the Kratos HTTP pool", stats["idle"]),
+        ("kratos_http_requests_in_flight", "gauge", "Kratos requests currently using a connection", stats["inFlight"]),
+        ("kratos_http_requests_total", "counter", "Requests sent to Kratos", stats["requests"]),
+        ("kratos_http_errors_total", "counter", "Kratos requests that failed at the transport level", stats["errors"]),
+    ]
+
+
+REGISTRY.register_collector(_kratos_pool_metrics)
+
+
 async def test_kratos_connection():
     """
     Test the connection to Kratos server
@@ -44,12 +189,11 @@ async def test_kratos_connection():
     logger = logging.getLogger(__name__)
     
     try:
-        async with get_kratos_client() as client:
-            response = await client.get("/health/ready")
-            logger.debug(f"Kratos health check response: {response.status_code}")
-            logger.debug(f"Kratos health check headers: {response.headers}")
-            logger.debug(f"Kratos health check body: {response.text}")
-            return response.status_code == 200
+        response = await get_kratos_client().get("/health/ready")
+        logger.debug(f"Kratos health check response: {response.status_code}")
+        logger.debug(f"Kratos health check headers: {response.headers}")
+        logger.debug(f"Kratos health check body: {response.text}")
+        return response.status_code == 200
     except Exception as e:
         logger.error(f"Failed to connect to Kratos: {str(e)}", exc_info=True)
         return False
@@ -70,41 +214,151 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# ────────────────────────────────
+# Kratos 세션 검증 캐시
+# ────────────────────────────────
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+
+def _parse_expires_at(value) -> Optional[float]:
+    """Kratos 의 expires_at(RFC3339, 나노초 가능)을 epoch 초로 변환"""
+    if not isinstance(value, str):
+        return None
+    try:
+        value = _FRACTION.sub(r"\1", value.replace("Z", "+00:00"))
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+class SessionCache:
+    """
+    토큰 해시 → (만료 시각(monotonic), 세션 또는 None) LRU 캐시.
+    - 유효한 세션: AUTH_SESSION_CACHE_TTL 과 세션 expires_at 중 먼저 오는 시각까지
+    - 거부된 토큰: AUTH_NEGATIVE_CACHE_TTL 동안 None 으로 캐시
+    - 같은 토큰의 동시 조회는 하나의 Kratos 요청을 함께 기다림 (single-flight)
+    이벤트 루프 하나에서만 사용하므로 별도 잠금은 두지 않습니다.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight = {}
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def _store(self, key: str, session: Optional[dict]):
+        now = time.monotonic()
+        if session is None:
+            expires = now + self.negative_ttl
+        else:
+            expires = now + self.ttl
+            expires_at = _parse_expires_at(session.get("expires_at"))
+            if expires_at is not None:
+                expires = min(expires, now + expires_at - time.time())
+        if expires <= now:
+            return
+        self._entries[key] = (expires, session)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        self._entries.pop(self.key(token), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_fetch(self, token: str, fetch) -> Optional[dict]:
+        """
+        캐시된 세션을 반환하거나 fetch(token) 으로 조회. 예외(통신 오류)는 캐시하지 않음.
+        조회는 별도 Task 로 실행하고 모든 요청이 shield 로 기다리므로, 처음 요청한 쪽이 취소되어도
+        (클라이언트 연결 종료 등) 조회는 계속되고 함께 기다리던 요청은 결과를 받습니다.
+        """
+        key = self.key(token)
+        found, session = self._get(key)
+        if found:
+            return session
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, token, fetch))
+            # 기다리던 요청이 모두 취소된 뒤 실패해도 "exception was never retrieved" 경고가 남지 않도록 소비
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, token: str, fetch) -> Optional[dict]:
+        try:
+            session = await fetch(token)
+            self._store(key, session)
+            return session
+        finally:
+            self._inflight.pop(key, None)
+
+
+session_cache = SessionCache(
+    ttl=settings.AUTH_SESSION_CACHE_TTL,
+    negative_ttl=settings.AUTH_NEGATIVE_CACHE_TTL,
+    max_entries=settings.AUTH_SESSION_CACHE_SIZE,
+)
+
+
+async def _fetch_session(token: str) -> Optional[dict]:
+    """Kratos whoami 조회. 토큰이 거부되면 None, 통신 오류/5xx 는 예외"""
+    response = await get_kratos_client().get(
+        "/sessions/whoami", headers={"Authorization": f"Bearer {token}"}
+    )
+    if response.status_code in (401, 403, 404):
+        return None
+    response.raise_for_status()
+    session = response.json()
+    if not session.get("active", True):
+        return None
+    email = session.get("identity", {}).get("traits", {}).get("email", "")
+    # Compare emails in a case-insensitive manner
+    session["is_admin"] = email.lower() in [e.lower() for e in ADMIN_EMAILS]
+    return session
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
-    Get current user information from Kratos session
+    Get current user information from Kratos session (cached per token)
     """
     try:
-        # Validate Kratos session using public endpoint
-        response = requests.get(
-            f"{settings.KRATOS_PUBLIC_URL}/sessions/whoami",
-            headers={
-                "Accept": "application/json",
-                "Authorization": f"Bearer {credentials.credentials}",
-            },
-            timeout=10,
-        )
-        response.raise_for_status()
-        session = response.json()
-        email = session.get("identity", {}).get("traits", {}).get("email", "")
-        # Compare emails in a case-insensitive manner
-        session["is_admin"] = email.lower() in [e.lower() for e in ADMIN_EMAILS]
-        return session
-    except requests.exceptions.RequestException:
+        session = await session_cache.get_or_fetch(credentials.credentials, _fetch_session)
+    except (httpx.HTTPError, ValueError) as e:
+        logging.getLogger(__name__).warning(f"Kratos session validation failed: {e}")
+        session = None
+    if session is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # 요청 처리 중 수정되어도 캐시된 값에 영향이 없도록 복사본을 반환
+    return dict(session)
 
-def verify_token(token: str) -> bool:
+async def verify_token(token: str) -> bool:
     """
     Verify token validity
     """
     try:
-        response = requests.get(
-            f"{settings.KRATOS_ADMIN_URL}/sessions/{token}"
-        )
+        response = await get_kratos_client().get(f"{settings.KRATOS_ADMIN_URL}/sessions/{token}")
         return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False 
\ No newline at end of file
+    except httpx.HTTPError:
+        return False
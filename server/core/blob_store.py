@@ -0,0 +1,185 @@
+# server/core/blob_store.py
+import os
+import shutil
+import string
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from server.core.config import UPLOAD_DIR, settings
+from server.utils.thumbnails import THUMBNAIL_DIR, content_hash, thumbnail_extension
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 내 잠금만 사용
+    fcntl = None
+
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+_LOCK_DIR = os.path.join(BLOB_DIR, ".locks")
+_REUSED_SUFFIX = ".reused"
+_thread_locks = [threading.Lock() for _ in range(64)]
+
+
+def _shard(digest: str) -> str:
+    """해시 앞 4글자로 2단계 디렉터리 분산 (ab/cd/abcd...)"""
+    return os.path.join(digest[:2], digest[2:4])
+
+
+def blob_path(digest: str) -> str:
+    """내용이 같으면 확장자와 관계없이 같은 blob 을 가리키도록 해시만으로 경로를 정함"""
+    return os.path.join(BLOB_DIR, _shard(digest), digest)
+
+
+def _legacy_blob_path(digest: str, filename: str) -> str:
+    """확장자를 붙여 저장하던 이전 형식의 경로 (기존 blob 재사용용)"""
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(BLOB_DIR, _shard(digest), f"{digest}{ext}")
+
+
+def _blob_digest(path: str) -> Optional[str]:
+    """blob 경로면 해시를, 아니면 None"""
+    root = os.path.abspath(BLOB_DIR)
+    try:
+        if os.path.commonpath([os.path.abspath(path), root]) != root:
+            return None
+    except ValueError:
+        return None
+    digest = os.path.basename(path).split(".", 1)[0]
+    return digest if digest and all(c in string.hexdigits for c in digest) else None
+
+
+@contextmanager
+def _digest_lock(digest: str):
+    """
+    같은 해시의 재사용(store_file)과 삭제(release_image_files)를 직렬화.
+    업로드 워커가 별도 프로세스이므로 가능하면 파일 잠금도 함께 사용합니다.
+    """
+    stripe = digest[:2]
+    with _thread_locks[int(stripe, 16) % len(_thread_locks)]:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(_LOCK_DIR, exist_ok=True)
+        with open(os.path.join(_LOCK_DIR, f"{stripe}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _mark_reused(path: str):
+    """재사용 표시. 행이 아직 커밋되지 않았을 수 있으므로 유예 시간 동안 삭제하지 않음"""
+    with open(f"{path}{_REUSED_SUFFIX}", "a"):
+        pass
+    os.utime(f"{path}{_REUSED_SUFFIX}")
+
+
+def _recently_reused(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(f"{path}{_REUSED_SUFFIX}") < settings.BLOB_REUSE_GRACE_SECONDS
+    except OSError:
+        return False
+
+
+def _copy_atomic(src_path: str, path: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as dst, open(src_path, "rb") as src:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def blob_thumbnail_path(digest: str) -> str:
+    return os.path.join(THUMBNAIL_DIR, "blobs", _shard(digest), f"{digest}{thumbnail_extension()}")
+
+
+def store_file(src_path: str, filename: str, move: bool = True) -> Tuple[str, str, bool]:
+    """
+    src_path 를 내용 해시 기반 경로로 옮김. 같은 내용의 blob 이 이미 있으면 재사용합니다.
+    move=False 이면 원본을 그대로 두고 복사합니다 (서버 경로에서 가져오기).
+    (blob 경로, 해시, 중복 여부) 를 반환합니다.
+    """
+    digest = content_hash(src_path)
+    path = blob_path(digest)
+    with _digest_lock(digest):
+        for existing in (path, _legacy_blob_path(digest, filename)):
+            if os.path.exists(existing):
+                _mark_reused(existing)
+                if move:
+                    os.remove(src_path)
+                return existing, digest, True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if move:
+            try:
+                os.replace(src_path, path)
+            except OSError:
+                # 다른 파일시스템이면 복사 후 삭제
+                _copy_atomic(src_path, path)
+                os.remove(src_path)
+        else:
+            _copy_atomic(src_path, path)
+    return path, digest, False
+
+
+def _delete_blob_files(image) -> bool:
+    """참조가 없다고 확인된 이미지의 원본/썸네일 삭제. 방금 재사용된 blob 은 남김"""
+    digest = _blob_digest(image.file_location) if image.file_location else None
+    with _digest_lock(digest) if digest else nullcontext():
+        if digest and _recently_reused(image.file_location):
+            # 방금 store_file 로 재사용된 blob: 아직 커밋되지 않은 행이 가리킬 수 있음
+            print(f"Keeping recently reused blob: {image.file_location}")
+            return False
+
+        for label, path in (("file", image.file_location), ("thumbnail", image.thumbnail_location)):
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    print(f"Failed to delete {label}: {path}, Error: {e}")
+        if digest and os.path.exists(f"{image.file_location}{_REUSED_SUFFIX}"):
+            os.remove(f"{image.file_location}{_REUSED_SUFFIX}")
+    return True
+
+
+def release_images_files(db: Session, images: list) -> int:
+    """
+    이미지 행들을 삭제하기 직전에 호출. 삭제 대상이 아닌 다른 이미지가 같은 파일을 가리키지 않을 때만
+    원본과 썸네일을 삭제하고, 삭제한 이미지 수를 반환합니다.
+    공유 여부는 file_location 목록에 대한 한 번의 조회(IN 절 청크 단위)로 판단하며,
+    같은 세션에서 먼저 삭제 표시된 행이 제외되도록 조회 전에 flush 합니다. (SessionLocal 은 autoflush=False)
+    """
+    from server.db.models import Image
+    from server.db.queries import id_filters
+
+    deleting_ids = {image.id for image in images}
+    locations = list({image.file_location for image in images if image.file_location})
+    shared = set()
+    if locations:
+        db.flush()
+        for condition in id_filters(Image.file_location, locations):
+            shared.update(
+                location for location, image_id in db.query(Image.file_location, Image.id).filter(condition)
+                if image_id not in deleting_ids
+            )
+
+    released = 0
+    for image in images:
+        if image.file_location in shared:
+            continue
+        if _delete_blob_files(image):
+            released += 1
+    return released
+
+
+def release_image_files(db: Session, image) -> bool:
+    """이미지 한 장용 release_images_files"""
+    return release_images_files(db, [image]) == 1
@@ -11,14 +11,96 @@ class Settings(BaseSettings):
     # Kratos settings
     KRATOS_PUBLIC_URL: str = os.getenv("KRATOS_PUBLIC_URL", "http://localhost:4433")
     KRATOS_ADMIN_URL: str = os.getenv("KRATOS_ADMIN_URL", "http://localhost:4434")
+    # Kratos HTTP 클라이언트 풀 (앱 수명 동안 하나를 공유)
+    KRATOS_HTTP_MAX_CONNECTIONS: int = int(os.getenv("KRATOS_HTTP_MAX_CONNECTIONS", "100"))
+    KRATOS_HTTP_MAX_KEEPALIVE: int = int(os.getenv("KRATOS_HTTP_MAX_KEEPALIVE", "20"))
+    KRATOS_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("KRATOS_HTTP_KEEPALIVE_EXPIRY", "30"))
+    KRATOS_HTTP_TIMEOUT: float = float(os.getenv("KRATOS_HTTP_TIMEOUT", "10"))
+    KRATOS_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("KRATOS_HTTP_CONNECT_TIMEOUT", "5"))
+    KRATOS_HTTP2: bool = os.getenv("KRATOS_HTTP2", "false").lower() == "true"
+    KRATOS_VERIFY_TLS: bool = os.getenv("KRATOS_VERIFY_TLS", "true").lower() == "true"
     
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///static/ingradient.db")
+    # 목록 조회용 읽기 전용 풀 (비워 두면 DATABASE_URL 사용, 읽기 복제본 지정 가능)
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+    SQLITE_CACHE_SIZE_MB: int = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
     
     # Security settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Kratos 세션 검증 캐시 (초). 유효 세션은 expires_at 을 넘겨 캐시하지 않음
+    AUTH_SESSION_CACHE_TTL: int = int(os.getenv("AUTH_SESSION_CACHE_TTL", "60"))
+    AUTH_NEGATIVE_CACHE_TTL: int = int(os.getenv("AUTH_NEGATIVE_CACHE_TTL", "10"))
+    AUTH_SESSION_CACHE_SIZE: int = int(os.getenv("AUTH_SESSION_CACHE_SIZE", "10000"))
+
+    # Inference settings (0 = onnxruntime 기본값)
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    ONNX_INTER_OP_THREADS: int = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+    ONNX_SESSION_CACHE_MB: int = int(os.getenv("ONNX_SESSION_CACHE_MB", "1024"))
+    ONNX_WARMUP_ON_STARTUP: bool = os.getenv("ONNX_WARMUP_ON_STARTUP", "true").lower() == "true"
+    FEATURE_BATCH_SIZE: int = int(os.getenv("FEATURE_BATCH_SIZE", "32"))
+    VECTOR_WAL_FSYNC: bool = os.getenv("VECTOR_WAL_FSYNC", "true").lower() == "true"
+    VECTOR_WAL_CHECKPOINT_MB: int = int(os.getenv("VECTOR_WAL_CHECKPOINT_MB", "256"))
+    # 인덱스 종류 전환(학습/마이그레이션)이 실패하면 이 시간 동안 add 에서 다시 시도하지 않음 (configure 로 즉시 재시도)
+    VECTOR_MIGRATION_RETRY_SECONDS: int = int(os.getenv("VECTOR_MIGRATION_RETRY_SECONDS", "3600"))
+    # HNSW 는 삭제를 지원하지 않아 삭제된 벡터가 그래프에 남음. 그 비율이 이 값을 넘으면 백그라운드로 재구축
+    VECTOR_TOMBSTONE_REBUILD_RATIO: float = float(os.getenv("VECTOR_TOMBSTONE_REBUILD_RATIO", "0.2"))
+    # GET /api/images/ 에서 limit 을 생략했을 때의 페이지 크기 (최대 1000)
+    IMAGE_PAGE_SIZE: int = int(os.getenv("IMAGE_PAGE_SIZE", "500"))
+    SIMILAR_BRUTE_FORCE_LIMIT: int = int(os.getenv("SIMILAR_BRUTE_FORCE_LIMIT", "20000"))
+    PROJECTION_REFIT_RATIO: float = float(os.getenv("PROJECTION_REFIT_RATIO", "0.5"))
+    # 투영 캐시(pickle) 저장 위치. /static 으로 공개되는 UPLOAD_DIR 밖이어야 함
+    PROJECTION_CACHE_DIR: str = os.getenv("PROJECTION_CACHE_DIR", "./.cache/projections")
+    THUMBNAIL_FORMAT: str = os.getenv("THUMBNAIL_FORMAT", "WEBP")
+    THUMBNAIL_QUALITY: int = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+    # store_file 로 재사용된 blob 은 이 시간 동안 삭제하지 않음 (이미지 행이 아직 저장되기 전일 수 있음)
+    BLOB_REUSE_GRACE_SECONDS: int = int(os.getenv("BLOB_REUSE_GRACE_SECONDS", "3600"))
+    UPLOAD_COMMIT_WORKERS: int = int(os.getenv("UPLOAD_COMMIT_WORKERS", str(os.cpu_count() or 4)))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    # 실행 중인 작업의 heartbeat 기록 간격, 이 시간보다 오래 갱신되지 않은 running 작업만 재시작 시 이어서 실행
+    JOB_HEARTBEAT_SECONDS: int = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", "300"))
+    # check_cancelled 를 이 횟수만큼 호출할 때마다 DB 의 cancel_requested 확인 (다른 워커 프로세스의 취소 요청)
+    JOB_CANCEL_POLL_EVERY: int = int(os.getenv("JOB_CANCEL_POLL_EVERY", "1"))
+    FEATURE_DECODE_WORKERS: int = int(os.getenv("FEATURE_DECODE_WORKERS", str(os.cpu_count() or 4)))
+    # 요청당 SQL 수가 이 값을 넘으면 경고 로그 (0 = 측정 안 함)
+    QUERY_COUNT_WARN: int = int(os.getenv("QUERY_COUNT_WARN", "0"))
+    # /metrics (Prometheus 텍스트 형식) 노출 및 SQL 실행 시간 측정
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # 로그: json | text. LOG_DEBUG_PAYLOADS=false 이면 요청 내용 디버그 덤프를 생략 (운영 기본값)
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_DEBUG_PAYLOADS: bool = os.getenv("LOG_DEBUG_PAYLOADS", "false").lower() == "true"
+    # 접근 로그 표본 비율. 5xx 와 LOG_SLOW_REQUEST_MS 이상 걸린 요청은 항상 기록
+    LOG_REQUEST_SAMPLE_RATE: float = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "1.0"))
+    LOG_HOT_ROUTES: str = os.getenv(
+        "LOG_HOT_ROUTES",
+        "GET /api/images/,GET /api/images/{image_id}/thumbnail,GET /api/labels/,GET /static",
+    )
+    LOG_HOT_SAMPLE_RATE: float = float(os.getenv("LOG_HOT_SAMPLE_RATE", "0.01"))
+    LOG_SLOW_REQUEST_MS: int = int(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+    # 요청 프로파일러 (기본 꺼짐). 헤더 트리거는 X-Profile 값이 PROFILE_HEADER_TOKEN 과 같을 때만 동작
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_HEADER_TOKEN: str = os.getenv("PROFILE_HEADER_TOKEN", "")
+    # "METHOD /path" 목록 (정확히 일치하는 경로만)
+    PROFILE_ROUTES: str = os.getenv("PROFILE_ROUTES", "")
+    PROFILE_ROUTE_SAMPLE_RATE: float = float(os.getenv("PROFILE_ROUTE_SAMPLE_RATE", "1.0"))
+    # 0 = 지연 시간 트리거 끔. 켜면 PROFILE_SLOW_SAMPLE_RATE 비율의 요청을 측정해 느린 것만 저장
+    PROFILE_SLOW_MS: int = int(os.getenv("PROFILE_SLOW_MS", "0"))
+    PROFILE_SLOW_SAMPLE_RATE: float = float(os.getenv("PROFILE_SLOW_SAMPLE_RATE", "0.1"))
+    PROFILE_INTERVAL_MS: int = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_MAX_STATEMENTS: int = int(os.getenv("PROFILE_MAX_STATEMENTS", "500"))
+    PROFILE_MAX_CAPTURES: int = int(os.getenv("PROFILE_MAX_CAPTURES", "50"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "./.profiles")
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,390 @@
+# server/core/exporters.py
+"""
+데이터셋을 COCO JSON / YOLO txt / Pascal VOC XML 로 내보내는 스트리밍 exporter.
+이미지와 라벨을 id 순서의 커서로 한 번씩 읽으며 바로 출력하므로
+메모리 사용량은 데이터셋 크기와 관계없이 이미지 한 장 분량으로 유지됩니다.
+"""
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from server.db.database import ReadSessionLocal
+from server.db.models import Class
+from server.db.association_tables import dataset_classes
+from server.db.queries import dataset_image_ids, iter_dataset_images, iter_images_with_labels, label_models
+from server.utils.thumbnails import read_image_size
+from server.utils.masks import mask_json, mask_stats, segmentation_mask
+
+EXPORT_FORMATS = ("coco", "yolo", "voc")
+ARCHIVE_TYPES = ("zip", "tar")
+ARCHIVE_MEDIA_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+
+# 응답으로 내보내는 청크 크기
+_CHUNK_BYTES = 1 << 16
+# 아카이브 항목 하나를 메모리에 쌓아 둘 최대 크기 (넘으면 임시 파일로 넘김)
+_SPOOL_BYTES = 8 << 20
+
+
+# ── 아카이브 스트림 ────────────────────────────────────────────────────────────
+class _Sink(io.RawIOBase):
+    """
+    zipfile/tarfile 이 쓰는 바이트를 받아 두었다가 drain() 으로 꺼내는 비탐색(non-seekable) 스트림.
+    항목 하나가 _SPOOL_BYTES 보다 크면 디스크 임시 파일에 보관됩니다.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._spool.write(data)
+        return len(data)
+
+    def pending(self) -> int:
+        return self._spool.tell()
+
+    def drain(self) -> Iterator[bytes]:
+        self._spool.seek(0)
+        for chunk in iter(lambda: self._spool.read(_CHUNK_BYTES), b""):
+            yield chunk
+        self._spool.seek(0)
+        self._spool.truncate()
+
+    def close(self):
+        self._spool.close()
+        super().close()
+
+
+class _ArchiveStream:
+    """zip/tar 항목을 하나씩 추가하며 만들어진 바이트를 바로 내보내는 writer"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.sink = _Sink()
+        if kind == "zip":
+            self.archive = zipfile.ZipFile(self.sink, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = tarfile.open(fileobj=self.sink, mode="w|")
+
+    def _flush(self) -> Iterator[bytes]:
+        """작은 항목은 모아서 _CHUNK_BYTES 이상일 때만 내보냄"""
+        if self.sink.pending() >= _CHUNK_BYTES:
+            yield from self.sink.drain()
+
+    def add_bytes(self, name: str, data: bytes) -> Iterator[bytes]:
+        if self.kind == "zip":
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+        yield from self._flush()
+
+    def add_file(self, name: str, path: str) -> Iterator[bytes]:
+        if self.kind == "zip":
+            # 이미지는 이미 압축되어 있으므로 다시 압축하지 않음
+            self.archive.write(path, name, compress_type=zipfile.ZIP_STORED)
+        else:
+            self.archive.add(path, arcname=name)
+        yield from self._flush()
+
+    def add_stream(self, name: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """크기를 미리 알 수 없는 항목(예: COCO annotations.json)을 스트리밍으로 추가"""
+        if self.kind == "zip":
+            with self.archive.open(name, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield from self._flush()
+        else:
+            # tar 헤더에는 크기가 필요하므로 임시 파일에 먼저 기록
+            with tempfile.TemporaryFile() as spool:
+                for chunk in chunks:
+                    spool.write(chunk)
+                info = tarfile.TarInfo(name)
+                info.size = spool.tell()
+                info.mtime = int(time.time())
+                spool.seek(0)
+                self.archive.addfile(info, spool)
+        yield from self.sink.drain()
+
+    def close(self) -> Iterator[bytes]:
+        self.archive.close()
+        yield from self.sink.drain()
+        self.sink.close()
+
+
+def _encode_chunks(parts: Iterable[str]) -> Iterator[bytes]:
+    """작은 문자열 조각을 _CHUNK_BYTES 단위 바이트로 묶음"""
+    buffer, size = [], 0
+    for part in parts:
+        data = part.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= _CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+# ── 공통 헬퍼 ─────────────────────────────────────────────────────────────────
+def _dataset_categories(db: Session, dataset_id: str) -> list:
+    """데이터셋 클래스와 라벨이 참조하는 클래스를 합쳐 (id, name) 목록으로 반환"""
+    image_ids = dataset_image_ids(dataset_id)
+    conditions = [Class.id.in_(select(dataset_classes.c.class_id).where(dataset_classes.c.dataset_id == dataset_id))]
+    for model in label_models().values():
+        conditions.append(Class.id.in_(select(model.class_id).where(model.image_id.in_(image_ids))))
+    return db.execute(select(Class.id, Class.name).where(or_(*conditions)).order_by(Class.name, Class.id)).all()
+
+
+def _image_size(image) -> Tuple[Optional[int], Optional[int]]:
+    """DB 에 기록된 크기를 사용하고, 없으면 헤더만 읽어 구함"""
+    if image.width and image.height:
+        return image.width, image.height
+    try:
+        return read_image_size(image.file_location)
+    except Exception as e:
+        print(f"Failed to read image size for {image.id}: {e}")
+        return None, None
+
+
+def _archive_name(image) -> str:
+    """아카이브 안에서 겹치지 않도록 이미지 id 에 원본 확장자를 붙인 이름"""
+    ext = os.path.splitext(image.filename or image.file_location or "")[1].lower()
+    return f"{image.id}{ext}"
+
+
+def _has_file(image) -> bool:
+    return bool(image.file_location) and os.path.exists(image.file_location)
+
+
+def _polygon_area(flat: List[float]) -> float:
+    xs, ys = flat[0::2], flat[1::2]
+    return abs(sum(xs[i] * ys[i - 1] - xs[i - 1] * ys[i] for i in range(len(xs)))) / 2.0
+
+
+# ── COCO ─────────────────────────────────────────────────────────────────────
+def _coco_annotations(labels: dict, width: float, height: float, category_ids: Dict[str, int]) -> Iterator[dict]:
+    for box in labels["bounding_boxes"]:
+        x, y = box["x_min"] * width, box["y_min"] * height
+        w, h = (box["x_max"] - box["x_min"]) * width, (box["y_max"] - box["y_min"]) * height
+        ann = {"category_id": category_ids[box["class_id"]], "bbox": [x, y, w, h], "area": w * h, "iscrowd": 0}
+        if box["confidence"] is not None:
+            ann["score"] = box["confidence"]
+        yield ann
+
+    for point in labels["key_points"]:
+        x, y = point["x"] * width, point["y"] * height
+        yield {
+            "category_id": category_ids[point["class_id"]],
+            "keypoints": [x, y, 2],
+            "num_keypoints": 1,
+            "bbox": [x, y, 0, 0],
+            "area": 0,
+            "iscrowd": 0,
+        }
+
+    for seg in labels["segmentations"]:
+        kind, data = segmentation_mask(seg)
+        if kind == "polygon":
+            polygons = [[v * (width if i % 2 == 0 else height) for i, v in enumerate(p)] for p in data]
+            xs = [v for p in polygons for v in p[0::2]]
+            ys = [v for p in polygons for v in p[1::2]]
+            if not xs:
+                continue
+            yield {
+                "category_id": category_ids[seg["class_id"]],
+                "segmentation": polygons,
+                "bbox": [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)],
+                "area": sum(_polygon_area(p) for p in polygons),
+                "iscrowd": 0,
+            }
+        elif kind == "rle":
+            # RLE 는 자체 픽셀 격자(size)를 가지므로 면적/박스는 0~1 비율에서 그 크기로 환산
+            rle_height, rle_width = data["size"]
+            area, (x_min, y_min, x_max, y_max) = (
+                (seg["area"], (seg["x_min"], seg["y_min"], seg["x_max"], seg["y_max"]))
+                if seg.get("area") is not None else mask_stats(kind, data)
+            )
+            yield {
+                "category_id": category_ids[seg["class_id"]],
+                "segmentation": mask_json(kind, data),
+                "bbox": [
+                    x_min * rle_width, y_min * rle_height,
+                    (x_max - x_min) * rle_width, (y_max - y_min) * rle_height,
+                ],
+                "area": area * rle_width * rle_height,
+                "iscrowd": 1,
+            }
+
+
+def _coco_parts(db: Session, dataset_id: str, image_prefix: str) -> Iterator[str]:
+    categories = _dataset_categories(db, dataset_id)
+    category_ids = {row.id: index for index, row in enumerate(categories, start=1)}
+    info = {"description": f"Dataset {dataset_id}", "date_created": datetime.utcnow().isoformat()}
+
+    yield '{"info": ' + json.dumps(info) + ', "licenses": [], "categories": '
+    yield json.dumps([{"id": category_ids[row.id], "name": row.name, "supercategory": ""} for row in categories])
+
+    # 1차: 이미지 목록 (COCO image id 는 id 순서의 일련번호)
+    yield ', "images": ['
+    for ordinal, image in enumerate(iter_dataset_images(db, dataset_id), start=1):
+        width, height = _image_size(image)
+        entry = {
+            "id": ordinal,
+            "file_name": image_prefix + _archive_name(image),
+            "width": width,
+            "height": height,
+            "original_id": image.id,
+            "original_file_name": image.filename,
+        }
+        yield ("," if ordinal > 1 else "") + json.dumps(entry)
+
+    # 2차: 같은 순서로 라벨과 병합하며 annotation 출력
+    yield '], "annotations": ['
+    annotation_id = 0
+    for ordinal, (image, labels) in enumerate(iter_images_with_labels(db, dataset_id), start=1):
+        if not any(labels.values()):
+            continue
+        width, height = _image_size(image)
+        for ann in _coco_annotations(labels, width or 1, height or 1, category_ids):
+            annotation_id += 1
+            yield ("," if annotation_id > 1 else "") + json.dumps({"id": annotation_id, "image_id": ordinal, **ann})
+    yield "]}"
+
+
+def _export_coco(db: Session, dataset_id: str, include_images: bool, archive: str) -> Iterator[bytes]:
+    if not include_images:
+        yield from _encode_chunks(_coco_parts(db, dataset_id, ""))
+        return
+
+    stream = _ArchiveStream(archive)
+    yield from stream.add_stream("annotations.json", _encode_chunks(_coco_parts(db, dataset_id, "images/")))
+    for image in iter_dataset_images(db, dataset_id):
+        if _has_file(image):
+            yield from stream.add_file(f"images/{_archive_name(image)}", image.file_location)
+    yield from stream.close()
+
+
+# ── YOLO ─────────────────────────────────────────────────────────────────────
+def _export_yolo(db: Session, dataset_id: str, include_images: bool, archive: str) -> Iterator[bytes]:
+    """
+    labels/{id}.txt: "class cx cy w h" (바운딩박스)
+    labels-seg/{id}.txt: "class x1 y1 x2 y2 ..." (폴리곤 세그멘테이션)
+    YOLO 형식에 대응하는 표현이 없는 단일 키포인트와 RLE 마스크는 제외됩니다.
+    """
+    categories = _dataset_categories(db, dataset_id)
+    class_index = {row.id: index for index, row in enumerate(categories)}
+    names = [row.name for row in categories]
+
+    stream = _ArchiveStream(archive)
+    yield from stream.add_bytes("classes.txt", ("\n".join(names) + "\n").encode("utf-8"))
+    data_yaml = f"path: .\ntrain: images\nval: images\nnc: {len(names)}\nnames: {json.dumps(names, ensure_ascii=False)}\n"
+    yield from stream.add_bytes("data.yaml", data_yaml.encode("utf-8"))
+
+    for image, labels in iter_images_with_labels(db, dataset_id):
+        lines = []
+        for box in labels["bounding_boxes"]:
+            cx, cy = (box["x_min"] + box["x_max"]) / 2, (box["y_min"] + box["y_max"]) / 2
+            w, h = box["x_max"] - box["x_min"], box["y_max"] - box["y_min"]
+            lines.append(f"{class_index[box['class_id']]} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}")
+        yield from stream.add_bytes(f"labels/{image.id}.txt", "".join(f"{line}\n" for line in lines).encode("ascii"))
+
+        seg_lines = []
+        for seg in labels["segmentations"]:
+            kind, polygons = segmentation_mask(seg)
+            if kind == "polygon":
+                for polygon in polygons:
+                    seg_lines.append(f"{class_index[seg['class_id']]} " + " ".join(f"{v:.6f}" for v in polygon))
+        if seg_lines:
+            yield from stream.add_bytes(
+                f"labels-seg/{image.id}.txt", "".join(f"{line}\n" for line in seg_lines).encode("ascii")
+            )
+
+        if include_images and _has_file(image):
+            yield from stream.add_file(f"images/{_archive_name(image)}", image.file_location)
+    yield from stream.close()
+
+
+# ── Pascal VOC ───────────────────────────────────────────────────────────────
+def _voc_xml(image, labels: dict, class_names: Dict[str, str], width: int, height: int) -> str:
+    objects = []
+    for box in labels["bounding_boxes"]:
+        objects.append(
+            "  <object>\n"
+            f"    <name>{escape(class_names[box['class_id']])}</name>\n"
+            "    <pose>Unspecified</pose>\n"
+            "    <truncated>0</truncated>\n"
+            "    <difficult>0</difficult>\n"
+            "    <bndbox>\n"
+            f"      <xmin>{round(box['x_min'] * width)}</xmin>\n"
+            f"      <ymin>{round(box['y_min'] * height)}</ymin>\n"
+            f"      <xmax>{round(box['x_max'] * width)}</xmax>\n"
+            f"      <ymax>{round(box['y_max'] * height)}</ymax>\n"
+            "    </bndbox>\n"
+            "  </object>\n"
+        )
+    return (
+        "<annotation>\n"
+        "  <folder>JPEGImages</folder>\n"
+        f"  <filename>{escape(_archive_name(image))}</filename>\n"
+        f"  <size>\n    <width>{width}</width>\n    <height>{height}</height>\n    <depth>3</depth>\n  </size>\n"
+        "  <segmented>0</segmented>\n"
+        + "".join(objects)
+        + "</annotation>\n"
+    )
+
+
+def _export_voc(db: Session, dataset_id: str, include_images: bool, archive: str) -> Iterator[bytes]:
+    """Annotations/{id}.xml 과 ImageSets/Main/default.txt (바운딩박스만 포함)"""
+    categories = _dataset_categories(db, dataset_id)
+    class_names = {row.id: row.name for row in categories}
+
+    stream = _ArchiveStream(archive)
+    yield from stream.add_bytes("labelmap.txt", "".join(f"{row.name}\n" for row in categories).encode("utf-8"))
+
+    for image, labels in iter_images_with_labels(db, dataset_id):
+        width, height = _image_size(image)
+        xml = _voc_xml(image, labels, class_names, width or 0, height or 0)
+        yield from stream.add_bytes(f"Annotations/{image.id}.xml", xml.encode("utf-8"))
+        if include_images and _has_file(image):
+            yield from stream.add_file(f"JPEGImages/{_archive_name(image)}", image.file_location)
+
+    image_set = _encode_chunks(f"{image.id}\n" for image in iter_dataset_images(db, dataset_id))
+    yield from stream.add_stream("ImageSets/Main/default.txt", image_set)
+    yield from stream.close()
+
+
+_EXPORTERS = {"coco": _export_coco, "yolo": _export_yolo, "voc": _export_voc}
+
+
+def export_dataset(dataset_id: str, fmt: str, include_images: bool = False, archive: str = "zip") -> Tuple[Iterator[bytes], str, str]:
+    """
+    (바이트 청크 생성기, media type, 파일 이름) 을 반환.
+    이미지를 포함하지 않는 COCO 는 JSON 한 파일, 나머지는 zip/tar 아카이브입니다.
+    생성기는 자체 DB 세션을 열고 스트리밍이 끝나면 닫습니다.
+    """
+    def generate():
+        db = ReadSessionLocal()
+        try:
+            yield from _EXPORTERS[fmt](db, dataset_id, include_images, archive)
+        finally:
+            db.close()
+
+    if fmt == "coco" and not include_images:
+        return generate(), "application/json", f"{dataset_id}_coco.json"
+    return generate(), ARCHIVE_MEDIA_TYPES[archive], f"{dataset_id}_{fmt}.{archive}"
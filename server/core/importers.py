@@ -0,0 +1,361 @@
+# server/core/importers.py
+"""
+COCO JSON / YOLO 디렉터리 가져오기 작업.
+이미지 파일은 프로세스 풀에서 blob 저장 + 썸네일 생성을 병렬로 수행하고,
+Image/연결 테이블/라벨 행은 배치 단위 executemany 로 한 트랜잭션에 저장합니다.
+"""
+import json
+import os
+import shutil
+import tarfile
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from server.core.blob_store import blob_thumbnail_path, store_file
+from server.core.config import TMP_FOLDER, settings
+from server.core.jobs import JobContext
+from server.db.association_tables import class_images, dataset_images
+from server.db.models import BoundingBox, Class, Dataset, Image, KeyPoint, Segmentation
+from server.utils.masks import encode_mask
+from server.utils.thumbnails import ingest_image, observe_render
+
+IMPORT_FORMATS = ("coco", "yolo")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+# 한 트랜잭션(진행률 보고 단위)에 넣는 이미지 수
+_BATCH_IMAGES = 500
+# executemany 한 번에 보낼 행 수
+_INSERT_CHUNK = 5000
+
+
+# ── 아카이브/경로 ─────────────────────────────────────────────────────────────
+def _is_within(root: str, name: str) -> bool:
+    target = os.path.realpath(os.path.join(root, name))
+    return target == os.path.realpath(root) or target.startswith(os.path.realpath(root) + os.sep)
+
+
+def extract_archive(archive_path: str, dest: str):
+    """zip/tar 를 dest 에 풀기. 상위 경로나 링크를 가리키는 항목은 건너뜁니다."""
+    os.makedirs(dest, exist_ok=True)
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if _is_within(dest, member.filename):
+                    archive.extract(member, dest)
+    elif tarfile.is_tarfile(archive_path):
+        with tarfile.open(archive_path) as archive:
+            for member in archive:
+                if (member.isfile() or member.isdir()) and _is_within(dest, member.name):
+                    archive.extract(member, dest)
+    else:
+        raise ValueError("Unsupported archive format (expected zip or tar)")
+
+
+def _index_images(root: str) -> Dict[str, str]:
+    """root 아래 이미지 파일을 한 번 훑어 { 상대 경로: 절대 경로 } (파일 이름으로도 조회 가능) 를 생성"""
+    index = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.join(dirpath, filename)
+                index[os.path.relpath(path, root).replace(os.sep, "/")] = path
+                index.setdefault(filename, path)
+    return index
+
+
+def _find_file(root: str, names: Tuple[str, ...]) -> Optional[str]:
+    """root 에서 가장 얕은 위치의 names 중 하나를 찾음"""
+    for dirpath, _, filenames in os.walk(root):
+        for name in names:
+            if name in filenames:
+                return os.path.join(dirpath, name)
+    return None
+
+
+# ── 파싱 ─────────────────────────────────────────────────────────────────────
+# sample: { path, filename, width, height, pixel, labels: [(kind, class_index, values, confidence), ...] }
+#   kind: "box" (x_min, y_min, x_max, y_max) / "point" (x, y) / "polygon" [[x1, y1, ...], ...] / "rle" {...}
+#   pixel=True 이면 좌표가 픽셀 단위이며 저장 시 이미지 크기로 정규화합니다.
+
+def parse_coco(annotations_path: str, images_root: str) -> Tuple[List[str], List[dict], List[str]]:
+    """(클래스 이름, sample 목록, 찾지 못한 파일 이름) 을 반환"""
+    with open(annotations_path, "r", encoding="utf-8") as f:
+        coco = json.load(f)
+
+    class_names, category_index = [], {}
+    for category in coco.get("categories", []):
+        name = str(category.get("name", category["id"]))
+        if name not in class_names:
+            class_names.append(name)
+        category_index[category["id"]] = class_names.index(name)
+
+    labels_by_image: Dict[object, list] = {}
+    for ann in coco.get("annotations", []):
+        class_index = category_index.get(ann.get("category_id"))
+        if class_index is None:
+            continue
+        labels = labels_by_image.setdefault(ann.get("image_id"), [])
+        score = ann.get("score")
+        keypoints = ann.get("keypoints")
+        segmentation = ann.get("segmentation")
+        # 한 annotation 에 keypoints / segmentation / bbox 가 함께 있으면 각각 라벨로 가져옴
+        if keypoints and ann.get("num_keypoints", 1):
+            for i in range(0, len(keypoints) - 2, 3):
+                if keypoints[i + 2] > 0:
+                    labels.append(("point", class_index, (keypoints[i], keypoints[i + 1]), score))
+        if isinstance(segmentation, list) and segmentation:
+            polygons = segmentation if isinstance(segmentation[0], list) else [segmentation]
+            labels.append(("polygon", class_index, [p for p in polygons if len(p) >= 6], score))
+        elif isinstance(segmentation, dict):
+            labels.append(("rle", class_index, segmentation, score))
+        if ann.get("bbox"):
+            x, y, w, h = ann["bbox"]
+            # 키포인트 annotation 의 [x, y, 0, 0] 처럼 넓이가 없는 bbox 는 박스로 만들지 않음
+            if w > 0 and h > 0:
+                labels.append(("box", class_index, (x, y, x + w, y + h), score))
+
+    index = _index_images(images_root)
+    samples, missing = [], []
+    for entry in coco.get("images", []):
+        file_name = entry.get("file_name", "")
+        path = index.get(file_name.replace("\\", "/")) or index.get(os.path.basename(file_name))
+        if path is None:
+            missing.append(file_name)
+            continue
+        samples.append({
+            "path": path,
+            "filename": os.path.basename(file_name),
+            "width": entry.get("width") or None,
+            "height": entry.get("height") or None,
+            "pixel": True,
+            "labels": labels_by_image.get(entry.get("id"), []),
+        })
+    return class_names, samples, missing
+
+
+def _read_yolo_names(root: str) -> List[str]:
+    yaml_path = _find_file(root, ("data.yaml", "dataset.yaml"))
+    if yaml_path:
+        with open(yaml_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        try:
+            import yaml
+
+            names = (yaml.safe_load(text) or {}).get("names")
+        except ImportError:
+            # pyyaml 미설치 (pip install 'ingradient[yaml]'): 한 줄 리스트 형식만 읽음
+            names = None
+            for line in text.splitlines():
+                if line.startswith("names:") and line[6:].strip().startswith("["):
+                    names = json.loads(line[6:].strip())
+        if isinstance(names, dict):
+            names = [names[key] for key in sorted(names, key=int)]
+        if names:
+            return [str(name) for name in names]
+
+    names_path = _find_file(root, ("classes.txt", "obj.names"))
+    if names_path:
+        with open(names_path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return []
+
+
+def _yolo_label_paths(image_path: str) -> List[str]:
+    """Ultralytics 규칙(images → labels) 과 같은 폴더의 txt, exporter 의 labels-seg 를 순서대로 시도"""
+    stem = os.path.splitext(image_path)[0]
+    parts = stem.split(os.sep)
+    candidates = []
+    if "images" in parts:
+        i = len(parts) - 1 - parts[::-1].index("images")
+        for folder in ("labels", "labels-seg"):
+            candidates.append(os.sep.join(parts[:i] + [folder] + parts[i + 1:]) + ".txt")
+    candidates.append(stem + ".txt")
+    return [path for path in dict.fromkeys(candidates) if os.path.exists(path)]
+
+
+def parse_yolo(root: str) -> Tuple[List[str], List[dict], List[str]]:
+    class_names = _read_yolo_names(root)
+    samples = []
+    max_class = len(class_names) - 1
+    for path in sorted(set(_index_images(root).values())):
+        labels = []
+        for label_path in _yolo_label_paths(path):
+            with open(label_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 5:
+                        continue
+                    class_index, values = int(float(parts[0])), [float(v) for v in parts[1:]]
+                    max_class = max(max_class, class_index)
+                    if len(values) in (4, 5):
+                        cx, cy, w, h = values[:4]
+                        confidence = values[4] if len(values) == 5 else None
+                        labels.append(("box", class_index, (cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), confidence))
+                    elif len(values) >= 6 and len(values) % 2 == 0:
+                        labels.append(("polygon", class_index, [values], None))
+        samples.append({
+            "path": path,
+            "filename": os.path.basename(path),
+            "width": None,
+            "height": None,
+            "pixel": False,
+            "labels": labels,
+        })
+    # 이름 목록이 없거나 부족하면 인덱스를 이름으로 사용
+    class_names += [str(i) for i in range(len(class_names), max_class + 1)]
+    return class_names, samples, []
+
+
+# ── 저장 ─────────────────────────────────────────────────────────────────────
+def _ingest_file(src_path: str, filename: str) -> Optional[dict]:
+    """(워커 프로세스) blob 저장 + 썸네일/메타데이터(render_seconds 포함). 실패하면 None"""
+    try:
+        file_location, digest, _ = store_file(src_path, filename, move=False)
+        info = ingest_image(file_location, blob_thumbnail_path(digest), digest=digest)
+        info["file_location"] = file_location
+        return info
+    except Exception as e:
+        print(f"Import failed for {src_path}: {e}")
+        return None
+
+
+def _ensure_classes(db: Session, dataset: Dataset, class_names: List[str]) -> List[str]:
+    """데이터셋에 같은 이름의 클래스가 있으면 재사용하고 없으면 생성. 이름 순서대로 class id 반환"""
+    existing = {cls.name: cls for cls in dataset.classes}
+    class_ids = []
+    for name in class_names:
+        cls = existing.get(name)
+        if cls is None:
+            cls = Class(id=str(uuid.uuid4()), name=name)
+            db.add(cls)
+            dataset.classes.append(cls)
+            existing[name] = cls
+        class_ids.append(cls.id)
+    db.commit()
+    return class_ids
+
+
+def _insert(db: Session, table, rows: List[dict]):
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        db.execute(table.insert(), rows[start:start + _INSERT_CHUNK])
+
+
+def _scale(values, width: float, height: float) -> list:
+    return [v / (width if i % 2 == 0 else height) for i, v in enumerate(values)]
+
+
+def _label_rows(sample: dict, image_id: str, width, height, class_ids: List[str], rows: Dict[str, list]) -> set:
+    """sample 의 라벨을 테이블별 행으로 rows 에 추가하고, 사용된 class id 집합을 반환"""
+    if sample["pixel"]:
+        width, height = sample["width"] or width, sample["height"] or height
+        if not width or not height:
+            return set()
+    else:
+        width = height = 1.0
+
+    used = set()
+    for kind, class_index, values, confidence in sample["labels"]:
+        base = {"id": str(uuid.uuid4()), "image_id": image_id, "class_id": class_ids[class_index], "confidence": confidence}
+        if kind == "box":
+            x_min, y_min, x_max, y_max = _scale(values, width, height)
+            rows["bounding_boxes"].append({**base, "x_min": x_min, "y_min": y_min, "x_max": x_max, "y_max": y_max})
+        elif kind == "point":
+            x, y = _scale(values, width, height)
+            rows["key_points"].append({**base, "x": x, "y": y})
+        else:
+            # RLE 는 자체 픽셀 격자(size)를 가지므로 좌표 변환 없이 인코딩
+            mask = [_scale(polygon, width, height) for polygon in values] if kind == "polygon" else values
+            encoded = encode_mask(mask)
+            if encoded is None:
+                continue
+            rows["segmentations"].append({**base, "mask": None, **encoded})
+        used.add(base["class_id"])
+    return used
+
+
+def run_import_job(ctx: JobContext) -> dict:
+    """
+    데이터셋 가져오기 작업.
+    params: dataset_id, format(coco|yolo), annotations_path, images_root 또는 archive_path, work_dir
+    _BATCH_IMAGES 장마다 한 트랜잭션으로 저장하고 params.cursor 에 위치를 기록하므로
+    재시작 후 이어서 실행됩니다.
+    """
+    db = ctx.db
+    params = ctx.params
+    dataset = db.query(Dataset).filter(Dataset.id == params["dataset_id"]).first()
+    if dataset is None:
+        raise RuntimeError("Dataset not found")
+
+    work_dir = params.get("work_dir")
+    images_root = params.get("images_root")
+    if images_root is None:
+        images_root = os.path.join(work_dir, "images")
+        if not os.path.isdir(images_root):
+            extract_archive(params["archive_path"], images_root)
+
+    if params["format"] == "coco":
+        class_names, samples, missing = parse_coco(params["annotations_path"], images_root)
+    else:
+        class_names, samples, missing = parse_yolo(images_root)
+    class_ids = _ensure_classes(db, dataset, class_names)
+
+    total = len(samples) + len(missing)
+    cursor = params.get("cursor", 0)
+    failed = list(ctx.job.failed_image_ids or []) if cursor else list(missing)
+    imported = params.get("imported", 0)
+    annotations = params.get("annotations", 0)
+    ctx.progress(cursor + len(missing), total, failed)
+
+    with ProcessPoolExecutor(max_workers=settings.UPLOAD_COMMIT_WORKERS) as pool:
+        for start in range(cursor, len(samples), _BATCH_IMAGES):
+            ctx.check_cancelled()
+            batch = samples[start:start + _BATCH_IMAGES]
+            # 재시작 시 같은 sample 목록을 다시 만들 수 있도록 원본은 옮기지 않고 복사
+            results = pool.map(_ingest_file, [s["path"] for s in batch], [s["filename"] for s in batch])
+
+            image_rows, dataset_links, class_links = [], [], []
+            label_rows = {"bounding_boxes": [], "key_points": [], "segmentations": []}
+            for sample, info in zip(batch, results):
+                if info is None:
+                    failed.append(sample["filename"])
+                    continue
+                observe_render(info)
+                image_id = uuid.uuid4().hex
+                image_rows.append({
+                    "id": image_id,
+                    "filename": sample["filename"],
+                    "file_location": info["file_location"],
+                    "thumbnail_location": info["thumbnail_location"],
+                    "width": info["width"],
+                    "height": info["height"],
+                    "type": info["type"],
+                    "size": info["size"],
+                    "content_hash": info["content_hash"],
+                    "properties": {"description": "", "comment": ""},
+                })
+                dataset_links.append({"dataset_id": dataset.id, "image_id": image_id})
+                used = _label_rows(sample, image_id, info["width"], info["height"], class_ids, label_rows)
+                class_links.extend({"class_id": class_id, "image_id": image_id} for class_id in used)
+
+            _insert(db, Image.__table__, image_rows)
+            _insert(db, dataset_images, dataset_links)
+            _insert(db, class_images, class_links)
+            for key, model in (("bounding_boxes", BoundingBox), ("key_points", KeyPoint), ("segmentations", Segmentation)):
+                _insert(db, model.__table__, label_rows[key])
+                annotations += len(label_rows[key])
+            imported += len(image_rows)
+
+            cursor = start + len(batch)
+            ctx.job.params = {**params, "cursor": cursor, "imported": imported, "annotations": annotations}
+            # 진행률 기록과 함께 배치 전체를 커밋
+            ctx.progress(cursor + len(missing), total, failed)
+
+    if work_dir and os.path.abspath(work_dir).startswith(os.path.abspath(TMP_FOLDER)):
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"[{dataset.id}] Import finished: {imported} images, {annotations} annotations, {len(failed)} failed")
+    return {"imported": imported, "annotations": annotations, "failedImageIds": failed}
@@ -0,0 +1,193 @@
+# server/core/inference.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image as PILImage
+
+from server.core.config import settings
+from server.core.metrics import INFERENCE_SAMPLES, INFERENCE_SECONDS
+
+# 세션이 차지하는 메모리를 모델 파일 크기로 추정할 때 쓰는 배수
+# (가중치 + 그래프 최적화 결과 + 메모리 아레나)
+_SESSION_MEMORY_FACTOR = 2
+
+# ImageNet 정규화 값 (DinoV2 전처리와 동일)
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+
+class InferenceSessionPool:
+    """
+    AIModel.id 별로 ort.InferenceSession 을 캐싱하는 프로세스 전역 레지스트리.
+    - 메모리 추정치 기준 LRU eviction
+    - intra/inter-op 스레드 수는 Settings 에서 설정
+    - 모델 파일이 교체되면 (경로/mtime 변경) 자동으로 다시 로드
+    """
+
+    def __init__(self, max_bytes: int, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        self.max_bytes = max_bytes
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        # { model_id: (session, signature, estimated_bytes) }
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 같은 모델을 동시에 여러 번 로드하지 않도록 모델별 로드 락 사용
+        self._load_locks = {}
+
+    def _session_options(self) -> ort.SessionOptions:
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads > 0:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads > 0:
+            options.inter_op_num_threads = self.inter_op_threads
+        return options
+
+    @staticmethod
+    def _signature(file_location: str):
+        stat = os.stat(file_location)
+        return (file_location, stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry[2] for entry in self._sessions.values())
+
+    def get(self, model) -> ort.InferenceSession:
+        """model(AIModel)에 해당하는 세션을 반환. 없거나 파일이 바뀌었으면 새로 생성."""
+        model_id = model.id
+        signature = self._signature(model.file_location)
+
+        with self._lock:
+            entry = self._sessions.get(model_id)
+            if entry and entry[1] == signature:
+                self._sessions.move_to_end(model_id)
+                return entry[0]
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                stale = self._load_locks.get(model_id) is not load_lock
+                # 다른 스레드가 먼저 로드했을 수 있으므로 다시 확인
+                entry = None if stale else self._sessions.get(model_id)
+                if entry and entry[1] == signature:
+                    self._sessions.move_to_end(model_id)
+                    return entry[0]
+
+            if not stale:
+                print(f"Loading ONNX session for model {model_id}...")
+                session = ort.InferenceSession(
+                    model.file_location,
+                    sess_options=self._session_options(),
+                    providers=ort.get_available_providers(),
+                )
+                estimated_bytes = signature[2] * _SESSION_MEMORY_FACTOR
+
+                with self._lock:
+                    self._sessions[model_id] = (session, signature, estimated_bytes)
+                    self._sessions.move_to_end(model_id)
+                    self._evict()
+                return session
+
+        # 락을 잡기 전에 invalidate/eviction 으로 락이 제거되었으면 현재 락으로 다시 시도
+        return self.get(model)
+
+    def _evict(self):
+        # 가장 최근에 사용한 세션 하나는 용량을 넘더라도 유지
+        while len(self._sessions) > 1 and self.total_bytes > self.max_bytes:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            self._drop_load_lock(evicted_id)
+            print(f"Evicted ONNX session for model {evicted_id}")
+
+    def _drop_load_lock(self, model_id: str):
+        # self._lock 안에서 호출. 로드 중인 락은 남겨 두고 (로드가 끝나면 세션과 함께 다시 정리 대상이 됨)
+        # 쓰지 않는 락만 제거해 삭제/교체된 모델의 락이 쌓이지 않도록 함
+        lock = self._load_locks.get(model_id)
+        if lock is not None and not lock.locked():
+            del self._load_locks[model_id]
+
+    def invalidate(self, model_id: str):
+        """모델이 다시 업로드되었을 때 캐시된 세션을 제거"""
+        with self._lock:
+            self._drop_load_lock(model_id)
+            if self._sessions.pop(model_id, None) is not None:
+                print(f"Invalidated ONNX session for model {model_id}")
+
+    def warmup(self, model):
+        """세션을 로드하고 더미 입력으로 한 번 실행해 첫 요청의 지연을 없앰"""
+        session = self.get(model)
+        dummy = np.zeros((1, 3, model.input_height, model.input_width), dtype=np.float32)
+        session.run(None, {session.get_inputs()[0].name: dummy})
+        print(f"Warmed up ONNX session for model {model.id}")
+
+
+def preprocess_image(image: PILImage.Image, width: int, height: int) -> np.ndarray:
+    """PIL 이미지를 모델 입력 형태(3×H×W, float32, 정규화)로 변환"""
+    image = image.convert("RGB").resize((width, height))
+    img_np = np.asarray(image, dtype=np.float32) / 255.0
+    img_np = img_np.transpose(2, 0, 1)
+    return (img_np - _MEAN) / _STD
+
+
+def load_and_preprocess(file_location: str, width: int, height: int) -> np.ndarray:
+    """이미지 파일을 읽어 전처리까지 수행 (워커 풀에서 호출)"""
+    with PILImage.open(file_location) as image:
+        return preprocess_image(image, width, height)
+
+
+def run_batch(session: ort.InferenceSession, batch: np.ndarray) -> np.ndarray:
+    """
+    N×3×H×W 배치를 실행하고 (N, D) float32 feature 행렬을 반환.
+    배치 차원이 1로 고정된 모델은 샘플 단위로 나누어 실행합니다.
+    """
+    model_input = session.get_inputs()[0]
+    batch = np.ascontiguousarray(batch, dtype=np.float32)
+    fixed_batch = isinstance(model_input.shape[0], int) and model_input.shape[0] == 1
+    with INFERENCE_SECONDS.time():
+        if fixed_batch and len(batch) > 1:
+            outputs = [session.run(None, {model_input.name: batch[i:i + 1]})[0] for i in range(len(batch))]
+            features = np.concatenate(outputs, axis=0)
+        else:
+            features = session.run(None, {model_input.name: batch})[0]
+    INFERENCE_SAMPLES.inc(len(batch))
+    # 3차원 이상의 출력은 샘플별로 flatten
+    return features.reshape(len(batch), -1).astype(np.float32)
+
+
+session_pool = InferenceSessionPool(
+    max_bytes=settings.ONNX_SESSION_CACHE_MB * 1024 * 1024,
+    intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+    inter_op_threads=settings.ONNX_INTER_OP_THREADS,
+)
+
+
+def warmup_default_model(model_id: Optional[str] = None):
+    """
+    insert_default_model 이 등록한 기본 모델(또는 지정한 모델)의 세션을 미리 로드.
+    """
+    from server.db.database import SessionLocal, DEFAULT_MODEL_FILE
+    from server.db.models import AIModel
+
+    db = SessionLocal()
+    try:
+        query = db.query(AIModel)
+        if model_id:
+            model = query.filter(AIModel.id == model_id).first()
+        else:
+            model = query.filter(AIModel.file_location == DEFAULT_MODEL_FILE).first()
+        if not model or not os.path.exists(model.file_location):
+            return
+        session_pool.warmup(model)
+    except Exception as e:
+        print(f"ONNX warm-up failed: {e}")
+    finally:
+        db.close()
+
+
+def start_warmup_worker():
+    """서버 시작을 막지 않도록 백그라운드 스레드에서 warm-up 수행"""
+    thread = threading.Thread(target=warmup_default_model, daemon=True)
+    thread.start()
@@ -0,0 +1,249 @@
+# server/core/jobs.py
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from server.core.config import settings
+from server.core.websockets import manager
+from server.db.database import SessionLocal
+from server.db.models import Job
+
+
+class JobCancelled(Exception):
+    """작업이 취소 요청을 받아 중단될 때 사용"""
+
+
+class JobContext:
+    """작업 핸들러에 전달되는 실행 컨텍스트 (진행률 보고, 취소 확인)"""
+
+    def __init__(self, runner: "JobRunner", job: Job, db: Session):
+        self.runner = runner
+        self.job = job
+        self.db = db
+        self.params = dict(job.params or {})
+        self._checks = 0
+
+    @property
+    def job_id(self) -> str:
+        return self.job.id
+
+    def cancelled(self) -> bool:
+        return self.runner.is_cancelled(self.job.id)
+
+    def check_cancelled(self):
+        """
+        취소 요청이 있으면 JobCancelled. 같은 프로세스의 요청은 바로 반영되고,
+        다른 워커 프로세스가 받은 요청은 JOB_CANCEL_POLL_EVERY 번마다 DB 에서 확인합니다.
+        """
+        self._checks += 1
+        if not self.cancelled() and self._checks % max(1, settings.JOB_CANCEL_POLL_EVERY) == 0:
+            requested = self.db.query(Job.cancel_requested).filter(Job.id == self.job.id).scalar()
+            if requested:
+                self.runner.mark_cancelled(self.job.id)
+        if self.cancelled():
+            raise JobCancelled()
+
+    def progress(self, processed: int, total: int, failed_image_ids: Optional[List[str]] = None):
+        """DB 에 진행률을 기록하고 websocket 으로 전송"""
+        self.job.processed = processed
+        self.job.total = total
+        if failed_image_ids is not None:
+            self.job.failed_image_ids = list(failed_image_ids)
+        self.db.commit()
+        self.runner.notify(manager.send_progress(self.job.id, processed, total))
+
+
+class JobRunner:
+    """
+    jobs 테이블에 상태를 저장하고, 이벤트 루프 밖의 제한된 스레드 풀에서 작업을 실행.
+    진행률은 ConnectionManager 를 통해 job_id 세션으로 전송됩니다.
+    uvicorn 워커가 여러 개일 수 있으므로 작업은 queued → running 조건부 UPDATE 로 한 워커만 가져가고,
+    실행 중에는 heartbeat_at 을 갱신해 다른 워커가 살아 있는 작업을 다시 시작하지 않게 합니다.
+    """
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.handlers: Dict[str, Callable[[JobContext], dict]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._running: set = set()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def register(self, job_type: str, handler: Callable[[JobContext], dict]):
+        """handler(ctx) 는 완료 시 websocket 으로 보낼 결과 dict 를 반환"""
+        self.handlers[job_type] = handler
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def notify(self, coro):
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(coro, self.loop)
+        else:
+            coro.close()
+
+    def create(self, db: Session, job_type: str, params: dict, total: int = 0, model_id: Optional[str] = None) -> Job:
+        job = Job(
+            id=str(uuid.uuid4()),
+            type=job_type,
+            status="queued",
+            model_id=model_id,
+            params=params,
+            total=total,
+            processed=0,
+            failed_image_ids=[],
+            cancel_requested=False,
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def submit(self, job_id: str):
+        with self._lock:
+            self._cancel_events.setdefault(job_id, threading.Event())
+        self.executor.submit(self._run, job_id)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        event = self._cancel_events.get(job_id)
+        return event is not None and event.is_set()
+
+    def mark_cancelled(self, job_id: str):
+        with self._lock:
+            self._cancel_events.setdefault(job_id, threading.Event()).set()
+
+    def cancel(self, db: Session, job: Job):
+        """
+        취소 요청을 기록. 아직 아무 워커도 가져가지 않은(queued) 작업은 바로 cancelled 로 바꾸고,
+        실행 중인 작업은 해당 워커의 check_cancelled 가 DB 에서 읽어 중단합니다.
+        """
+        db.query(Job).filter(Job.id == job.id).update({"cancel_requested": True}, synchronize_session=False)
+        db.query(Job).filter(Job.id == job.id, Job.status == "queued").update(
+            {"status": "cancelled", "finished_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+        db.refresh(job)
+        self.mark_cancelled(job.id)
+
+    def _claim(self, db: Session, job_id: str) -> bool:
+        """queued 인 작업만 running 으로 바꿈. 다른 워커가 먼저 가져갔거나 취소되었으면 False"""
+        claimed = db.query(Job).filter(
+            Job.id == job_id, Job.status == "queued", Job.cancel_requested.is_(False)
+        ).update({"status": "running", "heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        try:
+            if not self._claim(db, job_id):
+                return
+            job = db.query(Job).filter(Job.id == job_id).first()
+            handler = self.handlers.get(job.type)
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type '{job.type}'")
+
+            with self._lock:
+                self._running.add(job_id)
+            self._ensure_heartbeat()
+            ctx = JobContext(self, job, db)
+            try:
+                result = handler(ctx) or {}
+                job.status = "cancelled" if ctx.cancelled() else "completed"
+                message = {"type": "complete" if job.status == "completed" else "cancelled", "jobId": job_id, **result}
+            except JobCancelled:
+                job.status = "cancelled"
+                message = {"type": "cancelled", "jobId": job_id}
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            self.notify(manager.send_json(job_id, message))
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            db.rollback()
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job is not None:
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db.commit()
+            self.notify(manager.send_error(job_id, str(e)))
+        finally:
+            db.close()
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+                self._running.discard(job_id)
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        """이 프로세스에서 실행 중인 작업의 heartbeat_at 을 주기적으로 갱신"""
+        while True:
+            time.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                running = list(self._running)
+            if not running:
+                continue
+            db = SessionLocal()
+            try:
+                db.query(Job).filter(Job.id.in_(running), Job.status == "running").update(
+                    {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+                )
+                db.commit()
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    def resume_pending(self):
+        """
+        재시작 전에 대기 중이던 작업과, heartbeat 가 JOB_STALE_SECONDS 이상 끊긴(워커가 종료된) 실행 중 작업을
+        다시 큐에 넣음. 다른 워커가 실행 중인 작업은 건드리지 않고, 여러 워커가 동시에 호출해도
+        _claim 에서 한 워커만 실행합니다.
+        """
+        db = SessionLocal()
+        try:
+            stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+            stale = Job.heartbeat_at.is_(None) | (Job.heartbeat_at < stale_before)
+            db.query(Job).filter(Job.status == "running", stale, Job.cancel_requested.is_(False)).update(
+                {"status": "queued"}, synchronize_session=False
+            )
+            db.query(Job).filter(
+                Job.cancel_requested.is_(True), (Job.status == "queued") | ((Job.status == "running") & stale)
+            ).update({"status": "cancelled", "finished_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+            for job in db.query(Job).filter(Job.status == "queued").all():
+                print(f"Resuming job {job.id} ({job.type})")
+                self.submit(job.id)
+        finally:
+            db.close()
+
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "modelId": job.model_id,
+        "total": job.total,
+        "processed": job.processed,
+        "failedImageIds": job.failed_image_ids or [],
+        "error": job.error,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "updatedAt": job.updated_at.isoformat() if job.updated_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+job_runner = JobRunner(max_workers=settings.JOB_WORKERS)
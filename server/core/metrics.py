@@ -0,0 +1,243 @@
+# server/core/metrics.py
+"""
+프로세스 내부 메트릭 레지스트리 (Prometheus 텍스트 형식으로 /metrics 에 노출).
+외부 의존성 없이 Counter / Histogram 과 조회 시점 수집기(gauge)만 지원하며, 값 갱신은 잠금 하나와
+딕셔너리 조회 정도의 비용이라 운영 환경에서도 켜 둘 수 있습니다.
+ProcessPoolExecutor 워커에서 기록한 값은 해당 워커 프로세스에만 남으므로, 워커는 측정값을 반환하고
+부모 프로세스가 기록합니다. (예: thumbnails.observe_render)
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, float]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, float]]]):
+        """
+        조회 시점에 값을 계산하는 수집기 등록.
+        collector() 는 (이름, 종류(gauge/counter), 설명, 값) 을 반환합니다.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                for name, kind, help_text, value in collector():
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name} {_format_value(value)}")
+            except Exception as e:
+                lines.append(f"# collector error: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # key → [버킷별 개수..., +Inf 개수, 합계]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        lines = self._header()
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# ── 메트릭 정의 ───────────────────────────────────────────────────────────────
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by router", ("router", "method", "status")
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("engine", "operation")
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements issued per HTTP request", ("router",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+DB_SECONDS_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Total SQL execution time per HTTP request", ("router",)
+)
+INFERENCE_SECONDS = Histogram("onnx_inference_duration_seconds", "ONNX Runtime session.run time per batch")
+INFERENCE_SAMPLES = Counter("onnx_inference_samples_total", "Images run through ONNX Runtime")
+FAISS_SECONDS = Histogram("faiss_operation_duration_seconds", "FAISS index operation time", ("operation",))
+FAISS_VECTORS = Counter("faiss_vectors_total", "Vectors added to or queried against FAISS indexes", ("operation",))
+THUMBNAIL_SECONDS = Histogram("thumbnail_render_duration_seconds", "Thumbnail decode + resize + encode time")
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes received through upload endpoints", ("endpoint",))
+WEBSOCKET_MESSAGES = Counter(
+    "websocket_messages_total", "Websocket messages by type and delivery result", ("type", "result")
+)
+WEBSOCKET_SEND_SECONDS = Histogram("websocket_send_duration_seconds", "Websocket send_json time")
+
+
+# ── 요청 단위 SQL 집계 ────────────────────────────────────────────────────────
+# [쿼리 수, 누적 시간(초)]. 요청 처리 중 threadpool 로 넘어가는 sync 엔드포인트에도 복사됩니다.
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db_stats", default=None)
+_sql_engines = set()
+
+
+def install_sql_metrics(engine, name: str):
+    """engine 의 SQL 실행 시간을 DB_QUERY_SECONDS 와 현재 요청 집계에 기록"""
+    if id(engine) in _sql_engines:
+        return
+    _sql_engines.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_metrics_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        DB_QUERY_SECONDS.observe(elapsed, engine=name, operation=operation)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+def router_name(route: str) -> str:
+    """경로 템플릿 → 라우터 이름 (/api/images/{image_id} → images)"""
+    if route.startswith("<"):
+        return "unmatched"
+    parts = [part for part in route.split("/") if part]
+    if not parts:
+        return "root"
+    if parts[0] == "api" and len(parts) > 1:
+        return parts[1]
+    return parts[0]
+
+
+@contextmanager
+def track_request():
+    """요청 하나의 SQL 수/시간을 모으는 블록. 집계 리스트 [count, seconds] 를 반환"""
+    stats = [0, 0.0]
+    token = _request_db.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_db.reset(token)
+
+
+def observe_request(route: str, method: str, status: int, seconds: float, db_stats: Sequence):
+    router = router_name(route)
+    HTTP_REQUEST_SECONDS.observe(seconds, router=router, method=method, status=f"{status // 100}xx")
+    DB_QUERIES_PER_REQUEST.observe(db_stats[0], router=router)
+    DB_SECONDS_PER_REQUEST.observe(db_stats[1], router=router)
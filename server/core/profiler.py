@@ -0,0 +1,327 @@
+# server/core/profiler.py
+"""
+느린 요청 분석용 샘플링 프로파일러 (PROFILING_ENABLED=true 일 때만 create_app 에서 연결).
+- 트리거: X-Profile 헤더(PROFILE_HEADER_TOKEN 과 일치해야 함), PROFILE_ROUTES 에 지정한 경로,
+  PROFILE_SLOW_MS 초과 (PROFILE_SLOW_SAMPLE_RATE 비율의 요청을 미리 측정하고 느린 것만 저장)
+- 측정 중에는 샘플러 스레드가 PROFILE_INTERVAL_MS 마다 스택을 스레드별로 읽어 두고, 저장할 때
+  그 요청을 처리한 스레드(미들웨어가 실행된 이벤트 루프 스레드 + 요청 안에서 SQL 을 실행한
+  threadpool 스레드)의 것만 flamegraph.pl / speedscope 가 읽는 collapsed 형식("a;b;c 개수")으로 남깁니다.
+  다른 요청, 작업 러너, 업로드 풀 스레드의 스택은 섞이지 않습니다.
+- 요청 안에서 실행된 SQL 문과 실행 시간을 함께 기록합니다.
+- 결과는 PROFILE_DIR 에 JSON 으로 저장하며 PROFILE_MAX_CAPTURES 개를 넘으면 오래된 것부터 삭제합니다.
+이벤트 루프 스레드는 여러 요청이 공유하므로 동시에 처리 중인 다른 요청의 스택도 섞일 수 있습니다.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from server.core.config import settings
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# 대기 중인 스레드(작업 큐/이벤트 루프 select 등)는 표본에서 제외
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _collapse(thread_name: str, frame) -> Optional[str]:
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(labels))
+
+
+class _Session:
+    """요청 하나의 측정 상태"""
+
+    def __init__(self, capture_id: str, trigger: str):
+        self.id = capture_id
+        self.trigger = trigger
+        self.started_at = time.time()
+        # (스레드 ident, collapsed 스택) → 표본 수. 요청을 처리한 스레드는 threads 에 모임
+        self.stacks: Counter = Counter()
+        self.threads = set()
+        self.samples = 0
+        self.sql: List[dict] = []
+        self.sql_dropped = 0
+        self.sql_ms = 0.0
+        self._lock = threading.Lock()
+
+    def add_thread(self, ident: int):
+        if ident not in self.threads:
+            with self._lock:
+                self.threads.add(ident)
+
+    def add_stacks(self, stacks: List[Tuple[int, str]]):
+        with self._lock:
+            self.samples += 1
+            self.stacks.update(stacks)
+
+    def request_stacks(self) -> Counter:
+        """요청을 처리한 스레드의 스택만 (스레드 구분 없이 합산)"""
+        result = Counter()
+        for (ident, stack), count in self.stacks.items():
+            if ident in self.threads:
+                result[stack] += count
+        return result
+
+    def add_statement(self, statement: str, duration_ms: float, executemany: bool):
+        with self._lock:
+            self.sql_ms += duration_ms
+            if len(self.sql) >= settings.PROFILE_MAX_STATEMENTS:
+                self.sql_dropped += 1
+                return
+            self.sql.append({
+                "statement": statement,
+                "durationMs": round(duration_ms, 3),
+                "executemany": executemany,
+            })
+
+    def to_dict(self, method: str, path: str, status: int, duration_ms: float) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "trigger": self.trigger,
+                "method": method,
+                "path": path,
+                "status": status,
+                "startedAt": self.started_at,
+                "durationMs": round(duration_ms, 2),
+                "intervalMs": settings.PROFILE_INTERVAL_MS,
+                "samples": self.samples,
+                "sqlCount": len(self.sql) + self.sql_dropped,
+                "sqlMs": round(self.sql_ms, 3),
+                "sqlDropped": self.sql_dropped,
+                "threads": len(self.threads),
+                "stacks": dict(self.request_stacks().most_common()),
+                "sql": list(self.sql),
+            }
+
+
+class _Sampler:
+    """측정 중인 요청이 있을 때만 도는 스택 샘플러 스레드 (요청 수와 무관하게 하나)"""
+
+    def __init__(self):
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, session: _Session):
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, session: _Session):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self):
+        interval = max(settings.PROFILE_INTERVAL_MS, 1) / 1000
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _collapse(names.get(ident, f"thread-{ident}"), frame)
+                if stack:
+                    stacks.append((ident, stack))
+            for session in sessions:
+                session.add_stacks(stacks)
+            time.sleep(interval)
+
+
+_sampler = _Sampler()
+
+# 현재 요청의 측정 세션. sync 엔드포인트가 실행되는 threadpool 에도 복사됩니다.
+_active: ContextVar[Optional[_Session]] = ContextVar("profile_session", default=None)
+_sql_engines = set()
+
+
+def install_sql_capture(engine):
+    """
+    engine 에서 실행되는 SQL 문과 실행 시간을 측정 중인 요청에 기록.
+    SQL 을 실행한 스레드(sync 엔드포인트의 threadpool 스레드)를 요청 처리 스레드로 등록합니다.
+    """
+    if id(engine) in _sql_engines:
+        return
+    _sql_engines.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        session = _active.get()
+        if session is not None:
+            session.add_thread(threading.get_ident())
+            context._profile_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        session = _active.get()
+        start = getattr(context, "_profile_start", None)
+        if session is not None and start is not None:
+            session.add_statement(statement, (time.perf_counter() - start) * 1000, executemany)
+
+
+# ── 저장소 (디스크 링 버퍼) ────────────────────────────────────────────────────
+_CAPTURE_ID = re.compile(r"^\d{13}-[0-9a-f]{8}$")
+_SUMMARY_KEYS = ("id", "trigger", "method", "path", "status", "startedAt", "durationMs", "samples", "sqlCount", "sqlMs")
+
+
+class ProfileStore:
+    def __init__(self, directory: str, max_captures: int):
+        self.directory = directory
+        self.max_captures = max_captures
+        self._lock = threading.Lock()
+
+    def path(self, capture_id: str) -> Optional[str]:
+        if not _CAPTURE_ID.match(capture_id):
+            return None
+        path = os.path.join(self.directory, f"{capture_id}.json")
+        return path if os.path.isfile(path) else None
+
+    def _ids(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        ids = [name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted(i for i in ids if _CAPTURE_ID.match(i))
+
+    def save(self, capture: dict):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{capture['id']}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(capture, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            with self._lock:
+                ids = self._ids()
+                for old in ids[:max(len(ids) - self.max_captures, 0)]:
+                    os.remove(os.path.join(self.directory, f"{old}.json"))
+        except Exception as e:
+            print(f"Error saving profile {capture.get('id')}: {e}")
+
+    def load(self, capture_id: str) -> Optional[dict]:
+        path = self.path(capture_id)
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self) -> List[dict]:
+        """최신순 요약 목록 (스택/SQL 제외)"""
+        summaries = []
+        for capture_id in reversed(self._ids()):
+            try:
+                capture = self.load(capture_id)
+            except (OSError, ValueError):
+                continue
+            if capture is not None:
+                summaries.append({key: capture.get(key) for key in _SUMMARY_KEYS})
+        return summaries
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_CAPTURES)
+
+
+def collapsed_stacks(capture: dict) -> str:
+    """flamegraph.pl / speedscope 입력 형식"""
+    return "".join(f"{stack} {count}\n" for stack, count in capture.get("stacks", {}).items())
+
+
+# ── 미들웨어 ──────────────────────────────────────────────────────────────────
+def _profile_routes() -> set:
+    return {route.strip() for route in settings.PROFILE_ROUTES.split(",") if route.strip()}
+
+
+class ProfilerMiddleware:
+    """
+    ASGI 미들웨어: 트리거 조건에 맞는 요청만 측정합니다. 헤더로 요청한 경우
+    응답에 X-Profile-Id 를 붙여 /admin/profiles/{id} 로 바로 내려받을 수 있게 합니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = _profile_routes()
+
+    def _trigger(self, scope) -> Optional[str]:
+        token = settings.PROFILE_HEADER_TOKEN
+        if token:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER and value.decode("latin-1") == token:
+                    return "header"
+        if f"{scope['method']} {scope['path']}" in self.routes and random.random() < settings.PROFILE_ROUTE_SAMPLE_RATE:
+            return "route"
+        if settings.PROFILE_SLOW_MS > 0 and random.random() < settings.PROFILE_SLOW_SAMPLE_RATE:
+            return "slow"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = _Session(f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}", trigger)
+        method, path = scope["method"], scope["path"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if trigger == "header":
+                    message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, session.id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        token = _active.set(session)
+        session.add_thread(threading.get_ident())
+        _sampler.start(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _sampler.stop(session)
+            _active.reset(token)
+            duration_ms = (time.perf_counter() - start) * 1000
+            if trigger != "slow" or duration_ms >= settings.PROFILE_SLOW_MS:
+                capture = session.to_dict(method, path, status_code, duration_ms)
+                # 파일 쓰기는 이벤트 루프 밖에서
+                asyncio.get_running_loop().run_in_executor(None, profile_store.save, capture)
@@ -0,0 +1,336 @@
+# server/core/projections.py
+import os
+import json
+import pickle
+import hashlib
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from server.core.config import UPLOAD_DIR, settings
+
+# 학습된 reducer 를 pickle 로 저장하므로 /static 으로 공개되는 UPLOAD_DIR 밖에 둠
+PROJECTION_DIR = settings.PROJECTION_CACHE_DIR
+_LEGACY_PROJECTION_DIR = os.path.join(UPLOAD_DIR, "projections")
+
+
+def _fit_umap(vectors: np.ndarray, params: dict, timings: dict):
+    from umap import UMAP
+
+    n_neighbors = int(np.clip(params.get("n_neighbors", 15), 2, len(vectors) - 1))
+    reducer = UMAP(
+        n_components=2,
+        n_neighbors=n_neighbors,
+        init="random",
+        random_state=42,
+        force_approximation_algorithm=True
+    )
+    coords = reducer.fit_transform(vectors)
+    return reducer, coords
+
+
+def _transform_umap(reducer, vectors: np.ndarray) -> np.ndarray:
+    return reducer.transform(vectors)
+
+
+def _fit_pca(vectors: np.ndarray, params: dict, timings: dict):
+    from sklearn.decomposition import PCA
+
+    pca = PCA(n_components=2, svd_solver="randomized", random_state=42)
+    return pca, pca.fit_transform(vectors)
+
+
+def _transform_pca(pca, vectors: np.ndarray) -> np.ndarray:
+    return pca.transform(vectors)
+
+
+def _knn_place(state: dict, vectors: np.ndarray, k: int = 10) -> np.ndarray:
+    """
+    학습에 사용된 벡터 중 가장 가까운 k 개의 좌표를 거리 가중 평균해 새 점을 배치.
+    transform 이 없는 엔진(t-SNE)과 landmark 방식의 나머지 점 배치에 사용합니다.
+    """
+    import faiss
+
+    base = np.ascontiguousarray(state["vectors"], dtype=np.float32)
+    index = faiss.IndexFlatL2(base.shape[1])
+    index.add(base)
+    distances, neighbors = index.search(np.ascontiguousarray(vectors, dtype=np.float32), min(k, len(base)))
+    weights = 1.0 / (np.sqrt(np.maximum(distances, 0)) + 1e-6)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.einsum("nk,nkc->nc", weights, state["coords"][neighbors]).astype(np.float32)
+
+
+def _approximate_knn_graph(vectors: np.ndarray, k: int):
+    """Faiss HNSW 로 근사 kNN 그래프를 만들어 sparse 거리 행렬(csr)로 반환"""
+    import faiss
+    from scipy.sparse import csr_matrix
+
+    n = len(vectors)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.IndexHNSWFlat(vectors.shape[1], 32)
+    index.hnsw.efSearch = max(64, 2 * k)
+    index.add(vectors)
+    distances, neighbors = index.search(vectors, k + 1)
+
+    # 자기 자신과 빈 결과(-1)를 제외하고 앞에서부터 k 개 선택
+    keep = (neighbors != np.arange(n)[:, None]) & (neighbors >= 0)
+    order = np.argsort(~keep, axis=1, kind="stable")[:, :k]
+    neighbors = np.take_along_axis(neighbors, order, axis=1)
+    distances = np.take_along_axis(distances, order, axis=1)
+    valid = np.take_along_axis(keep, order, axis=1)
+
+    rows = np.repeat(np.arange(n), k)[valid.ravel()]
+    return csr_matrix(
+        (np.sqrt(np.maximum(distances, 0)).ravel()[valid.ravel()], (rows, neighbors.ravel()[valid.ravel()])),
+        shape=(n, n)
+    )
+
+
+def _fit_tsne(vectors: np.ndarray, params: dict, timings: dict):
+    from sklearn.manifold import TSNE
+
+    perplexity = float(np.clip(params.get("perplexity", 30), 2, max(2, (len(vectors) - 1) / 3)))
+    k = min(len(vectors) - 1, int(3 * perplexity) + 1)
+
+    started = time.perf_counter()
+    graph = _approximate_knn_graph(vectors, k)
+    timings["knnGraph"] = time.perf_counter() - started
+
+    tsne = TSNE(
+        n_components=2,
+        perplexity=perplexity,
+        metric="precomputed",
+        init="random",
+        method="barnes_hut",
+        random_state=42
+    )
+    coords = tsne.fit_transform(graph).astype(np.float32)
+    return {"vectors": vectors.astype(np.float32), "coords": coords}, coords
+
+
+def _fit_landmark(vectors: np.ndarray, params: dict, timings: dict):
+    """표본(landmark)에만 UMAP 을 학습하고 나머지 점은 kNN 보간으로 배치"""
+    n_landmarks = int(params.get("landmarks", 5000))
+    if len(vectors) <= n_landmarks:
+        reducer, coords = _fit_umap(vectors, params, timings)
+        return {"vectors": vectors.astype(np.float32), "coords": coords.astype(np.float32)}, coords
+
+    rng = np.random.default_rng(42)
+    landmark_rows = np.sort(rng.choice(len(vectors), n_landmarks, replace=False))
+    started = time.perf_counter()
+    _, landmark_coords = _fit_umap(vectors[landmark_rows], params, timings)
+    timings["landmarkFit"] = time.perf_counter() - started
+
+    state = {"vectors": vectors[landmark_rows].astype(np.float32), "coords": landmark_coords.astype(np.float32)}
+    started = time.perf_counter()
+    coords = _knn_place(state, vectors)
+    coords[landmark_rows] = state["coords"]
+    timings["placement"] = time.perf_counter() - started
+    return state, coords
+
+
+# 차원 축소 엔진:
+# { method: (fit(vectors, params, timings) -> (state, coords), transform(state, vectors) -> coords) }
+ENGINES: Dict[str, Tuple[Callable, Callable]] = {
+    "umap": (_fit_umap, _transform_umap),
+    "pca": (_fit_pca, _transform_pca),
+    "pca_umap": (_fit_umap, _transform_umap),
+    "tsne": (_fit_tsne, _knn_place),
+    "landmark": (_fit_landmark, _knn_place),
+}
+
+# pca_components 를 지정하지 않았을 때 엔진별로 먼저 PCA 로 줄일 차원 수
+_DEFAULT_PCA_COMPONENTS = {"pca_umap": 50, "tsne": 50}
+
+
+class _Projection:
+    """한 캐시 키에 대한 학습된 reducer 와 이미지별 2D 좌표"""
+
+    def __init__(self, method: str, params: dict, pca, state, image_ids: Sequence[str], coords: np.ndarray):
+        self.method = method
+        self.params = params
+        self.pca = pca
+        self.state = state
+        self.fitted_count = len(image_ids)
+        self.coords: Dict[str, List[float]] = {
+            image_id: coord.tolist() for image_id, coord in zip(image_ids, coords)
+        }
+
+    def reduce(self, vectors: np.ndarray) -> np.ndarray:
+        return self.pca.transform(vectors) if self.pca is not None else vectors
+
+
+class ProjectionCache:
+    """
+    (model_id, 범위, method, params) 별로 학습된 2D 투영을 캐싱.
+    범위는 데이터셋 id 집합이며, 데이터셋을 지정하지 않은 요청은 image_scope() 로 이미지 집합마다 따로 둡니다.
+    - 이미 좌표가 있는 이미지는 그대로 반환
+    - 새 이미지는 학습된 reducer 의 transform 으로 배치 (전체 재학습 없음)
+    - 새 이미지 비율이 PROJECTION_REFIT_RATIO 를 넘거나 refresh 요청 시에만 재학습하며,
+      재학습 때는 이미 좌표가 있던 이미지도 함께 학습해 같은 좌표계로 옮김 (요청한 부분집합만 남기지 않음)
+    - 결과는 디스크에 저장되어 재시작 후에도 바로 사용 가능
+    """
+
+    def __init__(self, root: str, max_entries: int = 8):
+        self.root = root
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Projection]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def make_key(model_id: str, scope: Sequence[str], method: str, params: dict) -> str:
+        raw = json.dumps([model_id, sorted(scope), method, params], sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def image_scope(image_ids: Sequence[str]) -> List[str]:
+        """데이터셋 범위가 없는 요청용: 이미지 id 집합의 해시"""
+        digest = hashlib.sha1("\n".join(sorted(set(image_ids))).encode("utf-8")).hexdigest()
+        return [f"images:{digest}"]
+
+    def _path(self, model_id: str, key: str) -> str:
+        return os.path.join(self.root, model_id, f"{key}.pkl")
+
+    def _load(self, model_id: str, key: str) -> Optional[_Projection]:
+        with self._lock:
+            entry = self._entries.get(f"{model_id}/{key}")
+            if entry is not None:
+                self._entries.move_to_end(f"{model_id}/{key}")
+                return entry
+        path = self._path(model_id, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except Exception as e:
+            print(f"Failed to load projection cache {path}: {e}")
+            return None
+        self._remember(model_id, key, entry)
+        return entry
+
+    def _remember(self, model_id: str, key: str, entry: _Projection):
+        with self._lock:
+            self._entries[f"{model_id}/{key}"] = entry
+            self._entries.move_to_end(f"{model_id}/{key}")
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _save(self, model_id: str, key: str, entry: _Projection):
+        path = self._path(model_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def _fit(
+        self, method: str, params: dict, image_ids: Sequence[str], vectors: np.ndarray, timings: dict
+    ) -> _Projection:
+        fit, _ = ENGINES[method]
+        pca = None
+        pca_components = params.get("pca_components") or _DEFAULT_PCA_COMPONENTS.get(method, 0)
+        if method != "pca" and pca_components and pca_components < min(vectors.shape):
+            from sklearn.decomposition import PCA
+
+            started = time.perf_counter()
+            pca = PCA(n_components=pca_components, svd_solver="randomized", random_state=42)
+            vectors = pca.fit_transform(vectors)
+            timings["pca"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if len(vectors) < 3:
+            # 학습할 수 없는 크기: 고정 시드 좌표를 쓰고 state 없이 캐시 (새 이미지가 오면 재학습)
+            state, coords = None, np.random.default_rng(42).random((len(vectors), 2)).astype(np.float32)
+        else:
+            state, coords = fit(vectors, params, timings)
+        timings["fit"] = time.perf_counter() - started
+        return _Projection(method, params, pca, state, image_ids, coords)
+
+    def project(
+        self,
+        model_id: str,
+        scope: Sequence[str],
+        method: str,
+        params: dict,
+        image_ids: Sequence[str],
+        fetch_vectors: Callable[[Sequence[str]], Tuple[List[str], np.ndarray]],
+        refresh: bool = False,
+    ) -> Tuple[Dict[str, List[float]], dict]:
+        """
+        image_ids 의 2D 좌표와 처리 정보({cached, transformed, refit, fitted, timings})를 반환.
+        fetch_vectors(ids) 는 (벡터가 남아 있는 id 목록, 벡터 행렬) 을 반환해야 하며
+        캐시에 없는 이미지와, 재학습 시 기존 항목의 이미지에 대해서만 호출됩니다.
+        """
+        timings = {}
+
+        def timed_fetch(ids):
+            started = time.perf_counter()
+            found, vectors = fetch_vectors(ids)
+            timings["fetch"] = time.perf_counter() - started
+            return found, vectors
+
+        key = self.make_key(model_id, scope, method, params)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(f"{model_id}/{key}", threading.Lock())
+
+        with key_lock:
+            entry = None if refresh else self._load(model_id, key)
+            missing = [image_id for image_id in image_ids if entry is None or image_id not in entry.coords]
+
+            needs_refit = (
+                entry is None
+                or (bool(missing) and entry.state is None)
+                or len(missing) > settings.PROJECTION_REFIT_RATIO * entry.fitted_count
+            )
+            if needs_refit:
+                fit_ids = list(image_ids)
+                if entry is not None:
+                    requested = set(image_ids)
+                    fit_ids += [image_id for image_id in entry.coords if image_id not in requested]
+                entry = self._fit(method, params, *timed_fetch(fit_ids), timings)
+                info = {"cached": 0, "transformed": 0, "refit": True}
+            else:
+                if missing:
+                    _, transform = ENGINES[method]
+                    missing, vectors = timed_fetch(missing)
+                    started = time.perf_counter()
+                    coords = transform(entry.state, entry.reduce(vectors))
+                    timings["transform"] = time.perf_counter() - started
+                    for image_id, coord in zip(missing, coords):
+                        entry.coords[image_id] = coord.tolist()
+                info = {"cached": len(image_ids) - len(missing), "transformed": len(missing), "refit": False}
+
+            if info["refit"] or missing:
+                self._remember(model_id, key, entry)
+                self._save(model_id, key, entry)
+
+        info["fitted"] = entry.fitted_count
+        info["timings"] = timings
+        return {image_id: entry.coords[image_id] for image_id in image_ids if image_id in entry.coords}, info
+
+    def drop_model(self, model_id: str):
+        """모델이 교체되었을 때 해당 모델의 투영 캐시를 모두 제거"""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k.startswith(f"{model_id}/")]:
+                del self._entries[cache_key]
+        shutil.rmtree(os.path.join(self.root, model_id), ignore_errors=True)
+
+
+def _move_legacy_cache():
+    """이전 버전이 공개 경로(UPLOAD_DIR/projections)에 저장한 캐시를 옮김"""
+    if not os.path.isdir(_LEGACY_PROJECTION_DIR):
+        return
+    if os.path.exists(PROJECTION_DIR):
+        shutil.rmtree(_LEGACY_PROJECTION_DIR, ignore_errors=True)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(PROJECTION_DIR)), exist_ok=True)
+    shutil.move(_LEGACY_PROJECTION_DIR, PROJECTION_DIR)
+
+
+_move_legacy_cache()
+projection_cache = ProjectionCache(PROJECTION_DIR)
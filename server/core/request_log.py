@@ -0,0 +1,227 @@
+# server/core/request_log.py
+"""
+요청 로그/지연 시간 측정.
+- 로그 레코드는 QueueHandler 로 큐에 넣고 별도 스레드(QueueListener)가 JSON 으로 출력하므로
+  요청 처리 스레드/이벤트 루프는 I/O 를 기다리지 않습니다.
+- 라우트(경로 템플릿)별 지연 시간 히스토그램을 메모리에 누적합니다.
+- 자주 호출되는 라우트의 접근 로그는 표본 추출하며, 오류/느린 요청은 항상 기록합니다.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from server.core.config import settings
+from server.core.metrics import observe_request, track_request
+
+access_logger = logging.getLogger("ingradient.access")
+
+# 기본 LogRecord 속성 (extra 로 넘긴 필드와 구분하기 위함)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄 JSON 로그: {ts, level, logger, msg, ...extra}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging():
+    """
+    루트 로거를 큐 기반 비동기 출력으로 구성. 여러 번 호출해도 한 번만 적용됩니다.
+    LOG_FORMAT=json 이면 JSON, 그 외에는 기존 텍스트 형식으로 출력합니다.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT.lower() == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(settings.LOG_LEVEL.upper())
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """큐에 남은 로그를 모두 출력하고 리스너 스레드를 종료"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def debug_dump(logger: logging.Logger, label: str, payload):
+    """
+    디버그용 요청/응답 내용 기록. LOG_DEBUG_PAYLOADS=false(운영 기본값) 이거나
+    DEBUG 레벨이 꺼져 있으면 payload 를 직렬화하지 않고 바로 반환합니다.
+    """
+    if settings.LOG_DEBUG_PAYLOADS and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(label, extra={"payload": payload})
+
+
+# ── 라우트별 지연 시간 히스토그램 ──────────────────────────────────────────────
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+
+    def observe(self, duration_ms: float, error: bool = False):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.total += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """버킷 상한으로 근사한 분위수 (마지막 버킷은 관측 최댓값)"""
+        if not self.total:
+            return None
+        target = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.total,
+            "errors": self.errors,
+            "meanMs": self.sum_ms / self.total if self.total else None,
+            "maxMs": self.max_ms,
+            "p50Ms": self.quantile(0.5),
+            "p95Ms": self.quantile(0.95),
+            "p99Ms": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"], self.counts)),
+        }
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def observe_latency(route: str, duration_ms: float, error: bool = False):
+    histogram = _histograms.get(route)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(route, LatencyHistogram())
+    histogram.observe(duration_ms, error)
+
+
+def latency_snapshot() -> dict:
+    return {route: histogram.snapshot() for route, histogram in sorted(_histograms.items())}
+
+
+def _hot_routes() -> set:
+    return {route.strip() for route in settings.LOG_HOT_ROUTES.split(",") if route.strip()}
+
+
+def _route_template(scope, root_path: str) -> str:
+    """
+    경로 템플릿. API 라우트는 FastAPI 가 scope["route"] 에 남기고,
+    StaticFiles 같은 Mount 는 root_path 가 마운트 경로만큼 늘어나므로 그 접두사를 사용.
+    어느 쪽도 아니면(404) 하나로 묶어 라우트 수가 무한히 늘지 않게 합니다.
+    """
+    route = scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    mounted = scope.get("root_path", "")
+    if mounted != root_path and mounted.startswith(root_path):
+        return mounted[len(root_path):] or "/"
+    return "<unmatched>"
+
+
+class RequestLogMiddleware:
+    """
+    ASGI 미들웨어: 요청마다 지연 시간을 라우트 템플릿(예: GET /api/images/{image_id}) 기준으로 누적하고
+    접근 로그를 한 줄 남깁니다. LOG_HOT_ROUTES 에 있는 라우트는 LOG_HOT_SAMPLE_RATE,
+    나머지는 LOG_REQUEST_SAMPLE_RATE 비율로만 기록하며 5xx 와 느린 요청은 항상 기록합니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.hot_routes = _hot_routes()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        # Mount 는 scope 의 path 를 남은 경로로 바꾸므로 원래 경로를 보관
+        path = scope["path"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            with track_request() as db_stats:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            template = _route_template(scope, root_path)
+            key = f"{scope['method']} {template}"
+            error = status_code >= 500
+            observe_latency(key, duration_ms, error)
+            observe_request(template, scope["method"], status_code, duration_ms / 1000, db_stats)
+
+            rate = settings.LOG_HOT_SAMPLE_RATE if key in self.hot_routes else settings.LOG_REQUEST_SAMPLE_RATE
+            if error or duration_ms >= settings.LOG_SLOW_REQUEST_MS or (rate > 0 and random.random() < rate):
+                access_logger.log(
+                    logging.WARNING if error else logging.INFO,
+                    "request",
+                    extra={
+                        "method": scope["method"],
+                        "route": key,
+                        "path": path,
+                        "status": status_code,
+                        "durationMs": round(duration_ms, 2),
+                        "sampleRate": 1.0 if error or duration_ms >= settings.LOG_SLOW_REQUEST_MS else rate,
+                    },
+                )
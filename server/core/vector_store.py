@@ -0,0 +1,751 @@
+# server/core/vector_store.py
+import os
+import json
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import faiss
+
+from server.core.config import MODEL_UPLOAD_DIR, settings
+from server.core.metrics import FAISS_SECONDS, FAISS_VECTORS
+
+# WAL 레코드: [payload 길이(uint32)][crc32(uint32)][payload]
+# payload: [op(uint8)][int_id(int64)][feature uuid(36 bytes)][vector(float32 × dim, ADD 만)]
+_RECORD_HEADER = struct.Struct("<II")
+_PAYLOAD_HEADER = struct.Struct("<Bq36s")
+_OP_ADD = 1
+_OP_REMOVE = 2
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def default_index_params(index_type: str, dim: int, n_vectors: int) -> dict:
+    """인덱스 종류별 기본 파라미터. n_vectors 는 학습/변환 시점의 벡터 수."""
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = int(min(65536, max(16, 4 * np.sqrt(max(n_vectors, 1)))))
+        params = {"nlist": nlist, "nprobe": 16, "train_threshold": max(39 * nlist, 10000)}
+        if index_type == "ivf_pq":
+            params["m"] = next((m for m in (64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0), 1)
+            params["nbits"] = 8
+        return params
+    if index_type == "hnsw":
+        return {"M": 32, "efConstruction": 40, "efSearch": 64, "train_threshold": 10000}
+    return {}
+
+
+def build_index(index_type: str, dim: int, params: dict):
+    """
+    빈 인덱스를 생성. IVF 계열은 자체적으로 id 를 지원하므로 그대로 사용하고
+    (삭제/복원을 위해 Hashtable direct map 사용), 나머지는 IndexIDMap2 로 감쌉니다.
+    """
+    if index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"])
+    elif index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["m"], params.get("nbits", 8))
+    elif index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, params["M"])
+        hnsw.hnsw.efConstruction = params.get("efConstruction", 40)
+        return apply_search_params(faiss.IndexIDMap2(hnsw), index_type, params)
+    else:
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return apply_search_params(index, index_type, params)
+
+
+def apply_search_params(index, index_type: str, params: dict):
+    if index_type in ("ivf_flat", "ivf_pq"):
+        index.nprobe = params.get("nprobe", 16)
+    elif index_type == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efSearch = params.get("efSearch", 64)
+    return index
+
+
+def _clip_params(index_type: str, params: dict, n_vectors: int) -> dict:
+    # 벡터 수보다 많은 클러스터는 학습할 수 없음
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params = {**params, "nlist": max(1, min(params["nlist"], n_vectors))}
+    return params
+
+
+def _train_sample(vectors: np.ndarray, max_points: int) -> np.ndarray:
+    if len(vectors) <= max_points:
+        return vectors
+    rng = np.random.default_rng(42)
+    return vectors[rng.choice(len(vectors), max_points, replace=False)]
+
+
+def train_and_fill(index_type: str, params: dict, vectors: np.ndarray, int_ids: np.ndarray):
+    """새 인덱스를 생성해 (필요하면) 학습시키고 벡터를 채워 반환"""
+    index = build_index(index_type, vectors.shape[1], params)
+    if not index.is_trained:
+        index.train(_train_sample(vectors, 256 * params.get("nlist", 256)))
+    if len(vectors):
+        index.add_with_ids(vectors, int_ids)
+    return index
+
+
+class VectorStore:
+    """
+    모델 하나의 Faiss 인덱스 + uuid↔int64 매핑 + 단조 증가 id 할당기.
+
+    디스크 구성 (MODEL_UPLOAD_DIR 아래):
+    - {model_id}.index     : 마지막 체크포인트 시점의 Faiss 인덱스
+    - {model_id}.meta.json : 마지막 체크포인트 시점의 매핑과 next_id
+    - {model_id}.wal       : 체크포인트 이후의 추가/삭제를 기록하는 append-only 로그
+
+    insert 는 WAL 에 레코드를 덧붙이기만 하고, 인덱스 전체는 WAL 이 커졌을 때만 다시 씁니다.
+    재시작 시에는 체크포인트를 읽은 뒤 WAL 을 재생하며, 재생은 멱등이므로
+    체크포인트 도중 중단되어도 안전합니다.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        index,
+        next_id: int = 0,
+        mapping: Optional[Dict[str, int]] = None,
+        index_type: str = "flat",
+        index_params: Optional[dict] = None,
+    ):
+        self.model_id = model_id
+        self.index = index
+        self.dim = index.d
+        # 현재 인덱스 종류와, AIModel 설정에 따라 전환해야 할 목표 인덱스 종류
+        self.index_type = index_type
+        self.index_params = dict(index_params or {})
+        self.target_type = index_type
+        self.target_params = dict(self.index_params)
+        self._migrating = False
+        # 마지막 전환 실패 (시각, 오류). 실패 후에는 재시도 간격 동안 add 에서 다시 시작하지 않음
+        self._migration_failed_at: Optional[float] = None
+        self.migration_error: Optional[str] = None
+        self.next_id = next_id
+        self.uuid_to_int: Dict[str, int] = dict(mapping or {})
+        self.int_to_uuid: Dict[int, str] = {v: k for k, v in self.uuid_to_int.items()}
+        self.lock = threading.RLock()
+        self._wal = None
+
+    # ------------------------------------------------------------------
+    # 경로
+    # ------------------------------------------------------------------
+    @staticmethod
+    def index_path(model_id: str) -> str:
+        return os.path.join(MODEL_UPLOAD_DIR, f"{model_id}.index")
+
+    @staticmethod
+    def meta_path(model_id: str) -> str:
+        return os.path.join(MODEL_UPLOAD_DIR, f"{model_id}.meta.json")
+
+    @staticmethod
+    def wal_path(model_id: str) -> str:
+        return os.path.join(MODEL_UPLOAD_DIR, f"{model_id}.wal")
+
+    # ------------------------------------------------------------------
+    # 생성 / 복구
+    # ------------------------------------------------------------------
+    @classmethod
+    def create(cls, model_id: str, feature_dim: int) -> "VectorStore":
+        print(f"Creating new Faiss index for model {model_id} with dimension {feature_dim}")
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(feature_dim))
+        store = cls(model_id, index)
+        store.checkpoint()
+        return store
+
+    @classmethod
+    def open(cls, model_id: str, bootstrap_mapping: Optional[Dict[str, int]] = None) -> "VectorStore":
+        """
+        체크포인트를 로드하고 WAL 을 재생합니다.
+        meta 파일이 없는 예전 인덱스는 bootstrap_mapping(ImageFeature 테이블)으로 매핑을 복원합니다.
+        """
+        print(f"Loading Faiss index for model {model_id}...")
+        index = faiss.read_index(cls.index_path(model_id))
+        meta_file = cls.meta_path(model_id)
+        if os.path.exists(meta_file):
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+            mapping = meta.get("mapping", {})
+            next_id = meta.get("next_id", 0)
+            index_type = meta.get("index_type", "flat")
+            index_params = meta.get("index_params", {})
+        else:
+            mapping = dict(bootstrap_mapping or {})
+            next_id = 0
+            index_type, index_params = "flat", {}
+
+        apply_search_params(index, index_type, index_params)
+        store = cls(model_id, index, next_id, mapping, index_type, index_params)
+        # next_id 는 인덱스/매핑에 존재하는 어떤 id 보다 커야 함 (ntotal 은 신뢰하지 않음)
+        present_ids = store._present_ids()
+        if present_ids.size:
+            store.next_id = max(store.next_id, int(present_ids.max()) + 1)
+        if store.uuid_to_int:
+            store.next_id = max(store.next_id, max(store.uuid_to_int.values()) + 1)
+        store._replay_wal(set(present_ids.tolist()))
+        return store
+
+    def _present_ids(self) -> np.ndarray:
+        if hasattr(self.index, "id_map"):
+            return faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        if hasattr(self.index, "invlists"):
+            invlists = self.index.invlists
+            chunks = [
+                faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+                for list_no in range(self.index.nlist)
+                if invlists.list_size(list_no) > 0
+            ]
+            return np.concatenate(chunks).astype(np.int64) if chunks else np.empty(0, dtype=np.int64)
+        return np.arange(self.index.ntotal, dtype=np.int64)
+
+    def _remove_from_index(self, int_ids: Sequence[int]):
+        # HNSW 는 삭제를 지원하지 않으므로 매핑에서만 제거 (검색 결과에서 걸러지고, tombstones 로 집계되어
+        # VECTOR_TOMBSTONE_REBUILD_RATIO 를 넘으면 _maybe_compact 가 재구축)
+        try:
+            self.index.remove_ids(np.array(int_ids, dtype=np.int64))
+        except RuntimeError:
+            pass
+
+    def _replay_wal(self, present_ids: set):
+        wal_file = self.wal_path(self.model_id)
+        if not os.path.exists(wal_file):
+            return
+        replayed = 0
+        valid_bytes = 0
+        with open(wal_file, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            length, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break  # 중간에 끊긴 마지막 레코드
+            op, int_id, raw_uuid = _PAYLOAD_HEADER.unpack_from(payload, 0)
+            feature_uuid = raw_uuid.decode("ascii")
+            if op == _OP_ADD:
+                if int_id not in present_ids:
+                    vector = np.frombuffer(payload, dtype=np.float32, offset=_PAYLOAD_HEADER.size)
+                    self.index.add_with_ids(vector.reshape(1, -1), np.array([int_id], dtype=np.int64))
+                    present_ids.add(int_id)
+                self.uuid_to_int[feature_uuid] = int_id
+                self.int_to_uuid[int_id] = feature_uuid
+                self.next_id = max(self.next_id, int_id + 1)
+            elif op == _OP_REMOVE:
+                if int_id in present_ids:
+                    self._remove_from_index([int_id])
+                    present_ids.discard(int_id)
+                self.uuid_to_int.pop(feature_uuid, None)
+                self.int_to_uuid.pop(int_id, None)
+                self.next_id = max(self.next_id, int_id + 1)
+            offset = start + length
+            valid_bytes = offset
+            replayed += 1
+
+        if valid_bytes != len(data):
+            print(f"Truncating torn WAL tail for model {self.model_id} ({len(data) - valid_bytes} bytes)")
+            with open(wal_file, "r+b") as f:
+                f.truncate(valid_bytes)
+        if replayed:
+            print(f"Replayed {replayed} WAL records for model {self.model_id}")
+
+    # ------------------------------------------------------------------
+    # WAL / 체크포인트
+    # ------------------------------------------------------------------
+    def _wal_file(self):
+        if self._wal is None:
+            self._wal = open(self.wal_path(self.model_id), "ab")
+        return self._wal
+
+    def _append(self, records: List[bytes]):
+        wal = self._wal_file()
+        buffer = bytearray()
+        for payload in records:
+            buffer += _RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+            buffer += payload
+        wal.write(buffer)
+        wal.flush()
+        if settings.VECTOR_WAL_FSYNC:
+            os.fsync(wal.fileno())
+
+    def _maybe_checkpoint(self):
+        # 인덱스에 반영이 끝난 뒤에만 호출해야 WAL 을 비워도 안전함
+        if self._wal is not None and self._wal.tell() >= settings.VECTOR_WAL_CHECKPOINT_MB * 1024 * 1024:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """인덱스와 메타데이터를 원자적으로 교체한 뒤 WAL 을 비웁니다."""
+        with self.lock:
+            index_path = self.index_path(self.model_id)
+            meta_path = self.meta_path(self.model_id)
+            faiss.write_index(self.index, index_path + ".tmp")
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump({
+                    "dim": self.dim,
+                    "next_id": self.next_id,
+                    "index_type": self.index_type,
+                    "index_params": self.index_params,
+                    "mapping": self.uuid_to_int,
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(index_path + ".tmp", index_path)
+            os.replace(meta_path + ".tmp", meta_path)
+
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            open(self.wal_path(self.model_id), "wb").close()
+            print(f"Saved Faiss index to {index_path}")
+
+    def close(self):
+        with self.lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+    # ------------------------------------------------------------------
+    # 추가 / 삭제
+    # ------------------------------------------------------------------
+    def add(self, vectors: np.ndarray) -> List[tuple]:
+        """
+        (N, D) 벡터를 추가하고 [(feature_uuid, int_id), ...] 를 반환.
+        id 는 삭제 여부와 관계없이 재사용되지 않습니다.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self.lock:
+            int_ids = np.arange(self.next_id, self.next_id + len(vectors), dtype=np.int64)
+            feature_uuids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+            self.next_id += len(vectors)
+
+            self._append([
+                _PAYLOAD_HEADER.pack(_OP_ADD, int(int_id), feature_uuid.encode("ascii")) + vector.tobytes()
+                for feature_uuid, int_id, vector in zip(feature_uuids, int_ids, vectors)
+            ])
+            with FAISS_SECONDS.time(operation="add"):
+                self.index.add_with_ids(vectors, int_ids)
+            FAISS_VECTORS.inc(len(vectors), operation="add")
+            for feature_uuid, int_id in zip(feature_uuids, int_ids):
+                self.uuid_to_int[feature_uuid] = int(int_id)
+                self.int_to_uuid[int(int_id)] = feature_uuid
+            self._maybe_checkpoint()
+            self._maybe_migrate()
+
+        return [(feature_uuid, int(int_id)) for feature_uuid, int_id in zip(feature_uuids, int_ids)]
+
+    def remove_orphans(self, committed_uuids: set) -> int:
+        """
+        ImageFeature 행이 없는 벡터를 제거하고 개수를 반환.
+        벡터는 DB 커밋 전에 WAL 에 기록되므로, 커밋 전에 중단/롤백되면 WAL 에만 남은 벡터가 생깁니다.
+        """
+        with self.lock:
+            orphans = [int_id for int_id, feature_uuid in self.int_to_uuid.items() if feature_uuid not in committed_uuids]
+            if orphans:
+                print(f"Removing {len(orphans)} orphan vectors for model {self.model_id}")
+                self.remove(orphans)
+            return len(orphans)
+
+    def remove(self, int_ids: Sequence[int]):
+        with self.lock:
+            int_ids = [int(i) for i in int_ids if int(i) in self.int_to_uuid]
+            if not int_ids:
+                return
+            self._append([
+                _PAYLOAD_HEADER.pack(_OP_REMOVE, int_id, self.int_to_uuid[int_id].encode("ascii"))
+                for int_id in int_ids
+            ])
+            self._remove_from_index(int_ids)
+            for int_id in int_ids:
+                self.uuid_to_int.pop(self.int_to_uuid.pop(int_id), None)
+            self._maybe_checkpoint()
+            self._maybe_compact()
+
+    # ------------------------------------------------------------------
+    # 인덱스 종류 전환 (백그라운드 학습 + 온라인 마이그레이션)
+    # ------------------------------------------------------------------
+    def configure(self, index_type: str, index_params: Optional[dict] = None):
+        """
+        목표 인덱스 종류를 설정. 조건이 맞으면 백그라운드 전환을 시작합니다.
+        이전 전환이 실패했더라도 명시적으로 호출한 것이므로 재시도 대기 없이 다시 시도합니다.
+        """
+        with self.lock:
+            self.target_type = index_type
+            self.target_params = dict(index_params or {})
+            self._migration_failed_at = None
+            self._maybe_migrate()
+
+    @property
+    def migrating(self) -> bool:
+        return self._migrating
+
+    @property
+    def tombstones(self) -> int:
+        """인덱스에 남아 있지만 삭제된 벡터 수 (remove_ids 를 지원하지 않는 HNSW 에서만 0 이 아님)"""
+        return max(0, self.index.ntotal - len(self.int_to_uuid))
+
+    def _maybe_compact(self):
+        """삭제된 벡터 비율이 VECTOR_TOMBSTONE_REBUILD_RATIO 를 넘으면 같은 종류로 백그라운드 재구축"""
+        if self._migrating or self.index.ntotal == 0 or not self.int_to_uuid:
+            return
+        if self.tombstones <= settings.VECTOR_TOMBSTONE_REBUILD_RATIO * self.index.ntotal:
+            return
+        if self._migration_failed_at is not None and \
+                time.monotonic() - self._migration_failed_at < settings.VECTOR_MIGRATION_RETRY_SECONDS:
+            return
+        print(f"Rebuilding index of model {self.model_id}: {self.tombstones}/{self.index.ntotal} vectors deleted")
+        self._migrating = True
+        thread = threading.Thread(target=self._migrate, args=(self.index_type, dict(self.index_params)), daemon=True)
+        thread.start()
+
+    def _maybe_migrate(self):
+        if self._migrating:
+            return
+        if self._migration_failed_at is not None and \
+                time.monotonic() - self._migration_failed_at < settings.VECTOR_MIGRATION_RETRY_SECONDS:
+            return
+        if self.target_type == self.index_type and \
+                all(self.index_params.get(key) == value for key, value in self.target_params.items()):
+            return
+        n_vectors = len(self.int_to_uuid)
+        params = {**default_index_params(self.target_type, self.dim, n_vectors), **self.target_params}
+        if n_vectors == 0 or n_vectors < params.get("train_threshold", 0):
+            return
+        params = _clip_params(self.target_type, params, n_vectors)
+        self._migrating = True
+        thread = threading.Thread(target=self._migrate, args=(self.target_type, params), daemon=True)
+        thread.start()
+
+    def _migrate(self, index_type: str, params: dict):
+        """
+        1) 락을 잡고 현재 벡터를 스냅샷
+        2) 락 없이 새 인덱스를 학습/구축 (이 동안 add/remove 는 기존 인덱스에 계속 반영)
+        3) 락을 잡고 스냅샷 이후 변경분을 반영한 뒤 인덱스 교체 + 체크포인트
+        """
+        try:
+            with self.lock:
+                snapshot_ids = np.array(sorted(self.int_to_uuid), dtype=np.int64)
+                vectors = self.reconstruct_many(snapshot_ids)
+            print(f"Migrating index of model {self.model_id}: {self.index_type} -> {index_type} "
+                  f"({len(snapshot_ids)} vectors)")
+
+            new_index = train_and_fill(index_type, params, vectors, snapshot_ids)
+            del vectors
+
+            with self.lock:
+                snapshot = set(snapshot_ids.tolist())
+                current = set(self.int_to_uuid)
+                added = np.array(sorted(current - snapshot), dtype=np.int64)
+                removed = sorted(snapshot - current)
+                if len(added):
+                    new_index.add_with_ids(self.reconstruct_many(added), added)
+                if removed:
+                    try:
+                        new_index.remove_ids(np.array(removed, dtype=np.int64))
+                    except RuntimeError:
+                        pass
+                self.index = new_index
+                self.index_type = index_type
+                self.index_params = params
+                self.checkpoint()
+                self._migration_failed_at = None
+                self.migration_error = None
+            print(f"Index migration finished for model {self.model_id} ({index_type})")
+        except Exception as e:
+            print(f"Index migration failed for model {self.model_id}: {e} "
+                  f"(retry in {settings.VECTOR_MIGRATION_RETRY_SECONDS}s or on configure)")
+            with self.lock:
+                self._migration_failed_at = time.monotonic()
+                self.migration_error = str(e)
+        finally:
+            self._migrating = False
+
+    # ------------------------------------------------------------------
+    # 조회 / 검색
+    # ------------------------------------------------------------------
+    def _flat_views(self):
+        """
+        IndexIDMap2(IndexFlat) 인 경우 (id 배열, (N, D) 벡터 행렬) 을 복사 없이 반환.
+        그 외 인덱스는 None.
+        """
+        if not hasattr(self.index, "id_map"):
+            return None
+        sub_index = faiss.downcast_index(self.index.index)
+        if not isinstance(sub_index, faiss.IndexFlat) or self.index.ntotal == 0:
+            return None
+        id_map = faiss.rev_swig_ptr(self.index.id_map.data(), self.index.id_map.size())
+        codes = faiss.rev_swig_ptr(sub_index.codes.data(), sub_index.codes.size())
+        return id_map, codes.view(np.float32).reshape(-1, self.dim)
+
+    def reconstruct_many(self, int_ids: Sequence[int]) -> np.ndarray:
+        """
+        여러 id 의 벡터를 미리 할당한 (N, D) float32 배열로 한 번에 복원.
+        flat 인덱스는 저장된 행렬에서 바로 gather 하고, 그 외에는 reconstruct_batch 를 사용합니다.
+        """
+        int_ids = np.ascontiguousarray(int_ids, dtype=np.int64)
+        out = np.empty((len(int_ids), self.dim), dtype=np.float32)
+        if len(int_ids) == 0:
+            return out
+
+        with self.lock:
+            views = self._flat_views()
+            if views is not None:
+                id_map, matrix = views
+                # id 는 단조 증가로 할당되고 삭제 시에도 순서가 유지되므로 id_map 은 정렬 상태
+                positions = np.searchsorted(id_map, int_ids)
+                clipped = np.minimum(positions, len(id_map) - 1)
+                if np.array_equal(id_map[clipped], int_ids):
+                    np.take(matrix, clipped, axis=0, out=out)
+                    return out
+            try:
+                self.index.reconstruct_batch(len(int_ids), faiss.swig_ptr(int_ids), faiss.swig_ptr(out))
+                return out
+            except (AttributeError, TypeError, RuntimeError):
+                pass
+            for row, int_id in enumerate(int_ids):
+                out[row] = self.index.reconstruct(int(int_id))
+        return out
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        allowed_ids: Optional[Sequence[int]] = None,
+        exclude_ids: Optional[Sequence[Optional[int]]] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        쿼리별 top-k 이웃 [(int_id, distance), ...] 를 반환.
+        allowed_ids 가 작으면 해당 벡터만 복원해 brute-force 로 계산하고,
+        크면 전체 인덱스에서 k 를 늘려가며 검색한 뒤 필터링합니다.
+        exclude_ids 는 쿼리별로 제외할 id (자기 자신) 입니다.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        exclude_ids = list(exclude_ids) if exclude_ids is not None else [None] * len(queries)
+        FAISS_VECTORS.inc(len(queries), operation="search")
+
+        with self.lock, FAISS_SECONDS.time(operation="search"):
+            if allowed_ids is not None:
+                allowed = np.array([i for i in allowed_ids if int(i) in self.int_to_uuid], dtype=np.int64)
+                if len(allowed) == 0:
+                    return [[] for _ in range(len(queries))]
+                if len(allowed) <= settings.SIMILAR_BRUTE_FORCE_LIMIT:
+                    base = self.reconstruct_many(allowed)
+                    distances, positions = faiss.knn(queries, base, min(k + 1, len(allowed)))
+                    labels = np.where(positions >= 0, allowed[np.clip(positions, 0, None)], -1)
+                    return self._collect(distances, labels, k, None, exclude_ids)
+                allowed_set = set(allowed.tolist())
+            else:
+                allowed_set = None
+
+            ntotal = self.index.ntotal
+            k_search = min(k + 1, ntotal)
+            while True:
+                distances, labels = self.index.search(queries, max(k_search, 1))
+                results = self._collect(distances, labels, k, allowed_set, exclude_ids)
+                if k_search >= ntotal or all(len(r) >= k for r in results):
+                    return results
+                k_search = min(k_search * 4, ntotal)
+
+    def _collect(self, distances, labels, k, allowed_set, exclude_ids):
+        results = []
+        for row_distances, row_labels, exclude_id in zip(distances, labels, exclude_ids):
+            row = []
+            for distance, label in zip(row_distances, row_labels):
+                label = int(label)
+                if label < 0 or label == exclude_id or label not in self.int_to_uuid:
+                    continue
+                if allowed_set is not None and label not in allowed_set:
+                    continue
+                row.append((label, float(distance)))
+                if len(row) >= k:
+                    break
+            results.append(row)
+        return results
+
+
+# 모델별 VectorStore 캐시: { model_id: VectorStore }
+_STORES: Dict[str, VectorStore] = {}
+_STORES_LOCK = threading.Lock()
+# 인덱스 읽기 + WAL 재생은 오래 걸리므로 _STORES_LOCK 대신 모델별 로드 락 안에서 수행
+_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+
+
+def _bootstrap_mapping(model_id: str) -> Dict[str, int]:
+    """
+    ImageFeature 테이블에 커밋된 매핑. meta 파일이 없는 예전 인덱스의 매핑 복원과
+    WAL 에만 남은 벡터 정리에 사용
+    """
+    from server.db.database import SessionLocal
+    from server.db.models import ImageFeature
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ImageFeature.feature_id, ImageFeature.feature_int_id) \
+                 .filter(ImageFeature.model_id == model_id).all()
+        return {row.feature_id: row.feature_int_id for row in rows}
+    finally:
+        db.close()
+
+
+def _model_index_config(model_id: str) -> Tuple[str, dict]:
+    """AIModel 에 설정된 인덱스 종류/파라미터"""
+    from server.db.database import SessionLocal
+    from server.db.models import AIModel
+
+    db = SessionLocal()
+    try:
+        model = db.query(AIModel).filter(AIModel.id == model_id).first()
+        if not model:
+            return "flat", {}
+        return model.index_type or "flat", dict(model.index_params or {})
+    finally:
+        db.close()
+
+
+def _load_lock(model_id: str) -> threading.Lock:
+    """
+    model_id 의 로드 락을 잡은 채로 반환. drop_vector_store 가 락을 교체했으면 새 락으로 다시 잡음
+    (같은 모델을 서로 다른 락으로 동시에 로드하지 않도록)
+    """
+    while True:
+        with _STORES_LOCK:
+            lock = _LOAD_LOCKS.setdefault(model_id, threading.Lock())
+        lock.acquire()
+        with _STORES_LOCK:
+            if _LOAD_LOCKS.get(model_id) is lock:
+                return lock
+        lock.release()
+
+
+def get_vector_store(model_id: str, feature_dim: Optional[int] = None) -> Optional[VectorStore]:
+    """
+    model_id 의 VectorStore 를 반환. 디스크에 없고 feature_dim 이 주어지면 새로 생성,
+    feature_dim 도 없으면 None 을 반환합니다.
+    """
+    with _STORES_LOCK:
+        store = _STORES.get(model_id)
+    if store is not None:
+        return store
+
+    load_lock = _load_lock(model_id)
+    try:
+        # 다른 스레드가 먼저 로드했을 수 있으므로 다시 확인
+        with _STORES_LOCK:
+            store = _STORES.get(model_id)
+        if store is not None:
+            return store
+        if os.path.exists(VectorStore.index_path(model_id)):
+            committed = _bootstrap_mapping(model_id)
+            bootstrap = None if os.path.exists(VectorStore.meta_path(model_id)) else committed
+            store = VectorStore.open(model_id, bootstrap)
+            store.remove_orphans(set(committed))
+        elif feature_dim is not None:
+            store = VectorStore.create(model_id, feature_dim)
+        else:
+            return None
+        # 처음 로드할 때만 AIModel 의 인덱스 설정을 읽어 목표 종류로 지정
+        store.configure(*_model_index_config(model_id))
+        with _STORES_LOCK:
+            _STORES[model_id] = store
+        return store
+    finally:
+        load_lock.release()
+
+
+def drop_vector_store(model_id: str):
+    """모델이 교체되었을 때 기존 벡터 저장소를 메모리와 디스크에서 제거"""
+    load_lock = _load_lock(model_id)
+    try:
+        with _STORES_LOCK:
+            store = _STORES.pop(model_id, None)
+            _LOAD_LOCKS.pop(model_id, None)
+        if store is not None:
+            store.close()
+        for path in (VectorStore.index_path(model_id), VectorStore.meta_path(model_id), VectorStore.wal_path(model_id)):
+            if os.path.exists(path):
+                os.remove(path)
+    finally:
+        load_lock.release()
+
+
+def remove_image_features(image_features):
+    """삭제되는 이미지의 ImageFeature 레코드에 해당하는 벡터를 각 모델 인덱스에서 제거"""
+    by_model: Dict[str, List[int]] = {}
+    for feature in image_features:
+        by_model.setdefault(feature.model_id, []).append(feature.feature_int_id)
+    for model_id, int_ids in by_model.items():
+        try:
+            store = get_vector_store(model_id)
+            if store is not None:
+                store.remove(int_ids)
+        except Exception as e:
+            print(f"Failed to remove vectors for model {model_id}: {e}")
+
+
+def benchmark_index_types(
+    store: VectorStore,
+    configs: Sequence[Tuple[str, dict]],
+    n_queries: int = 100,
+    k: int = 10,
+    max_base: int = 50000,
+) -> List[dict]:
+    """
+    저장된 벡터 일부로 (인덱스 종류, 파라미터) 조합별 recall@k / 검색 지연 / 구축 시간 / 크기를 측정.
+    같은 종류를 파라미터만 바꿔 여러 번 넣을 수 있으며, 지정하지 않은 파라미터는 기본값을 사용합니다.
+    정답은 같은 샘플에 대한 exact(brute-force) 검색 결과입니다.
+    """
+    import time
+
+    rng = np.random.default_rng(42)
+    with store.lock:
+        ids = np.array(sorted(store.int_to_uuid), dtype=np.int64)
+        if len(ids) > max_base:
+            ids = np.sort(rng.choice(ids, max_base, replace=False))
+        base = store.reconstruct_many(ids)
+    n_base = len(base)
+    if n_base == 0:
+        return []
+
+    queries = base[rng.choice(n_base, min(n_queries, n_base), replace=False)]
+    k = min(k, n_base)
+    _, ground_truth = faiss.knn(queries, base, k)
+    positions = np.arange(n_base, dtype=np.int64)
+
+    report = []
+    for index_type, params in configs:
+        entry = {"indexType": index_type, "params": params, "vectors": n_base, "k": k}
+        try:
+            params = _clip_params(index_type, {**default_index_params(index_type, base.shape[1], n_base), **params}, n_base)
+            entry["params"] = params
+            started = time.perf_counter()
+            index = train_and_fill(index_type, params, base, positions)
+            entry["buildSeconds"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            _, labels = index.search(queries, k)
+            entry["searchMsPerQuery"] = (time.perf_counter() - started) * 1000 / len(queries)
+            entry["recall"] = float(np.mean([
+                len(set(found.tolist()) & set(expected.tolist())) / k
+                for found, expected in zip(labels, ground_truth)
+            ]))
+            entry["indexBytes"] = int(faiss.serialize_index(index).nbytes)
+        except Exception as e:
+            entry["error"] = str(e)
+        report.append(entry)
+    return report
+
+
+def checkpoint_all():
+    """종료 시 모든 저장소를 체크포인트"""
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    for store in stores:
+        try:
+            store.checkpoint()
+        except Exception as e:
+            print(f"Failed to checkpoint vector store {store.model_id}: {e}")
@@ -1,6 +1,9 @@
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 from fastapi import WebSocket
 
+from server.core.metrics import REGISTRY, WEBSOCKET_MESSAGES, WEBSOCKET_SEND_SECONDS
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
@@ -15,28 +18,54 @@ class ConnectionManager:
             del self.active_connections[session_id]
             print(f"WebSocket disconnected for session: {session_id}")
 
-    async def send_progress(self, session_id: str, processed: int, total: int):
-        if session_id in self.active_connections:
-            await self.active_connections[session_id].send_json({
-                "type": "progress",
-                "processed": processed,
-                "total": total
-            })
+    async def _send(self, session_id: str, message: Dict):
+        """연결된 세션에 전송하고 유형/결과별 건수와 전송 시간을 기록"""
+        message_type = message.get("type", "")
+        websocket = self.active_connections.get(session_id)
+        if websocket is None:
+            WEBSOCKET_MESSAGES.inc(type=message_type, result="no_client")
+            return
+        start = time.perf_counter()
+        try:
+            await websocket.send_json(message)
+        except Exception:
+            WEBSOCKET_MESSAGES.inc(type=message_type, result="failed")
+            raise
+        WEBSOCKET_SEND_SECONDS.observe(time.perf_counter() - start)
+        WEBSOCKET_MESSAGES.inc(type=message_type, result="sent")
 
-    async def send_complete(self, session_id: str, moved_files: List[Dict]):
-        if session_id in self.active_connections:
-            await self.active_connections[session_id].send_json({
-                "type": "complete",
-                "movedFiles": moved_files
-            })
-            # 완료 메시지 후 연결 종료 가능
-            # await self.active_connections[session_id].close()
+    async def send_progress(self, session_id: str, processed: int, total: int, failed: Optional[List[str]] = None):
+        message = {
+            "type": "progress",
+            "processed": processed,
+            "total": total
+        }
+        if failed is not None:
+            message["failedFileIds"] = failed
+        await self._send(session_id, message)
+
+    async def send_complete(self, session_id: str, moved_files: List[Dict], failed: Optional[List[str]] = None):
+        message = {
+            "type": "complete",
+            "movedFiles": moved_files
+        }
+        if failed is not None:
+            message["failedFileIds"] = failed
+        await self._send(session_id, message)
+        # 완료 메시지 후 연결 종료 가능
+        # await self.active_connections[session_id].close()
+
+    async def send_json(self, session_id: str, message: Dict):
+        await self._send(session_id, message)
 
     async def send_error(self, session_id: str, message: str):
-         if session_id in self.active_connections:
-            await self.active_connections[session_id].send_json({
-                "type": "error",
-                "message": message
-            })
+        await self._send(session_id, {
+            "type": "error",
+            "message": message
+        })
+
+manager = ConnectionManager()
 
-manager = ConnectionManager()
\ No newline at end of file
+REGISTRY.register_collector(lambda: [
+    ("websocket_active_connections", "gauge", "Open progress websocket connections", len(manager.active_connections)),
+])
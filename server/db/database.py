@@ -1,18 +1,102 @@
 # server/db/database.py
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, func, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 import uuid
 from datetime import datetime
-from server.core.config import MODEL_UPLOAD_DIR, DATABASE_URL
+from server.core.config import MODEL_UPLOAD_DIR, DATABASE_URL, settings
 from tqdm import tqdm
 
-engine = create_engine(DATABASE_URL, echo=False)
+
+def _sqlite_pragmas(read_only: bool) -> list:
+    """
+    연결마다 적용할 SQLite PRAGMA.
+    WAL 은 읽기와 쓰기가 서로 막지 않게 하고, busy_timeout 은 쓰기 잠금을
+    바로 "database is locked" 로 실패하지 않고 기다리게 합니다.
+    """
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA synchronous = NORMAL",
+        f"PRAGMA cache_size = -{settings.SQLITE_CACHE_SIZE_MB * 1024}",
+        f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # journal_mode 는 DB 파일에 기록되므로 쓰기 연결에서만 설정
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def create_db_engine(url: str, read_only: bool = False):
+    """
+    DATABASE_URL 의 종류에 맞춰 풀/연결 설정을 적용한 엔진을 생성.
+    - SQLite: WAL, synchronous=NORMAL, cache/mmap 크기, busy timeout
+    - 그 외(PostgreSQL 등): 풀 크기, pre-ping, recycle
+    read_only=True 이면 쓰기가 거부되는 연결만 만듭니다.
+    """
+    parsed = make_url(url)
+    pool_size = settings.DB_READ_POOL_SIZE if read_only else settings.DB_POOL_SIZE
+    options = {
+        "echo": False,
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+    if parsed.get_backend_name() == "sqlite":
+        if _is_memory_sqlite(url):
+            # 메모리 DB 는 연결마다 별개의 DB 이므로 기본 풀(단일 연결) 사용
+            return create_engine(url, echo=False, connect_args={"check_same_thread": False})
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+        db_engine = create_engine(url, **options)
+        pragmas = _sqlite_pragmas(read_only)
+
+        @event.listens_for(db_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+        return db_engine
+
+    options.update(pool_pre_ping=True, pool_recycle=settings.DB_POOL_RECYCLE)
+    db_engine = create_engine(url, **options)
+    if read_only:
+        @event.listens_for(db_engine, "connect")
+        def _set_read_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+            cursor.close()
+            dbapi_connection.commit()
+
+    return db_engine
+
+
+engine = create_db_engine(DATABASE_URL)
+# 목록 API 용 읽기 전용 풀. 쓰기 풀과 분리되어 조회가 쓰기 연결을 점유하지 않습니다.
+# (메모리 SQLite 는 별도 연결이 빈 DB 가 되므로 쓰기 엔진을 그대로 사용)
+_READ_URL = settings.DATABASE_READ_URL or DATABASE_URL
+read_engine = engine if _is_memory_sqlite(_READ_URL) else create_db_engine(_READ_URL, read_only=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
+DEFAULT_MODEL_FILE = os.path.join(MODEL_UPLOAD_DIR, "model_uint8.onnx")
+
 def insert_default_model():
     """
     Inserts the default model (model_uint8.onnx) into the database
@@ -26,7 +110,7 @@ def insert_default_model():
 
     dinov2_url = "https://huggingface.co/onnx-community/dinov2-small/resolve/main/onnx/model_uint8.onnx?download=true"
     
-    default_file = os.path.join(MODEL_UPLOAD_DIR, "model_uint8.onnx")
+    default_file = DEFAULT_MODEL_FILE
     
     if not os.path.exists(default_file):
         print("Default model file does not exist. Downloading:", default_file)
@@ -70,18 +154,55 @@ def insert_default_model():
             db.close()
             return
 
+def _add_missing_columns(conn, table: str, columns: dict):
+    """columns: { column_name: column DDL } 중 테이블에 없는 컬럼을 추가"""
+    res = conn.execute(text(f"PRAGMA table_info({table});")).fetchall()
+    existing = {row[1] for row in res}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            print(f"[DB] Added missing column {table}.{name}")
+
 def _ensure_schema_compatibility():
     """Lightweight migration helper for local SQLite: add missing columns if needed."""
     if engine.dialect.name != "sqlite":
         return  # only handle sqlite here
 
-    with engine.connect() as conn:
-        # Check projects.updated_at
-        res = conn.execute(text("PRAGMA table_info(projects);")).fetchall()
-        cols = [row[1] for row in res]
-        if "updated_at" not in cols:
-            conn.execute(text("ALTER TABLE projects ADD COLUMN updated_at DATETIME"))
-            print("[DB] Added missing column projects.updated_at")
+    with engine.begin() as conn:
+        _add_missing_columns(conn, "projects", {"updated_at": "DATETIME"})
+        _add_missing_columns(conn, "ai_models", {
+            "index_type": "VARCHAR NOT NULL DEFAULT 'flat'",
+            "index_params": "JSON",
+        })
+        _add_missing_columns(conn, "images", {"content_hash": "VARCHAR"})
+        _add_missing_columns(conn, "jobs", {"heartbeat_at": "DATETIME"})
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_images_content_hash ON images (content_hash)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_images_upload_at_id ON images (upload_at, id)"))
+        _add_missing_columns(conn, "segmentations", {
+            "mask_data": "BLOB",
+            "area": "FLOAT",
+            "x_min": "FLOAT",
+            "y_min": "FLOAT",
+            "x_max": "FLOAT",
+            "y_max": "FLOAT",
+        })
+
+def _backfill_upload_at():
+    """
+    upload_at 이 비어 있는 이미지를 updated_at(없으면 현재 시각)으로 채움.
+    목록 API 의 (upload_at, id) keyset 비교에서 NULL 행이 빠지거나 중복되지 않도록 합니다.
+    """
+    from server.db.models import Image
+
+    table = Image.__table__
+    with engine.begin() as conn:
+        result = conn.execute(
+            table.update()
+            .where(table.c.upload_at.is_(None))
+            .values(upload_at=func.coalesce(table.c.updated_at, func.now()))
+        )
+    if result.rowcount:
+        print(f"[DB] Filled upload_at for {result.rowcount} images")
 
 def init_db():
     """
@@ -90,6 +211,7 @@ def init_db():
     from server.db import models  # 모든 모델이 로드되어야 Base.metadata에 등록됨
     Base.metadata.create_all(bind=engine)
     _ensure_schema_compatibility()
+    _backfill_upload_at()
     insert_default_model()
 
 def get_db():
@@ -98,3 +220,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """조회 전용 엔드포인트용 세션 (쓰기 시도는 DB 에서 거부됨)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
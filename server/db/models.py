@@ -1,7 +1,7 @@
 import enum
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy import (
-    Column, Integer, String, DateTime, JSON, Enum, ForeignKey, Float
+    Column, Integer, String, DateTime, JSON, Enum, ForeignKey, Float, Boolean, Index, LargeBinary
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -128,6 +128,8 @@ class Class(Base):
 
 class Image(Base):
     __tablename__ = "images"
+    # 목록 API 의 (upload_at, id) keyset 페이지네이션용
+    __table_args__ = (Index("ix_images_upload_at_id", "upload_at", "id"),)
 
     id = Column(String, primary_key=True, index=True)
     filename = Column(String, index=True)
@@ -147,6 +149,7 @@ class Image(Base):
     width = Column(Integer, nullable=True)
     type = Column(String, nullable=True)
     size = Column(Integer, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)
     
     datasets = relationship(
         "Dataset",
@@ -263,8 +266,16 @@ class Segmentation(Base):
         nullable=False,
         index=True
     )
-    # mask 데이터를 JSON으로 저장 (예: COCO RLE, 폴리곤 등)
+    # 인코딩된 마스크 (server/utils/masks.py: 폴리곤 float32 좌표 또는 RLE run 길이)
+    mask_data = Column(LargeBinary, nullable=True)
+    # 변환 전 JSON 마스크 (예: COCO RLE, 폴리곤 등). 새 행은 mask_data 만 사용
     mask = Column(String, nullable=True)
+    # 인코딩 시 계산한 면적/외접 박스 (0~1 비율)
+    area = Column(Float, nullable=True)
+    x_min = Column(Float, nullable=True)
+    y_min = Column(Float, nullable=True)
+    x_max = Column(Float, nullable=True)
+    y_max = Column(Float, nullable=True)
     confidence = Column(Float, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -285,6 +296,10 @@ class AIModel(Base):
     purpose = Column(String, nullable=True) 
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Faiss 인덱스 종류 (flat, ivf_flat, ivf_pq, hnsw) 와 파라미터 (nlist, nprobe, M 등)
+    index_type = Column(String, nullable=False, default="flat", server_default="flat")
+    index_params = Column(JSON, nullable=True)
+
     image_features = relationship("ImageFeature", back_populates="model")
 
 
@@ -301,3 +316,27 @@ class ImageFeature(Base):
     
     image = relationship("Image", back_populates="image_features")
     model = relationship("AIModel", back_populates="image_features")
+
+
+class Job(Base):
+    """백그라운드 작업 (feature 추출 등) 의 상태를 저장하는 테이블"""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    type = Column(String, nullable=False, index=True)
+    # queued, running, completed, failed, cancelled
+    status = Column(String, nullable=False, default="queued", index=True)
+    model_id = Column(String, ForeignKey("ai_models.id"), nullable=True)
+    params = Column(JSON, nullable=True)
+
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    failed_image_ids = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    # 실행 중인 워커가 주기적으로 갱신 (오래 갱신되지 않은 running 작업은 중단된 것으로 봄)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,175 @@
+# server/db/queries.py
+"""
+목록/업서트 API 에서 공통으로 쓰는 일괄 조회 헬퍼와 요청당 쿼리 수 측정 도구.
+관계를 행마다 읽는 대신 연결 테이블을 IN 절로 한 번에 조회합니다.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from heapq import merge
+from itertools import groupby
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+# SQLite 의 바인드 변수 개수 제한(구버전 999)보다 작게 유지
+IN_CLAUSE_CHUNK = 900
+
+
+def id_filters(column, ids) -> list:
+    """ids 가 목록이면 IN_CLAUSE_CHUNK 단위로 나눈 IN 조건들을, 서브쿼리(select)면 하나의 IN 조건을 반환"""
+    if isinstance(ids, (list, tuple)):
+        ids = list(ids)
+        return [column.in_(ids[i:i + IN_CLAUSE_CHUNK]) for i in range(0, len(ids), IN_CLAUSE_CHUNK)]
+    return [column.in_(ids)]
+
+
+def fetch_by_ids(db: Session, model, ids: Sequence[str]) -> list:
+    """ids 순서를 유지하며 존재하는 객체만 반환 (중복 id 는 한 번만)"""
+    found = {}
+    for condition in id_filters(model.id, list(dict.fromkeys(ids))):
+        found.update((obj.id, obj) for obj in db.query(model).filter(condition))
+    return [found[i] for i in dict.fromkeys(ids) if i in found]
+
+
+def group_ids(db: Session, key_column, value_column, keys=None) -> Dict[str, List[str]]:
+    """
+    연결 테이블의 (key, value) 쌍을 { key: [value, ...] } 로 모음.
+    keys 가 None 이면 전체, 목록/서브쿼리면 해당 key 만 조회합니다.
+    """
+    result = defaultdict(list)
+    query = db.query(key_column, value_column)
+    conditions = [None] if keys is None else id_filters(key_column, keys)
+    for condition in conditions:
+        rows = query if condition is None else query.filter(condition)
+        for key, value in rows:
+            result[key].append(value)
+    return result
+
+
+def column_values(db: Session, value_column, key_column, key) -> List[str]:
+    """연결 테이블에서 key 하나에 연결된 value 목록 (관계 객체를 로드하지 않음)"""
+    return [value for (value,) in db.query(value_column).filter(key_column == key)]
+
+
+# ── 쿼리 수 측정 ──────────────────────────────────────────────────────────────
+# count_queries() 블록 안에서 실행된 SQL 문을 모읍니다. ContextVar 는 요청 처리 중
+# threadpool 로 넘어가는 sync 엔드포인트에도 복사되므로 요청 단위로 측정할 수 있습니다.
+_query_log: ContextVar[Optional[list]] = ContextVar("query_log", default=None)
+_installed_engines = set()
+
+
+def install_query_counter(engine):
+    """engine 에서 실행되는 SQL 을 현재 count_queries() 블록에 기록"""
+    if id(engine) in _installed_engines:
+        return
+    _installed_engines.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        log = _query_log.get()
+        if log is not None:
+            log.append(statement)
+
+
+@contextmanager
+def count_queries():
+    log = []
+    token = _query_log.set(log)
+    try:
+        yield log
+    finally:
+        _query_log.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """
+    블록 안의 쿼리 수가 limit 를 넘으면 AssertionError.
+    예) with assert_max_queries(4): list_datasets(db=db)
+    """
+    with count_queries() as log:
+        yield log
+    if len(log) > limit:
+        statements = "\n".join(f"  {i + 1}. {stmt.splitlines()[0]}" for i, stmt in enumerate(log))
+        raise AssertionError(f"Expected at most {limit} queries, got {len(log)}:\n{statements}")
+
+
+# ── 데이터셋 단위 순차 조회 (내보내기/스트리밍용) ────────────────────────────────
+def label_models() -> dict:
+    """요청 키(snake_case) → 라벨 모델"""
+    from server.db.models import BoundingBox, KeyPoint, Segmentation
+
+    return {"bounding_boxes": BoundingBox, "key_points": KeyPoint, "segmentations": Segmentation}
+
+
+STREAM_CHUNK = 5000
+
+
+def _byte_order(db: Session, column):
+    """
+    heapq.merge 가 파이썬 문자열 비교로 스트림을 병합하므로 DB 정렬도 코드포인트 순서로 맞춤.
+    (SQLite 기본 BINARY 는 이미 동일, PostgreSQL 은 로케일 정렬이므로 "C" 지정)
+    """
+    return column.collate("C") if db.get_bind().dialect.name == "postgresql" else column
+
+
+def dataset_image_ids(dataset_id: str):
+    from server.db.association_tables import dataset_images
+
+    return select(dataset_images.c.image_id).where(dataset_images.c.dataset_id == dataset_id)
+
+
+def iter_dataset_images(db: Session, dataset_id: str):
+    """데이터셋 이미지를 id 순서로 STREAM_CHUNK 씩 읽어 Row(id, filename, file_location, width, height) 로 반환"""
+    from server.db.models import Image
+
+    stmt = (
+        select(Image.id, Image.filename, Image.file_location, Image.width, Image.height)
+        .where(Image.id.in_(dataset_image_ids(dataset_id)))
+        .order_by(_byte_order(db, Image.id))
+        .execution_options(yield_per=STREAM_CHUNK)
+    )
+    yield from db.execute(stmt)
+
+
+def _iter_label_rows(db: Session, key: str, model, dataset_id: str):
+    table = model.__table__
+    stmt = (
+        select(*table.columns)
+        .where(table.c.image_id.in_(dataset_image_ids(dataset_id)))
+        .order_by(_byte_order(db, table.c.image_id), table.c.id)
+        .execution_options(yield_per=STREAM_CHUNK)
+    )
+    for row in db.execute(stmt):
+        yield row.image_id, key, row._mapping
+
+
+def iter_dataset_labels(db: Session, dataset_id: str):
+    """
+    세 라벨 테이블을 각각 image_id 순으로 한 번씩 읽어 병합하고
+    (image_id, {bounding_boxes: [...], key_points: [...], segmentations: [...]}) 를 이미지마다 반환.
+    메모리 사용량은 이미지 하나 분량입니다.
+    """
+    streams = [_iter_label_rows(db, key, model, dataset_id) for key, model in label_models().items()]
+    for image_id, group in groupby(merge(*streams, key=lambda item: item[0]), key=lambda item: item[0]):
+        labels = {key: [] for key in label_models()}
+        for _, key, row in group:
+            labels[key].append(row)
+        yield image_id, labels
+
+
+def iter_images_with_labels(db: Session, dataset_id: str):
+    """
+    이미지 스트림과 라벨 스트림을 id 순서로 병합(merge join)해 (image_row, labels) 를 반환.
+    두 스트림 모두 DB 정렬 순서를 따르므로 id 값을 직접 비교하지 않고 일치 여부만 확인합니다.
+    """
+    labels = iter_dataset_labels(db, dataset_id)
+    pending = next(labels, None)
+    for image in iter_dataset_images(db, dataset_id):
+        if pending is not None and pending[0] == image.id:
+            yield image, pending[1]
+            pending = next(labels, None)
+        else:
+            yield image, {key: [] for key in label_models()}
@@ -1,13 +1,16 @@
 import os
+import asyncio
 import uvicorn
 import logging
 import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, EmailStr, Field, ValidationError, TypeAdapter, ConfigDict
-from server.db.database import init_db
+from server.db.database import init_db, engine, read_engine
+from server.db.queries import install_query_counter, count_queries
 from server.api.datasets import router as datasets_router
 from server.api.classes import router as classes_router
 from server.api.images import router as images_router
@@ -16,24 +19,24 @@ from server.api.uploads import router as uploads_router
 from server.core.config import UPLOAD_DIR, TMP_FOLDER, settings
 from server.api.models import router as model_router
 from server.core.cleanup import start_cleanup_worker
-import requests
+from server.core.inference import start_warmup_worker
+from server.core.vector_store import checkpoint_all
 from dotenv import load_dotenv
 from server.api.auth import router as auth_router
 from .api import admin
 import json
 import httpx
 from typing import Optional
-from server.core.auth import get_kratos_client, test_kratos_connection
+from server.core.auth import get_kratos_client, test_kratos_connection, open_kratos_client, close_kratos_client
 from server.api.projects import router as projects_router
+from server.api.jobs import router as jobs_router
+from server.core.jobs import job_runner
+from server.core.request_log import RequestLogMiddleware, setup_logging
+from server.core.metrics import REGISTRY, CONTENT_TYPE, install_sql_metrics
+from server.core.profiler import ProfilerMiddleware, install_sql_capture
 
-# Overwrite uvicorn's logging level
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-if not root_logger.handlers:
-    handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    root_logger.addHandler(handler)
+# 큐 기반 비동기 로그 출력 (JSON)
+setup_logging()
 
 logger = logging.getLogger("ingradient")
 
@@ -70,8 +73,20 @@ class UserLogin(BaseModel):
         }
     )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """앱 수명 동안 공유하는 자원: Kratos HTTP 클라이언트, 작업 재개, 벡터 인덱스 체크포인트"""
+    await open_kratos_client()
+    job_runner.attach_loop(asyncio.get_running_loop())
+    job_runner.resume_pending()
+    try:
+        yield
+    finally:
+        checkpoint_all()
+        await close_kratos_client()
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="Ingradient API")
+    app = FastAPI(title="Ingradient API", lifespan=lifespan)
 
     # CORS 설정
     FRONTEND_ORIGINS = os.getenv("FRONTEND_ORIGINS", "http://211.118.24.136:3000,http://localhost:3000").split(",")
@@ -101,26 +116,48 @@ def create_app() -> FastAPI:
             content={"detail": str(exc)}
         )
 
-    @app.middleware("http")
-    async def log_requests(request: Request, call_next):
-        """Request logging middleware"""
-        logger.info(f"Request: {request.method} {request.url}")
-        try:
-            response = await call_next(request)
-            logger.info(f"Response status: {response.status_code}")
+    # 라우트별 지연 시간 히스토그램 + 표본 추출된 JSON 접근 로그
+    app.add_middleware(RequestLogMiddleware)
+
+    if settings.METRICS_ENABLED:
+        install_sql_metrics(engine, "write")
+        install_sql_metrics(read_engine, "read")
+
+        @app.get("/metrics", include_in_schema=False)
+        def metrics():
+            return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    # 느린 요청 프로파일링 (헤더/경로/지연 시간 트리거, 결과는 /admin/profiles)
+    if settings.PROFILING_ENABLED:
+        install_sql_capture(engine)
+        install_sql_capture(read_engine)
+        app.add_middleware(ProfilerMiddleware)
+
+    if settings.QUERY_COUNT_WARN > 0:
+        install_query_counter(engine)
+        install_query_counter(read_engine)
+
+        @app.middleware("http")
+        async def count_request_queries(request: Request, call_next):
+            """요청당 SQL 수를 X-Query-Count 헤더로 노출하고, 기준을 넘으면 경고"""
+            with count_queries() as statements:
+                response = await call_next(request)
+            response.headers["X-Query-Count"] = str(len(statements))
+            if len(statements) > settings.QUERY_COUNT_WARN:
+                logger.warning(f"{request.method} {request.url.path} issued {len(statements)} queries")
             return response
-        except Exception as e:
-            logger.error(f"Error processing request: {str(e)}", exc_info=True)
-            raise
 
     # DB 초기화 및 API 라우터 등록
     init_db()
+    if settings.ONNX_WARMUP_ON_STARTUP:
+        start_warmup_worker()
     app.include_router(datasets_router, prefix="/api/datasets", tags=["datasets"])
     app.include_router(classes_router, prefix="/api/classes", tags=["classes"])
     app.include_router(images_router, prefix="/api/images", tags=["images"])
     app.include_router(labels_router, prefix="/api/labels", tags=["labels"]) 
     app.include_router(uploads_router, prefix="/api/uploads", tags=["uploads"])
     app.include_router(model_router, prefix="/api/model", tags=["model"])
+    app.include_router(jobs_router, prefix="/api/jobs", tags=["jobs"])
     app.include_router(auth_router)
     app.include_router(admin.router)
     app.include_router(projects_router, prefix="/api/projects", tags=["projects"])
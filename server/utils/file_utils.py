@@ -1,14 +1,15 @@
 import os
 import shutil
-from PIL import Image as PILImage
+from server.utils.thumbnails import render_thumbnail, thumbnail_extension
 
 def create_thumbnail(image_path: str, thumbnail_path: str, size=(256, 256)):
-    """썸네일 생성 유틸 함수"""
+    """
+    썸네일 생성 유틸 함수.
+    원본 형식과 관계없이 설정된 압축 형식(WebP/JPEG)으로 저장하며, 실제 저장 경로를 반환합니다.
+    """
     try:
-        with PILImage.open(image_path) as img:
-            img.thumbnail(size)
-            img.save(thumbnail_path, format=img.format)
-        return thumbnail_path
+        thumbnail_path = os.path.splitext(thumbnail_path)[0] + thumbnail_extension()
+        return render_thumbnail(image_path, thumbnail_path, max(size))
     except Exception as e:
         print(f"Thumbnail creation failed: {e}")
         return None
@@ -0,0 +1,294 @@
+# server/utils/masks.py
+"""
+세그멘테이션 마스크 코덱.
+Segmentation.mask_data 에 폴리곤(float64 좌표) 또는 RLE(run 길이 배열)를 바이너리로 저장하고,
+면적/외접 박스는 인코딩 시 numpy 로 계산해 별도 컬럼에 둡니다.
+좌표와 면적은 다른 라벨과 같이 이미지 크기에 대한 0~1 비율입니다.
+원본 JSON(mask)은 mask_data 를 복원했을 때 그대로 재현되는 경우에만 비웁니다.
+"""
+import json
+import math
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_VERSION = 1
+_POLYGON = 1     # float32 좌표 (이전 형식, 읽기만 지원)
+_RLE = 2
+_POLYGON64 = 3   # float64 좌표
+_HEADER = struct.Struct("<BB")      # version, kind
+_RLE_HEADER = struct.Struct("<IIB")  # height, width, counts itemsize
+_COUNT = struct.Struct("<I")
+
+
+# ── COCO 압축 RLE 문자열 ──────────────────────────────────────────────────────
+def rle_counts_from_string(s: str) -> List[int]:
+    """pycocotools 의 압축 counts 문자열을 run 길이 목록으로 복원"""
+    counts, p = [], 0
+    while p < len(s):
+        x, k, more = 0, 0, True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = bool(c & 0x20)
+            p += 1
+            k += 1
+            if not more and (c & 0x10):
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def rle_counts_to_string(counts) -> str:
+    """run 길이 목록을 pycocotools 호환 압축 문자열로 변환"""
+    counts = [int(c) for c in counts]
+    out = []
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            out.append(chr(c + 48))
+    return "".join(out)
+
+
+# ── 비트맵 ↔ RLE (column-major, 배경 run 부터 시작) ─────────────────────────────
+def bitmap_to_rle(bitmap: np.ndarray) -> dict:
+    height, width = bitmap.shape
+    flat = np.asarray(bitmap, dtype=bool).ravel(order="F")
+    if flat.size == 0:
+        return {"size": [height, width], "counts": []}
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [flat.size])))
+    if flat[0]:
+        counts = np.concatenate(([0], counts))
+    return {"size": [height, width], "counts": counts.tolist()}
+
+
+def rle_to_bitmap(rle: dict) -> np.ndarray:
+    height, width = rle["size"]
+    counts = np.asarray(_rle_counts(rle), dtype=np.int64)
+    values = np.zeros(len(counts), dtype=bool)
+    values[1::2] = True
+    flat = np.repeat(values, counts)[:height * width]
+    if flat.size < height * width:
+        flat = np.concatenate((flat, np.zeros(height * width - flat.size, dtype=bool)))
+    return flat.reshape((width, height)).T
+
+
+def _rle_counts(rle: dict) -> List[int]:
+    counts = rle.get("counts", [])
+    return rle_counts_from_string(counts) if isinstance(counts, str) else [int(c) for c in counts]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _polygon(coords) -> Optional[List[float]]:
+    """꼭짓점 3개 이상, 짝수 개의 유한한 좌표만 폴리곤으로 인정"""
+    if len(coords) < 6 or len(coords) % 2 or not all(_is_number(v) for v in coords):
+        return None
+    return [float(v) for v in coords]
+
+
+def _parse_rle(data: dict):
+    try:
+        height, width = (int(v) for v in data["size"])
+        counts = _rle_counts(data)
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None, None
+    if height < 0 or width < 0 or any(c < 0 for c in counts) or sum(counts) > height * width:
+        return None, None
+    return "rle", {"size": [height, width], "counts": counts}
+
+
+# ── 입력 해석 ─────────────────────────────────────────────────────────────────
+def parse_mask(mask) -> Tuple[Optional[str], object]:
+    """
+    JSON 문자열 또는 객체를 ("polygon", [[x1, y1, x2, y2, ...], ...]) 또는
+    ("rle", {size, counts}) 로 해석. 해석할 수 없거나 꼭짓점이 3개 미만인 폴리곤이
+    하나라도 있으면 일부만 버리지 않고 (None, None) 을 반환합니다.
+    """
+    if mask is None:
+        return None, None
+    try:
+        data = json.loads(mask) if isinstance(mask, str) else mask
+    except (TypeError, ValueError):
+        return None, None
+
+    if isinstance(data, dict) and "counts" in data and "size" in data:
+        return _parse_rle(data)
+    if not isinstance(data, list) or not data:
+        return None, None
+    if all(_is_number(v) for v in data):
+        polygons = [_polygon(data)]
+    elif all(isinstance(p, dict) and "x" in p and "y" in p for p in data):
+        polygons = [_polygon([c for p in data for c in (p["x"], p["y"])])]
+    elif all(isinstance(p, list) and len(p) == 2 for p in data):
+        polygons = [_polygon([c for p in data for c in p])]
+    elif all(isinstance(p, list) for p in data):
+        polygons = [_polygon(p) for p in data]
+    else:
+        return None, None
+    if any(p is None for p in polygons):
+        return None, None
+    return "polygon", polygons
+
+
+# ── 면적 / 외접 박스 ──────────────────────────────────────────────────────────
+_EMPTY_BOX = (0.0, 0.0, 0.0, 0.0)
+
+
+def _polygon_stats(polygons: List[np.ndarray]) -> Tuple[float, tuple]:
+    if not polygons:
+        return 0.0, _EMPTY_BOX
+    area = 0.0
+    for coords in polygons:
+        xs, ys = coords[0::2], coords[1::2]
+        area += abs(float(np.dot(xs, np.roll(ys, 1)) - np.dot(ys, np.roll(xs, 1)))) / 2.0
+    coords = np.concatenate(polygons)
+    xs, ys = coords[0::2], coords[1::2]
+    return area, (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+
+
+def _rle_stats(height: int, width: int, counts: np.ndarray) -> Tuple[float, tuple]:
+    counts = counts.astype(np.int64)
+    ends = np.cumsum(counts)
+    starts = (ends - counts)[1::2]
+    lengths = counts[1::2]
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if not height or not width or starts.size == 0:
+        return 0.0, _EMPTY_BOX
+
+    last = starts + lengths - 1
+    col_start, col_end = starts // height, last // height
+    single = col_start == col_end
+    # 여러 열에 걸친 run 은 세로 전체를 덮음
+    y_min = int((starts % height)[single].min()) if single.any() else height
+    y_max = int((last % height)[single].max()) + 1 if single.any() else 0
+    if not single.all():
+        y_min, y_max = 0, height
+    area = float(lengths.sum()) / (height * width)
+    return area, (
+        int(col_start.min()) / width,
+        y_min / height,
+        (int(col_end.max()) + 1) / width,
+        y_max / height,
+    )
+
+
+def mask_stats(kind: str, data) -> Tuple[float, tuple]:
+    """(면적, (x_min, y_min, x_max, y_max)) — 모두 0~1 비율"""
+    if kind == "polygon":
+        return _polygon_stats([np.asarray(p, dtype=np.float64) for p in data])
+    height, width = data["size"]
+    return _rle_stats(height, width, np.asarray(data["counts"], dtype=np.int64))
+
+
+# ── 바이너리 인코딩 ───────────────────────────────────────────────────────────
+def encode_mask(mask) -> Optional[dict]:
+    """
+    mask(JSON 문자열/객체)를 {mask_data, area, x_min, y_min, x_max, y_max} 컬럼 값으로 변환.
+    해석할 수 없으면 None.
+    """
+    kind, data = parse_mask(mask)
+    if kind is None:
+        return None
+
+    if kind == "polygon":
+        polygons = [np.asarray(p, dtype="<f8") for p in data]
+        lengths = np.asarray([p.size for p in polygons], dtype="<u4")
+        payload = _COUNT.pack(len(polygons)) + lengths.tobytes() + b"".join(p.tobytes() for p in polygons)
+        area, box = _polygon_stats(polygons)
+        code = _POLYGON64
+    else:
+        height, width = data["size"]
+        counts = np.asarray(data["counts"], dtype=np.int64)
+        dtype = "<u2" if counts.size == 0 or counts.max() < 1 << 16 else "<u4"
+        payload = _RLE_HEADER.pack(height, width, np.dtype(dtype).itemsize) + counts.astype(dtype).tobytes()
+        area, box = _rle_stats(height, width, counts)
+        code = _RLE
+
+    x_min, y_min, x_max, y_max = box
+    return {
+        "mask_data": _HEADER.pack(_VERSION, code) + payload,
+        "area": area,
+        "x_min": x_min,
+        "y_min": y_min,
+        "x_max": x_max,
+        "y_max": y_max,
+    }
+
+
+def decode_mask(blob: bytes) -> Tuple[Optional[str], object]:
+    """mask_data 를 ("polygon", [[...], ...]) 또는 ("rle", {size, counts}) 로 복원"""
+    if not blob:
+        return None, None
+    blob = bytes(blob)
+    version, code = _HEADER.unpack_from(blob)
+    offset = _HEADER.size
+    if code in (_POLYGON, _POLYGON64):
+        (count,) = _COUNT.unpack_from(blob, offset)
+        offset += _COUNT.size
+        lengths = np.frombuffer(blob, dtype="<u4", count=count, offset=offset)
+        offset += lengths.nbytes
+        dtype = "<f4" if code == _POLYGON else "<f8"
+        coords = np.frombuffer(blob, dtype=dtype, offset=offset).astype(np.float64)
+        bounds = np.cumsum(lengths)[:-1]
+        return "polygon", [p.tolist() for p in np.split(coords, bounds)] if count else []
+    if code == _RLE:
+        height, width, itemsize = _RLE_HEADER.unpack_from(blob, offset)
+        offset += _RLE_HEADER.size
+        counts = np.frombuffer(blob, dtype="<u2" if itemsize == 2 else "<u4", offset=offset)
+        return "rle", {"size": [height, width], "counts": counts.tolist()}
+    return None, None
+
+
+def segmentation_columns(mask) -> Optional[dict]:
+    """
+    Segmentation 행에 쓸 컬럼 값: encode_mask 결과 + mask.
+    mask_data 를 복원해 mask_json 으로 만든 값이 원본과 같을 때만 mask 를 None 으로 두고,
+    모양이 바뀌는 입력({x, y} 목록, 좌표쌍 목록, 비압축 RLE, 추가 키 등)은 원본 JSON 을 함께 보존합니다.
+    해석할 수 없으면 None.
+    """
+    encoded = encode_mask(mask)
+    if encoded is None:
+        return None
+    data = json.loads(mask) if isinstance(mask, str) else mask
+    if mask_json(*decode_mask(encoded["mask_data"])) == data:
+        return {**encoded, "mask": None}
+    return {**encoded, "mask": mask if isinstance(mask, str) else json.dumps(mask)}
+
+
+def segmentation_mask(row) -> Tuple[Optional[str], object]:
+    """Segmentation 행(dict/Row)에서 마스크 복원. 변환 전 행은 기존 JSON(mask) 을 해석"""
+    if row.get("mask_data"):
+        return decode_mask(row["mask_data"])
+    return parse_mask(row.get("mask"))
+
+
+def mask_json(kind: Optional[str], data):
+    """API 응답용: 폴리곤은 좌표 목록, RLE 는 COCO 압축 문자열 형태"""
+    if kind == "rle":
+        return {"size": data["size"], "counts": rle_counts_to_string(data["counts"])}
+    return data
+
+
+def segmentation_mask_json(row):
+    """API 응답용 마스크. 원본 JSON(mask)이 남아 있으면 그대로, 없으면 mask_data 를 복원"""
+    if row.get("mask") is not None:
+        try:
+            return json.loads(row["mask"])
+        except (TypeError, ValueError):
+            return row["mask"]
+    return mask_json(*decode_mask(row.get("mask_data")))
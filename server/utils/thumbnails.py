@@ -0,0 +1,186 @@
+# server/utils/thumbnails.py
+import hashlib
+import os
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from PIL import Image as PILImage, ImageOps
+
+from server.core.config import UPLOAD_DIR, settings
+from server.core.metrics import THUMBNAIL_SECONDS
+
+THUMBNAIL_DIR = os.path.join(UPLOAD_DIR, "thumbnails")
+
+# 용도별 썸네일 크기 (긴 변 기준 px)
+RENDITIONS = {
+    "grid": 256,
+    "preview": 1024,
+    "canvas": 2048,
+}
+
+_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+_ORIENTATION_TAG = 274
+_HASH_CHUNK = 1 << 20
+
+
+def thumbnail_extension() -> str:
+    return _EXTENSIONS.get(settings.THUMBNAIL_FORMAT.upper(), ".webp")
+
+
+def content_hash(path: str) -> str:
+    """파일 내용의 BLAKE2b(128bit) 해시"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _header_metadata(img: PILImage.Image) -> dict:
+    """픽셀 디코딩 없이 헤더만으로 크기/형식을 구함 (EXIF 회전 반영)"""
+    width, height = img.size
+    try:
+        if img.getexif().get(_ORIENTATION_TAG) in (5, 6, 7, 8):
+            width, height = height, width
+    except Exception:
+        pass
+    return {"width": width, "height": height, "type": PILImage.MIME.get(img.format)}
+
+
+def read_image_size(image_path: str) -> Tuple[int, int]:
+    """EXIF 회전을 반영한 (width, height) 를 헤더만 읽어 반환"""
+    with PILImage.open(image_path) as img:
+        metadata = _header_metadata(img)
+    return metadata["width"], metadata["height"]
+
+
+def read_image_metadata(image_path: str) -> dict:
+    """{width, height, type, size, content_hash} 를 반환 (헤더만 읽음)"""
+    with PILImage.open(image_path) as img:
+        metadata = _header_metadata(img)
+    metadata["size"] = os.path.getsize(image_path)
+    metadata["content_hash"] = content_hash(image_path)
+    return metadata
+
+
+def _save_thumbnail(img: PILImage.Image, thumbnail_path: str, max_size: int) -> str:
+    with THUMBNAIL_SECONDS.time():
+        return _render(img, thumbnail_path, max_size)
+
+
+def _render(img: PILImage.Image, thumbnail_path: str, max_size: int) -> str:
+    fmt = settings.THUMBNAIL_FORMAT.upper()
+    if fmt not in _EXTENSIONS:
+        fmt = "WEBP"
+
+    if img.format == "JPEG":
+        # 요청 크기 이상을 유지하는 가장 작은 1/2, 1/4, 1/8 스케일로 디코딩
+        img.draft("RGB", (max_size, max_size))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_size, max_size), reducing_gap=3.0)
+
+    if fmt == "JPEG" or img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if fmt == "WEBP" and "A" in img.getbands() else "RGB")
+
+    # 같은 썸네일을 여러 스레드/프로세스가 동시에 만들 수 있으므로 임시 파일 이름은 호출마다 고유하게
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(thumbnail_path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if fmt == "WEBP":
+                img.save(f, format="WEBP", quality=settings.THUMBNAIL_QUALITY, method=4)
+            else:
+                img.save(f, format="JPEG", quality=settings.THUMBNAIL_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp_path, thumbnail_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return thumbnail_path
+
+
+def render_thumbnail(image_path: str, thumbnail_path: str, max_size: int) -> str:
+    """
+    image_path 를 긴 변이 max_size 이하가 되도록 축소해 WebP/JPEG 로 저장.
+    - JPEG 는 draft 모드로 DCT 단계에서 축소해 전체 해상도 디코딩을 피함
+    - EXIF orientation 을 반영해 회전
+    저장된 경로를 반환합니다.
+    """
+    with PILImage.open(image_path) as img:
+        return _save_thumbnail(img, thumbnail_path, max_size)
+
+
+def ingest_image(
+    image_path: str, thumbnail_path: str, max_size: int = RENDITIONS["grid"], digest: Optional[str] = None
+) -> dict:
+    """
+    업로드된 파일을 한 번 열어 헤더 메타데이터를 읽고, 같은 핸들로 썸네일을 생성.
+    {thumbnail_location, width, height, type, size, content_hash, render_seconds} 를 반환하며
+    이미지로 열 수 없으면 thumbnail_location/width/height/type 은 None 입니다.
+    digest 가 주어지면 해시를 다시 계산하지 않고, 썸네일이 이미 있으면 다시 만들지 않습니다.
+    주로 ProcessPoolExecutor 워커에서 실행되므로 THUMBNAIL_SECONDS 는 직접 기록하지 않고
+    render_seconds(새로 만들지 않았으면 None)로 돌려주며, 호출한 쪽이 observe_render 로 기록합니다.
+    """
+    info = {
+        "thumbnail_location": None,
+        "width": None,
+        "height": None,
+        "type": None,
+        "size": os.path.getsize(image_path),
+        "content_hash": digest or content_hash(image_path),
+        "render_seconds": None,
+    }
+    thumbnail_path = os.path.splitext(thumbnail_path)[0] + thumbnail_extension()
+    try:
+        with PILImage.open(image_path) as img:
+            info.update(_header_metadata(img))
+            if digest and os.path.exists(thumbnail_path):
+                info["thumbnail_location"] = thumbnail_path
+            else:
+                os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+                started = time.perf_counter()
+                info["thumbnail_location"] = _render(img, thumbnail_path, max_size)
+                info["render_seconds"] = time.perf_counter() - started
+    except Exception as e:
+        print(f"Thumbnail creation failed: {e}")
+    return info
+
+
+def observe_render(info: dict) -> dict:
+    """ingest_image 결과에서 render_seconds 를 꺼내 현재(부모) 프로세스의 THUMBNAIL_SECONDS 에 기록"""
+    seconds = info.pop("render_seconds", None)
+    if seconds is not None:
+        THUMBNAIL_SECONDS.observe(seconds)
+    return info
+
+
+def rendition_path(image_id: str, rendition: str) -> str:
+    return os.path.join(THUMBNAIL_DIR, rendition, f"{image_id}{thumbnail_extension()}")
+
+
+def get_rendition(image_id: str, image_path: str, rendition: str) -> Optional[str]:
+    """
+    요청한 크기의 썸네일 경로를 반환. 캐시가 없거나 원본보다 오래되었으면 생성합니다.
+    """
+    path = rendition_path(image_id, rendition)
+    try:
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(image_path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return render_thumbnail(image_path, path, RENDITIONS[rendition])
+    except Exception as e:
+        print(f"Thumbnail creation failed: {e}")
+        return None
+
+
+def delete_renditions(image_id: str):
+    """이미지 삭제 시 캐시된 모든 크기의 썸네일 제거"""
+    for rendition in RENDITIONS:
+        path = rendition_path(image_id, rendition)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"Failed to delete thumbnail: {path}, Error: {e}")
+
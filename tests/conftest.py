@@ -0,0 +1,56 @@
+# tests/conftest.py
+import inspect
+import os
+
+# server 모듈을 import 하기 전에 설정: 실제 DB 파일 대신 메모리 SQLite 사용
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ONNX_WARMUP_ON_STARTUP", "false")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from server.db.database import Base
+from server.db.queries import install_query_counter
+
+
+@pytest.fixture
+def make_db():
+    """
+    호출할 때마다 테이블이 만들어진 빈 메모리 DB 세션을 반환하는 팩토리.
+    실행된 SQL 은 count_queries / assert_max_queries 로 측정할 수 있습니다.
+    """
+    from server.db import models  # noqa: F401  (Base.metadata 에 모델 등록)
+
+    created = []
+
+    def factory():
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        install_query_counter(engine)
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        created.append((engine, session))
+        return session
+
+    yield factory
+    for engine, session in created:
+        session.close()
+        engine.dispose()
+
+
+def _call_endpoint(endpoint, **kwargs):
+    for name, param in inspect.signature(endpoint).parameters.items():
+        if name not in kwargs and param.default is not inspect.Parameter.empty:
+            kwargs[name] = getattr(param.default, "default", param.default)
+    return endpoint(**kwargs)
+
+
+@pytest.fixture
+def call_endpoint():
+    """
+    라우터 함수를 직접 호출. 넘기지 않은 Query/Body 인자는 선언된 기본값으로 채웁니다.
+    (HTTP 계층 없이 핸들러가 실행하는 SQL 만 측정하기 위함)
+    """
+    return _call_endpoint
@@ -0,0 +1,150 @@
+# tests/test_query_counts.py
+"""
+목록/업서트 엔드포인트의 SQL 수가 데이터 크기와 무관하게 일정한지 확인.
+관계를 행마다 읽는 코드가 다시 들어오면 큰 쪽의 쿼리 수가 늘어나 실패합니다.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from server.api.classes import upsert_class
+from server.api.datasets import get_dataset, list_datasets
+from server.api.images import list_images, upsert_image
+from server.core.config import settings
+from server.db.association_tables import class_images, dataset_classes, dataset_images
+from server.db.models import Class, Dataset, Image, ImageFeature
+from server.db.queries import IN_CLAUSE_CHUNK, assert_max_queries, count_queries
+
+SIZES = (10, 1000)
+# 업서트는 요청한 id 목록을 IN_CLAUSE_CHUNK 단위로 나눠 조회하므로 한 청크 안의 크기끼리 비교
+UPSERT_SIZES = (10, IN_CLAUSE_CHUNK)
+
+
+def _seed(db, n_images: int, n_classes: int = 3):
+    """데이터셋 2개, 클래스 n_classes 개, 이미지 n_images 장 (모두 ds-0 / cls-0 / model-0 특징에 연결)"""
+    start = datetime(2024, 1, 1)
+    db.add_all([Dataset(id="ds-0", name="ds-0"), Dataset(id="ds-1", name="ds-1")])
+    db.add_all([Class(id=f"cls-{i}", name=f"cls-{i}") for i in range(n_classes)])
+    db.flush()
+    image_ids = [f"img-{i:05d}" for i in range(n_images)]
+    db.bulk_insert_mappings(Image, [
+        {"id": image_id, "filename": f"{image_id}.jpg", "upload_at": start + timedelta(seconds=i)}
+        for i, image_id in enumerate(image_ids)
+    ])
+    db.bulk_insert_mappings(ImageFeature, [
+        {"image_id": image_id, "model_id": "model-0", "feature_id": f"f-{image_id}", "feature_int_id": i}
+        for i, image_id in enumerate(image_ids)
+    ])
+    if image_ids:
+        db.execute(dataset_images.insert(), [{"dataset_id": "ds-0", "image_id": i} for i in image_ids])
+        db.execute(class_images.insert(), [{"class_id": "cls-0", "image_id": i} for i in image_ids])
+    db.execute(dataset_classes.insert(), [{"dataset_id": "ds-0", "class_id": f"cls-{i}"} for i in range(n_classes)])
+    db.commit()
+    db.expire_all()
+
+
+def _query_counts(make_db, sizes, run, seed=_seed) -> list:
+    """크기마다 새 DB 에 seed(db, n) 후 run(db, n) 이 실행한 쿼리 수"""
+    counts = []
+    for n in sizes:
+        db = make_db()
+        seed(db, n)
+        with count_queries() as log:
+            run(db, n)
+        counts.append(len(log))
+    return counts
+
+
+def test_list_datasets_constant_queries(make_db, call_endpoint):
+    def seed(db, n):
+        # 데이터셋 수를 늘려 데이터셋마다 classIds 를 읽는지 확인
+        _seed(db, 1)
+        db.add_all([Dataset(id=f"extra-{i}", name=f"extra-{i}") for i in range(n)])
+        db.flush()
+        db.execute(dataset_classes.insert(), [{"dataset_id": f"extra-{i}", "class_id": "cls-1"} for i in range(n)])
+        db.commit()
+        db.expire_all()
+
+    def run(db, n):
+        with assert_max_queries(2):
+            result = call_endpoint(list_datasets, db=db)
+        assert len(result) == n + 2
+        assert all(ds["classIds"] == ["cls-1"] for ds in result if ds["id"].startswith("extra-"))
+
+    counts = _query_counts(make_db, SIZES, run, seed=seed)
+    assert counts[0] == counts[1]
+
+
+def test_get_dataset_constant_queries(make_db, call_endpoint):
+    def run(db, n):
+        with assert_max_queries(3):
+            result = call_endpoint(get_dataset, dataset_id="ds-0", db=db)
+        assert len(result["imageIds"]) == n
+
+    counts = _query_counts(make_db, SIZES, run)
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"limit": 100},
+    {"dataset_ids": ["ds-0"], "class_ids": ["cls-0"], "limit": 100},
+    {"fields": "id,classIds,model", "limit": 100},
+])
+def test_list_images_constant_queries(make_db, call_endpoint, params):
+    def run(db, n):
+        with assert_max_queries(3):
+            result = call_endpoint(list_images, db=db, **params)
+        items = result["items"]
+        assert len(items) == min(n, params.get("limit", settings.IMAGE_PAGE_SIZE))
+        assert all(item["classIds"] == ["cls-0"] for item in items)
+        assert all(item["model"] == {"model-0": f"f-{item['id']}"} for item in items)
+
+    counts = _query_counts(make_db, SIZES, run)
+    assert counts[0] == counts[1]
+
+
+def test_list_images_next_page_constant_queries(make_db, call_endpoint):
+    def run(db, n):
+        first = call_endpoint(list_images, db=db, limit=5)
+        with assert_max_queries(3):
+            second = call_endpoint(list_images, db=db, limit=5, cursor=first["nextCursor"])
+        assert not {item["id"] for item in first["items"]} & {item["id"] for item in second["items"]}
+
+    counts = _query_counts(make_db, SIZES, run)
+    assert counts[0] == counts[1]
+
+
+def test_upsert_image_constant_queries(make_db, call_endpoint):
+    def seed(db, n):
+        _seed(db, 1, n_classes=n + 1)
+
+    def run(db, n):
+        payload = {
+            "filename": "renamed.jpg",
+            "datasetIds": ["ds-0", "ds-1"],
+            "classIds": [f"cls-{i}" for i in range(1, n + 1)],
+        }
+        with assert_max_queries(14):
+            result = call_endpoint(upsert_image, image_id="img-00000", updated_data=payload, db=db)
+        assert sorted(result["datasetIds"]) == ["ds-0", "ds-1"]
+        assert len(result["classIds"]) == n
+
+    counts = _query_counts(make_db, UPSERT_SIZES, run, seed=seed)
+    assert counts[0] == counts[1]
+
+
+def test_upsert_class_constant_queries(make_db, call_endpoint):
+    def run(db, n):
+        payload = {
+            "name": "renamed",
+            "datasetIds": ["ds-0", "ds-1"],
+            "imageIds": [f"img-{i:05d}" for i in range(n)],
+        }
+        with assert_max_queries(13):
+            result = call_endpoint(upsert_class, class_id="cls-1", updated_data=payload, db=db)
+        assert sorted(result["datasetIds"]) == ["ds-0", "ds-1"]
+        assert len(result["imageIds"]) == n
+
+    counts = _query_counts(make_db, UPSERT_SIZES, run)
+    assert counts[0] == counts[1]
@@ -0,0 +1,142 @@
+# tests/test_session_cache.py
+"""
+SessionCache 를 stub Kratos(httpx.MockTransport)에 붙여 TTL / 음성 캐시 / single-flight 를 확인.
+pytest-asyncio 없이 테스트마다 asyncio.run 으로 실행합니다.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from server.core.auth import SessionCache, _fetch_session, close_kratos_client, open_kratos_client
+
+
+def _expires_at(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat().replace("+00:00", "Z")
+
+
+def _session(expires_in: float = 3600) -> dict:
+    return {"active": True, "expires_at": _expires_at(expires_in), "identity": {"traits": {"email": "user@example.com"}}}
+
+
+def _run(handler, scenario):
+    """handler 로 응답하는 stub Kratos 를 공용 클라이언트로 열고 scenario(cache) 를 실행"""
+    async def main():
+        await open_kratos_client(transport=httpx.MockTransport(handler))
+        try:
+            return await scenario(SessionCache(ttl=60, negative_ttl=10, max_entries=100))
+        finally:
+            await close_kratos_client()
+    return asyncio.run(main())
+
+
+def test_ttl_capped_by_session_expires_at():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=_session(expires_in=2))
+
+    async def scenario(cache):
+        session = await cache.get_or_fetch("token", _fetch_session)
+        expires, _ = cache._entries[cache.key("token")]
+        await cache.get_or_fetch("token", _fetch_session)
+        return session, expires - time.monotonic()
+
+    session, remaining = _run(handler, scenario)
+    assert session["identity"]["traits"]["email"] == "user@example.com"
+    assert remaining <= 2
+    assert len(requests) == 1
+    assert requests[0].headers["Authorization"] == "Bearer token"
+
+
+def test_expired_session_is_not_cached():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=_session(expires_in=-1))
+
+    async def scenario(cache):
+        await cache.get_or_fetch("token", _fetch_session)
+        await cache.get_or_fetch("token", _fetch_session)
+
+    _run(handler, scenario)
+    assert len(requests) == 2
+
+
+def test_rejected_token_is_negatively_cached():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(401, json={"error": {"code": 401}})
+
+    async def scenario(cache):
+        first = await cache.get_or_fetch("bad", _fetch_session)
+        second = await cache.get_or_fetch("bad", _fetch_session)
+        return first, second, cache._entries[cache.key("bad")][0] - time.monotonic()
+
+    first, second, remaining = _run(handler, scenario)
+    assert first is None and second is None
+    assert remaining <= 10
+    assert len(requests) == 1
+
+
+def test_server_error_is_not_cached():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503)
+
+    async def scenario(cache):
+        for _ in range(2):
+            try:
+                await cache.get_or_fetch("token", _fetch_session)
+            except httpx.HTTPStatusError:
+                pass
+        return len(cache._entries)
+
+    assert _run(handler, scenario) == 0
+    assert len(requests) == 2
+
+
+def test_concurrent_lookups_share_one_request():
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=_session())
+
+    async def scenario(cache):
+        return await asyncio.gather(*[cache.get_or_fetch("token", _fetch_session) for _ in range(10)])
+
+    results = _run(handler, scenario)
+    assert len(requests) == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=_session())
+
+    async def scenario(cache):
+        leader = asyncio.ensure_future(cache.get_or_fetch("token", _fetch_session))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_fetch("token", _fetch_session))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        session = await follower
+        return leader.cancelled(), session, await cache.get_or_fetch("token", _fetch_session)
+
+    leader_cancelled, session, cached = _run(handler, scenario)
+    assert leader_cancelled
+    assert session is not None and cached == session
+    assert len(requests) == 1
@@ -221,6 +221,9 @@ const UploadModal = ({ saveImage, selectedDatasetIds, onClose }) => {
           setCommitProgress({ processed: data.processed, total: data.total });
         } else if (data.type === "complete") {
           console.log('Commit complete, movedFiles:', data.movedFiles);
+          if (data.failedFileIds?.length) {
+            console.warn("Files that failed to commit:", data.failedFileIds);
+          }
           // isCommitting은 handleSaveMovedFiles에서 false로 설정합니다.
           handleSaveMovedFiles(data.movedFiles);
           // 여기서 WebSocket을 닫을 수도 있고, handleSaveMovedFiles 후 닫을 수도 있습니다.
@@ -290,10 +293,10 @@ const UploadModal = ({ saveImage, selectedDatasetIds, onClose }) => {
           ...file,
           datasetIds: selectedDatasetIds,
           userId: "user1",
-          size: localFileItem?.size,
-          type: localFileItem?.type,
-          width: localFileItem?.width,
-          height: localFileItem?.height,
+          size: file.size ?? localFileItem?.size,
+          type: file.type ?? localFileItem?.type,
+          width: file.width ?? localFileItem?.width,
+          height: file.height ?? localFileItem?.height,
         });
       }
     } catch (err) {
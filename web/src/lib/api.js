@@ -155,10 +155,10 @@ export async function deleteClass(classId) {
  * =========================
  */
 
-// [GET] 모든 Image 목록
-export async function listImages(datasetIds = []) {
+// [GET] Image 목록 한 페이지: { items, nextCursor } (nextCursor 를 다음 호출의 cursor 로 전달)
+export async function listImages(datasetIds = [], { cursor = null, limit = 1000 } = {}) {
   const res = await axios.get("/api/images/", {
-    params: { dataset_ids: datasetIds },
+    params: { dataset_ids: datasetIds, limit, ...(cursor ? { cursor } : {}) },
     paramsSerializer: (params) => qs.stringify(params, { arrayFormat: "repeat" }), // ✅ 배열 직렬화
   });
   return res.data;
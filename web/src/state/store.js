@@ -37,6 +37,11 @@ import {
 } from '@/lib/api';
 
 
+// loadImages 호출 순번 (마지막 호출의 결과만 반영)
+let imagesRequestSeq = 0;
+// 첫 페이지 이후에는 이 페이지 수마다 한 번씩 상태를 갱신 (매 페이지 전체 복사 방지)
+const IMAGE_PAGES_PER_UPDATE = 10;
+
 export const useMyStore = create((set, get) => ({
   // datasets: initialDatasets || {},
   // classes: initialClasses || {},
@@ -82,15 +87,29 @@ export const useMyStore = create((set, get) => ({
     }
   },
 
+  // 이미지 목록은 cursor 페이지 단위로 받음. 첫 페이지를 바로 표시하고 나머지는 몇 페이지씩 모아 반영.
+  // 도중에 데이터셋 선택이 바뀌면 이전 요청의 남은 페이지는 버림.
   loadImages: async (selectedDatasetIds = []) => {
+    const requestId = ++imagesRequestSeq;
     try {
-      const images = await apiListImages(selectedDatasetIds);
-      const imageMap = Object.fromEntries(images.map((img) => [img.id, img]));
-
-      set((state) => ({
-        ...state,
-        images: imageMap,
-      }));
+      const imageMap = {};
+      let cursor = null;
+      let pages = 0;
+      do {
+        const page = await apiListImages(selectedDatasetIds, { cursor });
+        if (requestId !== imagesRequestSeq) return;
+        page.items.forEach((img) => {
+          imageMap[img.id] = img;
+        });
+        cursor = page.nextCursor;
+        pages += 1;
+        if (pages === 1 || !cursor || pages % IMAGE_PAGES_PER_UPDATE === 0) {
+          set((state) => ({
+            ...state,
+            images: { ...imageMap },
+          }));
+        }
+      } while (cursor);
 
       await get().loadLabels();
     } catch (error) {
@@ -412,6 +431,7 @@ export const useMyStore = create((set, get) => ({
         width: data.width || null,
         type: data.type || null,
         size: data.size || null,
+        contentHash: data.contentHash || get().images[id]?.contentHash || null,
         properties: mergedProps,
       };
   